@@ -1,8 +1,14 @@
 #!/usr/bin/env python3
 
 import argparse
+import json
+import os
+import socket
+import sqlite3
 import subprocess
 import shutil
+import threading
+import time
 from pathlib import Path
 
 SIZES = {
@@ -21,6 +27,13 @@ SIZES = {
     'metakv2': 2 ** 13
 }
 
+# The jobs table of the shared queue (see experiments/journal.py), written with the SQLite of this container (no upserts)
+QUEUE_COLUMNS = ['id TEXT PRIMARY KEY', 'function TEXT', 'args TEXT', 'kwargs TEXT', 'state TEXT', 'attempts INTEGER', 'error TEXT',
+                 'updated REAL', 'owner TEXT', 'lease REAL', 'inputs TEXT']
+JOB_FUNCTION = 'lhd_lrb'
+LEASE_SECONDS = 6 * 3600
+POLL_SECONDS = 30
+
 def count_trace_lines(trace_path):
     result = subprocess.run(['wc', '-l', str(trace_path)], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
     line_count = int(result.stdout.split()[0])
@@ -91,25 +104,19 @@ def run_lrb(trace_filename, trace_name, cache_size, trace_dir):
             shutil.move(str(dump_file), str(dest))
             print(f"Moved LRB dump file from {dump_file} to {dest}")
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('--trace-name', required=True, type=str)
-    parser.add_argument('--trace-file', required=True, type=str)
-
-    args = parser.parse_args()
-
-    trace_name = args.trace_name
-    trace_path = Path(args.trace_file)
-
+def check_trace(trace_name, trace_path):
     if trace_name not in SIZES:
         print(f"Error: Unknown trace name '{trace_name}'")
         print(f"Available traces: {list(SIZES.keys())}")
-        return 1
+        return False
 
     if not trace_path.exists():
         print(f"Error: Trace file not found: {trace_path}")
-        return 1
+        return False
+
+    return True
 
+def process_trace(trace_name, trace_path):
     cache_size = SIZES[trace_name]
     trace_file = trace_path
 
@@ -130,5 +137,133 @@ def main():
 
     print(f"Completed processing {trace_name}")
 
+def connect_queue(queue_path):
+    connection = sqlite3.connect(str(queue_path), timeout=600, isolation_level=None)
+    connection.execute(f'CREATE TABLE IF NOT EXISTS jobs ({", ".join(QUEUE_COLUMNS)})')
+    return connection
+
+def enqueue(queue_path, trace_name, trace_file):
+    job_id = f'LHD-LRB-{trace_name}'
+    connection = connect_queue(queue_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        row = connection.execute('SELECT state, args FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        # A done job is queued again when its arguments changed, as experiments/journal.py does
+        done = row is not None and row[0] == 'done' and json.loads(row[1]) == [trace_name, trace_file]
+        if row is None:
+            connection.execute('INSERT INTO jobs (id, function, args, kwargs, state, attempts, updated) VALUES (?, ?, ?, ?, ?, 0, ?)',
+                               (job_id, JOB_FUNCTION, json.dumps([trace_name, trace_file]), '{}', 'queued', time.time()))
+        elif row[0] == 'done' and not done:
+            connection.execute('UPDATE jobs SET args = ?, state = ?, attempts = 0, error = NULL, updated = ? WHERE id = ?',
+                               (json.dumps([trace_name, trace_file]), 'queued', time.time(), job_id))
+        elif not done:
+            connection.execute('UPDATE jobs SET args = ?, updated = ? WHERE id = ?', (json.dumps([trace_name, trace_file]), time.time(), job_id))
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+
+    print(f"{job_id} is already done in {queue_path}" if done else f"Queued {job_id} in {queue_path}")
+
+def claim(queue_path, owner):
+    """Claims the oldest queued LHD/LRB job, or one whose lease expired, as experiments/journal.py does"""
+    now = time.time()
+    connection = connect_queue(queue_path)
+    try:
+        connection.execute('BEGIN IMMEDIATE')
+        row = connection.execute('SELECT id, args FROM jobs WHERE function = ? AND (state = ? OR (state = ? AND lease < ?)) ORDER BY rowid LIMIT 1',
+                                 (JOB_FUNCTION, 'queued', 'running', now)).fetchone()
+        if row is not None:
+            connection.execute('UPDATE jobs SET state = ?, owner = ?, lease = ?, updated = ? WHERE id = ?',
+                               ('running', owner, now + LEASE_SECONDS, now, row[0]))
+        connection.execute('COMMIT')
+    finally:
+        connection.close()
+
+    return None if row is None else (row[0], json.loads(row[1]))
+
+def update_job(queue_path, job_id, sql, parameters):
+    connection = connect_queue(queue_path)
+    try:
+        connection.execute(f'UPDATE jobs SET {sql} WHERE id = ?', (*parameters, job_id))
+    finally:
+        connection.close()
+
+def start_job(queue_path, job_id):
+    """Counts the run of the job in its attempts, as JobJournal.start does"""
+    update_job(queue_path, job_id, 'attempts = attempts + 1, updated = ?', (time.time(),))
+
+def renew_lease(queue_path, job_id, owner):
+    """Renews the lease of the job while this worker owns it, a job claimed by another worker after the lease expired is left alone"""
+    connection = connect_queue(queue_path)
+    try:
+        connection.execute('UPDATE jobs SET lease = ? WHERE id = ? AND owner = ?', (time.time() + LEASE_SECONDS, job_id, owner))
+    finally:
+        connection.close()
+
+def work(queue_path, wait):
+    """Claims and runs LHD/LRB jobs from the shared queue, renewing the lease of the running job, until the queue is drained"""
+    owner = f'{socket.gethostname()}-{os.getpid()}'
+    while True:
+        job = claim(queue_path, owner)
+        if job is None:
+            if not wait:
+                return
+            time.sleep(POLL_SECONDS)
+            continue
+
+        job_id, (trace_name, trace_file) = job
+        print(f"{owner} claimed {job_id}")
+        stop = threading.Event()
+        def heartbeat():
+            while not stop.wait(LEASE_SECONDS / 3):
+                renew_lease(queue_path, job_id, owner)
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            start_job(queue_path, job_id)
+            if not check_trace(trace_name, Path(trace_file)):
+                raise ValueError(f"Invalid job {job_id}")
+            process_trace(trace_name, Path(trace_file))
+        except Exception as error:
+            update_job(queue_path, job_id, 'state = ?, error = ?, updated = ?', ('failed', repr(error), time.time()))
+            print(f"Job {job_id} failed: {error!r}")
+        else:
+            update_job(queue_path, job_id, 'state = ?, error = NULL, updated = ?', ('done', time.time()))
+        finally:
+            stop.set()
+            thread.join()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--trace-name', required=False, type=str)
+    parser.add_argument('--trace-file', required=False, type=str)
+    parser.add_argument('--queue', help='Shared queue (an SQLite file), the trace is only queued, unless running as a worker', required=False, type=str)
+    parser.add_argument('--worker', help='Run the LHD/LRB jobs of the queue', action='store_true', required=False)
+    parser.add_argument('--wait', help='As a worker, keep polling the queue for new jobs instead of exiting once it is drained', action='store_true', required=False)
+
+    args = parser.parse_args()
+
+    if args.worker:
+        if args.queue is None:
+            parser.error('--worker requires --queue')
+        work(Path(args.queue), args.wait)
+        return 0
+
+    if args.trace_name is None or args.trace_file is None:
+        parser.error('--trace-name and --trace-file are required')
+
+    trace_name = args.trace_name
+    trace_path = Path(args.trace_file)
+
+    if not check_trace(trace_name, trace_path):
+        return 1
+
+    if args.queue is not None:
+        enqueue(Path(args.queue), trace_name, str(trace_path))
+        return 0
+
+    process_trace(trace_name, trace_path)
+    return 0
+
 if __name__ == "__main__":
     main()
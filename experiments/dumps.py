@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+import argparse
+import io
+import os
+from pathlib import Path
+from typing import BinaryIO, Iterator, List
+
+import polars as pl
+
+from rich.console import Console
+
+# The dumps written by the simulator are text, results dumps have a line per request and quota dumps a CSV line per adaptation.
+# Kept in the results directory, they are encoded as Parquet (columnar, zstd compressed) under the same name, so their readers
+# recognize the encoding by the magic bytes of the file
+PARQUET_MAGIC = b'PAR1'
+# The results are kept as the text the simulator wrote (keys may be unsigned 64-bit hashes, penalties integers or floats),
+# a line of another number of fields is a row of nulls
+RESULTS_SCHEMA = {'Timestamp': pl.String, 'Key': pl.String, 'Miss Penalty': pl.String, 'Result': pl.String}
+RESULTS_LINE = r'^\s*(\S+)\s+(\S+)\s+(\S+)\s+(\S+)\s*$'
+QUOTA_SCHEMA = {'Event Number': pl.Int64, 'LRU': pl.Float64, 'LFU': pl.Float64, 'LBU': pl.Float64, 'Average Penalty': pl.Float64,
+                **{f'Direction {direction}': pl.Float64 for direction in range(1, 7)}}
+RESULTS_COLUMNS = list(RESULTS_SCHEMA)
+QUOTA_COLUMNS = list(QUOTA_SCHEMA)
+
+CHUNK_ROWS = 1_000_000
+BLOCK_SIZE = 64 * 1024 * 1024
+
+console = Console()
+
+
+def is_encoded(path: Path) -> bool:
+    with path.open('rb') as file:
+        return file.read(len(PARQUET_MAGIC)) == PARQUET_MAGIC
+
+
+def is_quota_dump(path: Path) -> bool:
+    return path.name.endswith('.quota_dump')
+
+
+def dump_columns(path: Path) -> List[str]:
+    return QUOTA_COLUMNS if is_quota_dump(path) else RESULTS_COLUMNS
+
+
+def _csv_options(path: Path) -> dict:
+    if is_quota_dump(path):
+        return {'has_header': False, 'schema': QUOTA_SCHEMA, 'null_values': ['NA']}
+
+    # * Whole lines, split into their fields by _text_fields
+    return {'has_header': False, 'schema': {'line': pl.String}, 'separator': '\x1f', 'quote_char': None}
+
+
+def _text_fields(path: Path, frame: pl.LazyFrame | pl.DataFrame) -> pl.LazyFrame | pl.DataFrame:
+    if is_quota_dump(path):
+        return frame
+
+    return frame.select(pl.col('line').str.extract_groups(RESULTS_LINE).struct.rename_fields(RESULTS_COLUMNS).struct.unnest())
+
+
+def scan_dump(path: Path, columns: List[str] | None = None) -> pl.LazyFrame:
+    """The dump as a lazy frame, of either encoding, only the given columns are read from an encoded dump"""
+    frame = pl.scan_parquet(path) if is_encoded(path) else _text_fields(path, pl.scan_csv(path, **_csv_options(path)))
+    return frame.select(columns) if columns is not None else frame
+
+
+def _read_line_blocks(file: BinaryIO, block_size: int) -> Iterator[bytes]:
+    while block := file.read(block_size):
+        if not block.endswith(b'\n'):
+            block += file.readline()
+        yield block
+
+
+def iter_dump(path: Path, columns: List[str] | None = None, chunk_rows: int = CHUNK_ROWS) -> Iterator[pl.DataFrame]:
+    """
+        The rows of the dump in chunks, holding a single chunk in memory.
+        Encoded dumps are read chunk_rows rows at a time, of the given columns only, text dumps a block of lines at a time.
+    """
+    if is_encoded(path):
+        frame = scan_dump(path, columns)
+        offset = 0
+        while True:
+            chunk = frame.slice(offset, chunk_rows).collect()
+            if chunk.height == 0:
+                return
+            yield chunk
+            offset += chunk.height
+    else:
+        with path.open('rb') as file:
+            for block in _read_line_blocks(file, BLOCK_SIZE):
+                chunk = _text_fields(path, pl.read_csv(io.BytesIO(block), **_csv_options(path)))
+                yield chunk.select(columns) if columns is not None else chunk
+
+
+def encode_dump(source: Path, destination: Path) -> None:
+    """Writes the text dump as an encoded dump at destination (which may be the source), streaming it through in bounded memory"""
+    staging = destination.with_name(f'.{destination.name}.{os.getpid()}.tmp')
+    try:
+        scan_dump(source).sink_parquet(staging, compression='zstd', row_group_size=CHUNK_ROWS)
+        staging.replace(destination)
+    finally:
+        staging.unlink(missing_ok=True)
+
+    if source != destination:
+        source.unlink()
+
+
+def keep_dump(source: Path, destination: Path, encode: bool = True) -> None:
+    """Moves the dump written by the simulator to destination, encoding it unless encode is false"""
+    if encode and not is_encoded(source):
+        encode_dump(source, destination)
+    else:
+        source.replace(destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Encode results and quota dumps, or show their contents')
+    parser.add_argument('dumps', help='Dump files (*.results_dump, *.quota_dump)', nargs='+', type=Path)
+    parser.add_argument('--encode', help='Encode the text dumps in place', action='store_true', required=False)
+    parser.add_argument('--columns', help='Show only these columns', nargs='+', required=False, default=None)
+
+    args = parser.parse_args()
+
+    for dump in args.dumps:
+        if args.encode:
+            if is_encoded(dump):
+                console.print(f'[yellow]{dump} is already encoded')
+                continue
+
+            size = dump.stat().st_size
+            encode_dump(dump, dump)
+            console.print(f'[green]Encoded {dump}: {size / 1024 ** 2:,.1f} MB -> {dump.stat().st_size / 1024 ** 2:,.1f} MB')
+        else:
+            frame = scan_dump(dump, args.columns)
+            console.print(f'[bold]{dump}[/bold] ({"encoded" if is_encoded(dump) else "text"}): {frame.select(pl.len()).collect().item():,} rows')
+            console.print(frame.head(10).collect())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from rich.console import Console
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# The columns of the jobs table, shared with containers/lhd-lrb/run_lhd_lrb.py, which claims its jobs from the same queue.
+# attempts counts the runs of the job (a claimed job retried by its worker runs several times), owner is the worker holding the lease
+COLUMNS = ['id TEXT PRIMARY KEY', 'function TEXT', 'args TEXT', 'kwargs TEXT', 'state TEXT', 'attempts INTEGER', 'error TEXT',
+           'updated REAL', 'owner TEXT', 'lease REAL', 'inputs TEXT']
+
+console = Console()
+
+
+class JobJournal():
+    """
+        The manifest and states of the jobs of a campaign, kept in an SQLite file so campaigns survive crashes.
+        A job is a call of a named function with JSON arguments, identified by its output name. A done job is run again
+        when it is added with other arguments or inputs (a digest of what else its results depend on, as the simulator build).
+        Jobs left running by a crashed campaign are unfinished, as queued and failed jobs, and run again on resume.
+        Shared by several hosts, the journal is a work queue: workers claim jobs with a lease, which they renew while running
+        the job, a job whose lease expired (its worker died) is claimed again.
+    """
+    __slots__ = 'path'
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(f'CREATE TABLE IF NOT EXISTS jobs ({", ".join(COLUMNS)})')
+            existing = [row[1] for row in connection.execute('PRAGMA table_info(jobs)')]
+            for column in COLUMNS:
+                if column.split()[0] not in existing:
+                    connection.execute(f'ALTER TABLE jobs ADD COLUMN {column}')
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(str(self.path), timeout=600)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _set_state(self, job_id: str, state: str, error: str | None = None) -> None:
+        with self._connect() as connection:
+            connection.execute('UPDATE jobs SET state = ?, error = ?, updated = ? WHERE id = ?', (state, error, time.time(), job_id))
+
+    def enqueue(self, job_id: str, function: str, args: list, kwargs: dict, inputs: str | None = None) -> bool:
+        """
+            Adds the job to the manifest, or updates its arguments if unfinished, False if the job is done with the same
+            function, arguments and inputs. A done job with other arguments or inputs is queued again.
+        """
+        with self._connect() as connection:
+            row = connection.execute('SELECT state, function, args, kwargs, inputs FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            if row is not None and row[0] == DONE:
+                _, done_function, done_args, done_kwargs, done_inputs = row
+                # Compared after a JSON round trip, as tuples are recorded as lists
+                if (done_function, json.loads(done_args), json.loads(done_kwargs), done_inputs) == \
+                   (function, json.loads(json.dumps(args)), json.loads(json.dumps(kwargs)), inputs):
+                    return False
+
+            connection.execute('INSERT INTO jobs (id, function, args, kwargs, state, attempts, updated, inputs) VALUES (?, ?, ?, ?, ?, 0, ?, ?) '
+                               'ON CONFLICT(id) DO UPDATE SET function = excluded.function, args = excluded.args, kwargs = excluded.kwargs, '
+                               'updated = excluded.updated, inputs = excluded.inputs, '
+                               'state = CASE WHEN state = ? THEN excluded.state ELSE state END, '
+                               'attempts = CASE WHEN state = ? THEN 0 ELSE attempts END, '
+                               'error = CASE WHEN state = ? THEN NULL ELSE error END',
+                               (job_id, function, json.dumps(args), json.dumps(kwargs), QUEUED, time.time(), inputs, DONE, DONE, DONE))
+
+        return True
+
+    def start(self, job_id: str) -> None:
+        with self._connect() as connection:
+            connection.execute('UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE id = ?',
+                               (RUNNING, time.time(), job_id))
+
+    def claim(self, owner: str, functions: List[str], lease_seconds: float) -> Tuple[str, str, list, dict] | None:
+        """Claims the oldest queued job (or one whose lease expired) calling one of the functions, None if there is none"""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute(f'SELECT id, function, args, kwargs FROM jobs WHERE function IN ({", ".join("?" * len(functions))}) '
+                                     'AND (state = ? OR (state = ? AND lease < ?)) ORDER BY rowid LIMIT 1',
+                                     (*functions, QUEUED, RUNNING, now)).fetchone()
+            if row is None:
+                return None
+
+            connection.execute('UPDATE jobs SET state = ?, owner = ?, lease = ?, updated = ? WHERE id = ?',
+                               (RUNNING, owner, now + lease_seconds, now, row[0]))
+
+        job_id, function, args, kwargs = row
+        return job_id, function, json.loads(args), json.loads(kwargs)
+
+    def renew(self, job_id: str, owner: str, lease_seconds: float) -> None:
+        with self._connect() as connection:
+            connection.execute('UPDATE jobs SET lease = ? WHERE id = ? AND owner = ?', (time.time() + lease_seconds, job_id, owner))
+
+    @contextmanager
+    def leased(self, job_id: str, owner: str, lease_seconds: float):
+        """Renews the lease of the claimed job every third of the lease, until the block ends"""
+        stop = threading.Event()
+        def heartbeat():
+            while not stop.wait(lease_seconds / 3):
+                self.renew(job_id, owner, lease_seconds)
+
+        thread = threading.Thread(target=heartbeat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def requeue_failed(self) -> int:
+        with self._connect() as connection:
+            return connection.execute('UPDATE jobs SET state = ?, updated = ? WHERE state = ?', (QUEUED, time.time(), FAILED)).rowcount
+
+    def finish(self, job_id: str) -> None:
+        self._set_state(job_id, DONE)
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._set_state(job_id, FAILED, error)
+
+    def unfinished(self) -> List[Tuple[str, str, list, dict]]:
+        """The (id, function, args, kwargs) of every job that is not done, in the order they were added"""
+        with self._connect() as connection:
+            rows = connection.execute('SELECT id, function, args, kwargs FROM jobs WHERE state != ? ORDER BY rowid', (DONE,)).fetchall()
+
+        return [(job_id, function, json.loads(args), json.loads(kwargs)) for job_id, function, args, kwargs in rows]
+
+    def failed(self) -> List[Tuple[str, str]]:
+        with self._connect() as connection:
+            return connection.execute('SELECT id, error FROM jobs WHERE state = ? ORDER BY rowid', (FAILED,)).fetchall()
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as connection:
+            return dict(connection.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+
+
+def inputs_digest(**inputs) -> str:
+    """The digest of the inputs of jobs beyond their arguments (the simulator build, settings, traces), recorded with the jobs"""
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True).encode(), digest_size=20).hexdigest()
+
+
+def run_job(journal: JobJournal, job_id: str, function: Callable, args: list, kwargs: dict, retries: int, backoff_seconds: float) -> bool:
+    """Runs the job, retrying a failure with an exponential backoff, and records its state in the journal, False if it failed"""
+    for attempt in range(retries + 1):
+        journal.start(job_id)
+        try:
+            function(*args, **kwargs)
+        except Exception as error:
+            journal.fail(job_id, repr(error))
+            console.log(f'[bold red]Job {job_id} failed (attempt {attempt + 1} of {retries + 1}): {error!r}')
+            if attempt < retries:
+                time.sleep(backoff_seconds * 2 ** attempt)
+        else:
+            journal.finish(job_id)
+            return True
+
+    return False
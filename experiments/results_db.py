@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import math
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, List
+
+import pandas as pd
+import polars as pl
+
+from rich.console import Console
+
+DB_NAME = 'results.sqlite'
+TABLE = 'results'
+
+# Every row has these columns, the rest (report metrics, the flattened simulator settings and the per experiment data,
+# such as Round, Seed or the quota sizes) are added on their first appearance, so existing columns never change
+CORE_COLUMNS = ['Run', 'Trace', 'Cache Size', 'Created']
+
+console = Console()
+
+
+def quote(column: str) -> str:
+    return '"' + column.replace('"', '""') + '"'
+
+
+def sql_value(value: Any) -> Any:
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return value
+
+    return json.dumps(value)
+
+
+@contextmanager
+def connect(db_path: Path):
+    """Opens the database, creating the results table, transactions are explicit so adding columns and rows is atomic"""
+    connection = sqlite3.connect(str(db_path), timeout=600, isolation_level=None)
+    try:
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute(f'CREATE TABLE IF NOT EXISTS {TABLE} ({", ".join(quote(column) for column in CORE_COLUMNS)})')
+        connection.execute(f'CREATE INDEX IF NOT EXISTS results_run ON {TABLE} ("Run")')
+        connection.execute(f'CREATE INDEX IF NOT EXISTS results_trace ON {TABLE} ("Trace", "Cache Size")')
+        yield connection
+    finally:
+        connection.close()
+
+
+def columns(connection: sqlite3.Connection) -> List[str]:
+    return [row[1] for row in connection.execute(f'PRAGMA table_info({TABLE})')]
+
+
+def insert_rows(connection: sqlite3.Connection, rows: Iterable[dict]) -> None:
+    existing = set(columns(connection))
+    for row in rows:
+        for column in row:
+            if column not in existing:
+                connection.execute(f'ALTER TABLE {TABLE} ADD COLUMN {quote(column)}')
+                existing.add(column)
+
+        names = list(row)
+        connection.execute(f'INSERT INTO {TABLE} ({", ".join(quote(name) for name in names)}) VALUES ({", ".join("?" * len(names))})',
+                           [sql_value(row[name]) for name in names])
+
+
+def record_run(db_path: Path, run: str, report: pd.DataFrame, settings: dict | None = None) -> None:
+    """
+        Records the report of the run, a row per report row with the settings of the run flattened into columns.
+        Rows recorded before for the same run are replaced.
+    """
+    created = time.time()
+    rows = [{'Run': run, 'Created': created, **(settings if settings is not None else {}), **report_row}
+            for report_row in report.to_dict('records')]
+
+    with connect(db_path) as connection:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.execute(f'DELETE FROM {TABLE} WHERE "Run" = ?', (run,))
+            insert_rows(connection, rows)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+        connection.execute('COMMIT')
+
+
+def has_run(db_path: Path, run: str) -> bool:
+    if not db_path.exists():
+        return False
+
+    with connect(db_path) as connection:
+        return connection.execute(f'SELECT 1 FROM {TABLE} WHERE "Run" = ? LIMIT 1', (run,)).fetchone() is not None
+
+
+def query(db_path: Path, sql: str = f'SELECT * FROM {TABLE}', parameters: Iterable = ()) -> pl.DataFrame:
+    """Runs the query on the database, returning its rows as a polars frame"""
+    with connect(db_path) as connection:
+        cursor = connection.execute(sql, tuple(parameters))
+        names = [description[0] for description in cursor.description]
+        return pl.DataFrame(cursor.fetchall(), schema=names, orient='row', infer_schema_length=None)
+
+
+def import_csvs(db_path: Path, csv_dir: Path) -> int:
+    """Records the per run CSVs written by the experiment scripts before the database, a run per file, named by its stem"""
+    count = 0
+    for csv_file in sorted(csv_dir.glob('*.csv')):
+        report = pd.read_csv(csv_file)
+        report = report.drop(columns=[column for column in report.columns if column.startswith('Unnamed:')])
+        record_run(db_path, csv_file.stem, report)
+        count += 1
+
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query or import into the results database of the experiments')
+    parser.add_argument('--db', help='Path to the results database', required=True, type=Path)
+    parser.add_argument('--import-csvs', help='Directory of per run CSVs to record in the database', required=False, type=Path)
+    parser.add_argument('--query', help=f'SQL query to print (default: SELECT * FROM {TABLE})', required=False, type=str)
+
+    args = parser.parse_args()
+
+    if args.import_csvs is not None:
+        count = import_csvs(args.db, args.import_csvs)
+        console.print(f'[bold green]Recorded {count} runs from {args.import_csvs}')
+
+    if args.query is not None or args.import_csvs is None:
+        with pl.Config(tbl_rows=-1, tbl_cols=-1):
+            console.print(query(args.db, args.query) if args.query is not None else query(args.db))
+
+
+if __name__ == '__main__':
+    main()
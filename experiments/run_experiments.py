@@ -1,10 +1,19 @@
 import argparse
 import simulatools
+import results_db
+import run_status
+import dumps
+from scheduler import RunScheduler, default_workers
+from journal import JobJournal, inputs_digest, run_job
 import re
 from os import urandom
 from pathlib import Path
 import json
 import shutil
+import tempfile
+import math
+import statistics
+from typing import List, Tuple
 
 from rich import pretty
 from rich.console import Console
@@ -21,6 +30,7 @@ caffeine_root = local_conf['caffeine_root']
 resources = local_conf['resources'] if local_conf['resources'] != '' else caffeine_root
 TRACES_DIR = f'{resources}'
 RESULTS_DIR = local_conf['results'] if local_conf['results'] != '' else './results/'
+RESULTS_DB = Path(RESULTS_DIR) / results_db.DB_NAME
 
 
 pretty.install()
@@ -28,6 +38,17 @@ console = Console()
 
 OUTPUT_SUFFIX = ""
 
+# When set, run_test submits the runs to the scheduler instead of running them one after the other
+SCHEDULER : RunScheduler | None = None
+
+# The jobs of the campaign and their states, set by main, a failed job is retried RETRIES times with an exponential backoff.
+# With QUEUE_ONLY, the journal is a shared queue, the jobs are only added to it, for workers (worker.py) to run
+JOURNAL : JobJournal | None = None
+QUEUE_ONLY = False
+RETRIES = 2
+BACKOFF_SECONDS = 30
+SUBMITTED = set()
+
 NUM_OF_QUANTA = 16
 
 SIZES = {'ibm010' : 2 ** 9, 'ibm024' : 2 ** 9, 'ibm031' : 2 ** 16,
@@ -101,6 +122,16 @@ FGHC_SETTINGS = {'sampled-hill-climber.sample-order-factor' : 0,
                  'sampled-hill-climber.adaption-multiplier' : 10}
 
 SEED_PATH = 'random-seed'
+TRACE_LIMIT_PATH = 'trace.limit'
+
+# The successive halving search evaluates the splits on prefixes of 1/27, 1/9 and 1/3 of the trace, and the full trace,
+# keeping the best third of the splits after every prefix
+HALVING_RATE = 3
+HALVING_RUNGS = 4
+
+# Two-sided 95% critical values of Student's t distribution by the degrees of freedom, above 30 the normal 1.96 is used
+T_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131,
+        2.120, 2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
 
 
 SETTINGS = {"pipeline.num-of-quanta" : NUM_OF_QUANTA,
@@ -138,6 +169,37 @@ def get_dists(file: Path):
 def run_test(fname: str, trace_name: str, cache_size: int, output_filename : str,
              algorithm : str, should_keep_dump : bool = False, additional_settings = None,
              name = None, additional_csv_data = None, progress_console = None) -> None:
+    submit_job(output_filename, 'execute_test', [fname, trace_name, cache_size, output_filename, algorithm],
+               {'should_keep_dump': should_keep_dump, 'additional_settings': additional_settings, 'name': name,
+                'additional_csv_data': additional_csv_data},
+               progress_console=progress_console)
+
+
+def submit_job(job_id: str, function: str, args: list, kwargs: dict, progress_console = None) -> None:
+    """
+        Runs the job, through the scheduler when set, unless the journal holds it as done (with the same arguments, settings,
+        simulator build and trace contents) or it was already submitted. The trace of every job is its first argument.
+    """
+    inputs = inputs_digest(build=simulatools.simulator_build_id(), settings=SETTINGS,
+                           trace=simulatools.trace_digest(simulatools.resources_path / 'latency' / args[0]))
+    if job_id in SUBMITTED or not JOURNAL.enqueue(job_id, function, args, kwargs, inputs):
+        return
+
+    SUBMITTED.add(job_id)
+    if QUEUE_ONLY:
+        return
+
+    if SCHEDULER is not None:
+        SCHEDULER.submit(run_job, JOURNAL, job_id, JOBS[function], args, kwargs, RETRIES, BACKOFF_SECONDS)
+    else:
+        if progress_console is not None:
+            kwargs = {**kwargs, 'progress_console': progress_console}
+        run_job(JOURNAL, job_id, JOBS[function], args, kwargs, RETRIES, BACKOFF_SECONDS)
+
+
+def execute_test(fname: str, trace_name: str, cache_size: int, output_filename : str,
+                 algorithm : str, should_keep_dump : bool = False, additional_settings = None,
+                 name = None, additional_csv_data = None, progress_console = None) -> None:
     print(output_filename)
     if progress_console:
         if name is None:
@@ -147,24 +209,21 @@ def run_test(fname: str, trace_name: str, cache_size: int, output_filename : str
     else:
         console.log(f'[bold #a98467]Running {algorithm} on trace: {trace_name}, size: {cache_size}' + f' Name: {name}' if name is not None else "")
     
-    if (Path(f'{RESULTS_DIR}/{output_filename}.csv').exists()): # * Skipping tests with existing results        
+    # * Without the result store, tests with existing results are skipped, the store reruns them only when their inputs changed
+    if not simulatools.use_store and results_db.has_run(RESULTS_DB, output_filename):
         return
     
     settings = SETTINGS if additional_settings is None else {**SETTINGS, **additional_settings}
+    dump_dir = Path(tempfile.mkdtemp(prefix=f'{output_filename}-', dir=RESULTS_DIR)) if should_keep_dump else None
         
     single_run_result = simulatools.single_run(algorithm, trace_file=fname, trace_folder='latency', 
                                                 trace_format='LATENCY', size=cache_size,
                                                 additional_settings=settings,
                                                 name=f'{algorithm}-{trace_name}' if name is None else f'{algorithm}-{trace_name}-{name}',
-                                                save = False, verbose = False)
+                                                save = False, verbose = False, dump_dir = dump_dir)
     
     if (single_run_result is False):
-        if progress_console:
-            progress_console.log(f'[bold red]Error in {fname}: exiting')
-        else:
-            console.log(f'[bold red]Error in {fname}: exiting')
-        
-        exit(1)
+        raise RuntimeError(f'The simulator failed running {output_filename} on {fname}')
     else:                    
         single_run_result['Cache Size'] = cache_size
         single_run_result['Trace'] = trace_name
@@ -174,20 +233,20 @@ def run_test(fname: str, trace_name: str, cache_size: int, output_filename : str
                 single_run_result[key] = value
         
         
-        single_run_result.to_csv(f'{RESULTS_DIR}/{output_filename}.csv')
+        results_db.record_run(RESULTS_DB, output_filename, single_run_result, settings)
         if progress_console:
             progress_console.log(f"[bold #ffd166]Avg. Pen. {int(single_run_result['Average Penalty'].iloc[0])}")
         else:
             console.log(f"[bold #ffd166]Avg. Pen. {int(single_run_result['Average Penalty'].iloc[0])}")
         
         if should_keep_dump:
-            dump_path = Path(f'{caffeine_root}')
+            dump_path = dump_dir
 
             quota_files = [file.resolve() for file in dump_path.rglob('*.quota_dump')]
             if len(quota_files) == 1:
                 dumpfile = quota_files[0]
                 destination = Path(RESULTS_DIR) / f'{output_filename}.quota_dump'
-                shutil.move(dumpfile, destination)
+                dumps.keep_dump(dumpfile, destination, simulatools.encode_dumps)
             elif len(quota_files) > 1:
                 if progress_console:
                     progress_console.log(f"[bold red]Wrong number of quota dump files found: {len(quota_files)}")
@@ -196,10 +255,10 @@ def run_test(fname: str, trace_name: str, cache_size: int, output_filename : str
                 raise AssertionError()
 
             results_files = [file.resolve() for file in dump_path.rglob('*.results_dump')]
-            if len(results_files) > 1:
+            if len(results_files) == 1:
                 resultsfile = results_files[0]
                 destination = Path(RESULTS_DIR) / f'{output_filename}.results_dump'
-                shutil.move(resultsfile, destination)
+                dumps.keep_dump(resultsfile, destination, simulatools.encode_dumps)
             elif len(results_files) > 1:
                 if progress_console:
                     progress_console.log(f"[bold red]Wrong number of results dump files found: {len(results_files)}")
@@ -207,10 +266,46 @@ def run_test(fname: str, trace_name: str, cache_size: int, output_filename : str
                     console.print(f"[bold red]Wrong number of results dump files found: {len(results_files)}")
                 raise AssertionError()
 
-        #* Clean the results_dump files, relevant only to the synthetic trace experiments
-        results_files = [file.resolve() for file in Path(f'{caffeine_root}').rglob('*.results_dump')]
-        for file in results_files:
-                file.unlink()
+            shutil.rmtree(dump_dir, ignore_errors=True)
+
+
+def run_tests(fname: str, trace_name: str, cache_size: int, tests: List[Tuple[str, str, str]],
+              additional_settings = None) -> None:
+    """Runs tests of (output filename, algorithm, name) with the same settings, simulating all of them in a single pass over the trace"""
+    submit_job('+'.join(output_filename for output_filename, _, _ in tests), 'execute_tests',
+               [fname, trace_name, cache_size, [list(test) for test in tests]], {'additional_settings': additional_settings})
+
+
+def execute_tests(fname: str, trace_name: str, cache_size: int, tests: List[Tuple[str, str, str]],
+                  additional_settings = None) -> None:
+    pending = [test for test in tests if simulatools.use_store or not results_db.has_run(RESULTS_DB, test[0])] # * See execute_test
+    if len(pending) > 1:
+        names = [name for _, _, name in pending]
+        console.log(f'[bold #a98467]Running {", ".join(names)} on trace: {trace_name}, size: {cache_size}')
+        settings = SETTINGS if additional_settings is None else {**SETTINGS, **additional_settings}
+        results = simulatools.multi_run([algorithm for _, algorithm, _ in pending], trace_file=fname, trace_folder='latency',
+                                        trace_format='LATENCY', size=cache_size, additional_settings=settings,
+                                        name=f'{trace_name}-{"-".join(names)}')
+        if results is False:
+            raise RuntimeError(f'The simulator failed running {", ".join(names)} on {fname}')
+        
+        if results is not None:
+            for (output_filename, _, name), result in zip(pending, results):
+                result['Cache Size'] = cache_size
+                result['Trace'] = trace_name
+                results_db.record_run(RESULTS_DB, output_filename, result, settings)
+                console.log(f"[bold #ffd166]{name} Avg. Pen. {int(result['Average Penalty'].iloc[0])}")
+            
+            return
+        
+        console.log('[bold yellow]Could not split the combined report, running the policies one by one')
+
+    for output_filename, algorithm, name in pending:
+        execute_test(fname, trace_name, cache_size, output_filename, algorithm, additional_settings=additional_settings, name=name)
+
+
+# The functions a job may call, by the name recorded in the journal
+JOBS = {'execute_test': execute_test, 'execute_tests': execute_tests}
 
 
 def run_full_ghost(fname: str, trace_name: str, cache_size: int) -> None:
@@ -230,12 +325,20 @@ def run_full_ghost(fname: str, trace_name: str, cache_size: int) -> None:
                 should_keep_dump=True)
 
 
-def run_sampled_all(fname: str, trace_name: str, cache_size: int, round: int, seed: int, progress: Progress) -> None:
+def sample_rates(cache_size: int) -> List[int]:
+    """The sample rates (orders) run by run_sampled_all, those sampling at least one entry of a quantum"""
     quantum_size = cache_size / SETTINGS["pipeline.num-of-quanta"]
+    return [sample_rate for sample_rate in range(1, 7) if int(quantum_size) >> sample_rate > 0]
+
+
+def run_sampled_all(fname: str, trace_name: str, cache_size: int, round: int, seed: int, progress: Progress,
+                    rates: List[int] | None = None) -> None:
+    quantum_size = cache_size / SETTINGS["pipeline.num-of-quanta"]
+    rates = rates if rates is not None else sample_rates(cache_size)
 
     sample_progress = progress.add_task('[bold #bedcfe]Current round', total=6, start=True)
     for sample_rate in range(1, 7):
-        if (int(quantum_size) >> sample_rate > 0):
+        if sample_rate in rates:
             SAMPLE_SETTINGS = {'sampled-hill-climber.sample-order-factor' : sample_rate, 
                             'sampled-hill-climber.adaption-multiplier' : 10}
             
@@ -269,6 +372,64 @@ def run_single_sampled(fname: str, trace_name: str, cache_size: int, round: int,
             additional_csv_data={'Round' : round, 'Seed': seed}, progress_console=progress.console, should_keep_dump=True)
 
 
+def round_penalties(sample_rate: int) -> List[float]:
+    """The Average Penalty of every recorded round of the sample rate in this campaign"""
+    if not RESULTS_DB.exists():
+        return []
+
+    frame = results_db.query(RESULTS_DB, 'SELECT "Average Penalty" FROM results WHERE "Run" GLOB ?',
+                             [f'sampled-O{sample_rate}-{OUTPUT_SUFFIX}-R*'])
+    return [penalty for penalty in frame.to_series() if penalty is not None]
+
+
+def is_converged(penalties: List[float], tolerance: float) -> bool:
+    """Whether the 95% confidence interval of the mean penalty is narrower than the tolerance, relative to the mean"""
+    if len(penalties) < 2:
+        return False
+
+    mean = statistics.mean(penalties)
+    t = T_95[len(penalties) - 2] if len(penalties) - 1 <= len(T_95) else 1.96
+    half_width = t * statistics.stdev(penalties) / math.sqrt(len(penalties))
+    return half_width <= tolerance * abs(mean)
+
+
+def run_rounds(fname: str, trace_name: str, cache_size: int, rounds: int, round_index_start: int, rates: List[int],
+               single: bool, tolerance: float | None, min_rounds: int) -> None:
+    """
+        Runs rounds of the sampled hill climber with fresh seeds, concurrently through the scheduler when set.
+        With a tolerance, the rounds are launched in waves, and a sample rate stops getting rounds once the confidence
+        interval of its Average Penalty across the rounds (at least min_rounds) is narrower than the tolerance.
+    """
+    active = list(rates)
+    with Progress() as progress, run_status.mirrored(progress, simulatools.status_file):
+        round_progress = progress.add_task('[bold #adc178]Rounds', total=rounds, start=True)
+        for round in range(rounds):
+            seed = abs(int.from_bytes(urandom(4), 'big', signed=True))
+            progress.console.log(f"Starting round {round + 1} of {rounds}: {100.0 * round / rounds}%, seed: {seed}",
+                                 style='bold #adc178')
+
+            if single:
+                run_single_sampled(fname, trace_name, cache_size, round_index_start + round + 1, seed,
+                                   progress=progress, sample_rate=active[0])
+            else:
+                run_sampled_all(fname, trace_name, cache_size, round_index_start + round + 1, seed,
+                                progress=progress, rates=active)
+
+            progress.update(round_progress, advance=1)
+
+            wave = max(1, SCHEDULER.workers // len(active)) if SCHEDULER is not None else 1
+            if tolerance is not None and round + 1 >= min_rounds and (round + 1) % wave == 0:
+                if SCHEDULER is not None:
+                    SCHEDULER.wait()
+
+                converged = [sample_rate for sample_rate in active if is_converged(round_penalties(sample_rate), tolerance)]
+                for sample_rate in converged:
+                    progress.console.log(f'[bold #ffd166]O{sample_rate} converged after {round + 1} rounds')
+                active = [sample_rate for sample_rate in active if sample_rate not in converged]
+                if len(active) == 0:
+                    break
+
+
 def run_all_simple(fname: str, trace_name: str, cache_size: int) -> None:
     quantum_size = cache_size / SETTINGS["pipeline.num-of-quanta"]
     SIZE_SETTINGS = {'pipeline.quantum-size': quantum_size}
@@ -290,28 +451,103 @@ def run_grid_search(fname: str, trace_name: str, cache_size: int) -> None:
     quantum_size = cache_size / SETTINGS["pipeline.num-of-quanta"]
     SIZE_SETTINGS = {'pipeline.quantum-size': quantum_size}
     
-    with Progress() as progress:
+    with Progress() as progress, run_status.mirrored(progress, simulatools.status_file):
         lru_progress = progress.add_task('[bold #adc178]LA-LRU quota', total=16, start=True)
         lfu_progress = progress.add_task('[bold #bedcfe]LA-LFU quota', total=16, start=True)
         for lru_size in range(NUM_OF_QUANTA + 1):
             for lfu_size in range(NUM_OF_QUANTA - lru_size + 1):
                 bc_size = NUM_OF_QUANTA - (lru_size + lfu_size)
-                csv_filename = f'static-{lru_size}-{lfu_size}-{bc_size}-{OUTPUT_SUFFIX}'
-                run_test(fname, trace_name, cache_size, csv_filename, 'pipeline',
-                         name=f"{lru_size}-{lfu_size}-{bc_size}", 
-                         additional_settings={**PIPELINE_CA_SETTINGS_WITHOUT_QUOTA,
-                                              "pipeline.blocks.0.quota": lru_size, 
-                                              "pipeline.blocks.1.quota": lfu_size,
-                                              "pipeline.blocks.2.quota": bc_size,
-                                              **SIZE_SETTINGS},
-                         should_keep_dump=False,
-                         additional_csv_data={'LRU Size': lru_size, 'LFU Size': lfu_size, 'LBU Size': bc_size},
-                         progress_console=progress.console)
+                run_static(fname, trace_name, cache_size, (lru_size, lfu_size, bc_size), SIZE_SETTINGS, progress_console=progress.console)
                 progress.update(lfu_progress, advance=1)
             
             progress.update(lru_progress, advance=1)
             progress.reset(lfu_progress, total=(NUM_OF_QUANTA - lru_size - 1))
 
+
+
+def quota_splits() -> List[Tuple[int, int, int]]:
+    """Every (LRU, LFU, LBU) split of the quanta, as run_grid_search runs them"""
+    return [(lru_size, lfu_size, NUM_OF_QUANTA - (lru_size + lfu_size))
+            for lru_size in range(NUM_OF_QUANTA + 1) for lfu_size in range(NUM_OF_QUANTA - lru_size + 1)]
+
+
+def static_name(split: Tuple[int, int, int], limit: int | None = None) -> str:
+    lru_size, lfu_size, bc_size = split
+    if limit is None:
+        return f'static-{lru_size}-{lfu_size}-{bc_size}-{OUTPUT_SUFFIX}'
+
+    return f'static-{lru_size}-{lfu_size}-{bc_size}-P{limit}-{OUTPUT_SUFFIX}'
+
+
+def run_static(fname: str, trace_name: str, cache_size: int, split: Tuple[int, int, int], size_settings: dict,
+               limit: int | None = None, progress_console = None) -> str:
+    """Runs the static pipeline with the (LRU, LFU, LBU) quota split, on the first limit requests of the trace when given"""
+    lru_size, lfu_size, bc_size = split
+    csv_filename = static_name(split, limit)
+    limit_settings = {TRACE_LIMIT_PATH: limit} if limit is not None else {}
+    limit_data = {'Prefix': limit} if limit is not None else {}
+    run_test(fname, trace_name, cache_size, csv_filename, 'pipeline',
+             name=f"{lru_size}-{lfu_size}-{bc_size}" + (f"-P{limit}" if limit is not None else ""),
+             additional_settings={**PIPELINE_CA_SETTINGS_WITHOUT_QUOTA,
+                                  "pipeline.blocks.0.quota": lru_size,
+                                  "pipeline.blocks.1.quota": lfu_size,
+                                  "pipeline.blocks.2.quota": bc_size,
+                                  **size_settings, **limit_settings},
+             should_keep_dump=False,
+             additional_csv_data={'LRU Size': lru_size, 'LFU Size': lfu_size, 'LBU Size': bc_size, **limit_data},
+             progress_console=progress_console)
+    return csv_filename
+
+
+def recorded_penalties(runs: List[str]) -> dict:
+    """The Average Penalty of every recorded run of the given runs"""
+    if len(runs) == 0 or not RESULTS_DB.exists():
+        return {}
+
+    frame = results_db.query(RESULTS_DB, f'SELECT "Run", "Average Penalty" FROM results WHERE "Run" IN ({", ".join("?" * len(runs))})', runs)
+    return dict(frame.iter_rows())
+
+
+def run_halving_search(fname: str, trace_name: str, cache_size: int) -> None:
+    """
+        Searches the best static (LRU, LFU, LBU) quota split by successive halving: all the splits run on a short prefix of the trace,
+        and the best third of them continues to a prefix three times longer, up to the full trace.
+        The full trace runs are the runs of run_grid_search, so the gap from the exhaustive optimum is reported once the grid search ran.
+    """
+    quantum_size = cache_size / SETTINGS["pipeline.num-of-quanta"]
+    SIZE_SETTINGS = {'pipeline.quantum-size': quantum_size}
+    splits = quota_splits()
+
+    length = simulatools.trace_length(fname, 'latency')
+    with Progress() as progress, run_status.mirrored(progress, simulatools.status_file):
+        for rung in range(HALVING_RUNGS):
+            last = rung == HALVING_RUNGS - 1
+            limit = None if last else max(1, length // HALVING_RATE ** (HALVING_RUNGS - 1 - rung))
+            progress.console.log(f'[bold #adc178]Halving rung {rung + 1} of {HALVING_RUNGS}: {len(splits)} splits on '
+                                 f'{"the full trace" if last else f"{limit} requests"}')
+            runs = {run_static(fname, trace_name, cache_size, split, SIZE_SETTINGS, limit=limit, progress_console=progress.console): split
+                    for split in splits}
+            if SCHEDULER is not None:
+                SCHEDULER.wait()
+
+            penalties = recorded_penalties(list(runs))
+            ranked = sorted((penalty, runs[run]) for run, penalty in penalties.items() if penalty is not None)
+            if len(ranked) == 0:
+                raise RuntimeError(f'No split of rung {rung + 1} of the halving search finished')
+
+            splits = [split for _, split in ranked[:max(1, math.ceil(len(ranked) / HALVING_RATE))]]
+
+    best_penalty, best_split = ranked[0]
+    console.log(f'[bold #ffd166]Best static split (LRU, LFU, LBU): {best_split}, Avg. Pen. {best_penalty:.2f}')
+
+    grid = recorded_penalties([static_name(split) for split in quota_splits()])
+    if len(grid) == len(quota_splits()):
+        optimum_run, optimum = min(grid.items(), key=lambda item: item[1])
+        console.log(f'[bold #ffd166]Exhaustive optimum: {optimum_run}, Avg. Pen. {optimum:.2f}, '
+                    f'the halving search is {100.0 * (best_penalty - optimum) / optimum:.2f}% above it')
+    else:
+        console.log('[bold yellow]Run --run-grid-search to compare the best split with the exhaustive optimum')
+
                   
 def run_adaptive_CA(fname: str, trace_name: str, cache_size: int) -> None:
     csv_filename = f'ACA-{OUTPUT_SUFFIX}'
@@ -320,26 +556,13 @@ def run_adaptive_CA(fname: str, trace_name: str, cache_size: int) -> None:
     
 
 def run_other(fname: str, trace_name: str, cache_size: int):
-    csv_filename = f'Hyperbolic-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'hyperbolic', name="hyperbolic", should_keep_dump=False)
-    
-    csv_filename = f'GDWheel-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'gdwheel', name="GD-Wheel", should_keep_dump=False)
-    
-    csv_filename = f'ARC-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'arc', name="ARC", should_keep_dump=False)
-    
-    csv_filename = f'FRD-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'frd', name="FRD", should_keep_dump=False)
-    
-    csv_filename = f'LA-Cache-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'yan_li', name="LA-Cache", should_keep_dump=False)
-
-    csv_filename = f'S3-FIFO-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 's3_fifo', name="S3-FIFO", should_keep_dump=False)
-
-    csv_filename = f'SIEVE-{OUTPUT_SUFFIX}'
-    run_test(fname, trace_name, cache_size, csv_filename, 'sieve', name="SIEVE", should_keep_dump=False)
+    run_tests(fname, trace_name, cache_size, [(f'Hyperbolic-{OUTPUT_SUFFIX}', 'hyperbolic', "hyperbolic"),
+                                              (f'GDWheel-{OUTPUT_SUFFIX}', 'gdwheel', "GD-Wheel"),
+                                              (f'ARC-{OUTPUT_SUFFIX}', 'arc', "ARC"),
+                                              (f'FRD-{OUTPUT_SUFFIX}', 'frd', "FRD"),
+                                              (f'LA-Cache-{OUTPUT_SUFFIX}', 'yan_li', "LA-Cache"),
+                                              (f'S3-FIFO-{OUTPUT_SUFFIX}', 's3_fifo', "S3-FIFO"),
+                                              (f'SIEVE-{OUTPUT_SUFFIX}', 'sieve', "SIEVE")])
     
     
 def main():
@@ -352,30 +575,28 @@ def main():
     parser.add_argument('--cache-size', help="The cache size, overrides the default values", required=False, type=int)
     parser.add_argument('--run-all-shc', help="Run rounds of Sample Hill Climber with variable rates", action='store_true', required=False)
     parser.add_argument('--run-single-shc', help="Run rounds of Sample Hill Climber with a single rate", action='store_true', required=False)
+    parser.add_argument('--ci-tolerance', help="Stop running rounds of a sample rate once the 95%% confidence interval of its Average Penalty "
+                        "is narrower than this fraction of the mean (e.g. 0.01)", required=False, type=float)
+    parser.add_argument('--min-rounds', help="The rounds run before stopping early with --ci-tolerance (default: 3)", required=False, type=int, default=3)
     parser.add_argument('--run-aca', help="Run rounds of the Adaptive Cost-Aware Window-TinyLFU", action='store_true', required=False)
     parser.add_argument('--run-base', help="Run the baseline test of FGHC RFB and RF", action='store_true', required=False)
     parser.add_argument('--run-grid-search', help="Run grid search for finding the optimal static configuration", action='store_true', required=False)
+    parser.add_argument('--run-halving-search', help="Search the best static configuration by successive halving over prefixes of the trace",
+                        action='store_true', required=False)
     parser.add_argument('--run-other', help="Run comparison algorithms, not including LHD and LRB", action='store_true', required=False)
+    parser.add_argument('-j', '--jobs', help="Number of simulator runs executed concurrently, 0 picks it by the available cores and memory (default: 1)",
+                        required=False, type=int, default=1)
+    parser.add_argument('--resume', help="Run the unfinished jobs of the campaign's journal, with their recorded arguments, before the selected experiments",
+                        action='store_true', required=False)
+    parser.add_argument('--retries', help="Number of times a failed job is retried, with an exponential backoff (default: 2)",
+                        required=False, type=int, default=2)
+    parser.add_argument('--queue', help="Only add the jobs to this shared queue (an SQLite file), for workers (worker.py) to run",
+                        required=False, type=Path)
 
     args = parser.parse_args()
 
     console.print(f'[bold]Running with args:[/bold]\n{args}')
 
-    dump_path = Path(caffeine_root)
-    console.print(f'[bold yellow]Cleaning up temporary files in {dump_path}')
-
-    for csv_file in dump_path.rglob('*.csv'):
-        csv_file.unlink()
-        console.print(f'[dim]Removed {csv_file.name}')
-
-    for quota_file in dump_path.rglob('*.quota_dump'):
-        quota_file.unlink()
-        console.print(f'[dim]Removed {quota_file.name}')
-
-    for results_file in dump_path.rglob('*.results_dump'):
-        results_file.unlink()
-        console.print(f'[dim]Removed {results_file.name}')
-    
     file = Path(args.input)
 
     trace_name = args.trace_name if args.trace_name else file.stem.split('-')[0].lower()
@@ -390,31 +611,35 @@ def main():
     OUTPUT_SUFFIX = f'{trace_name}-{dists}-{cache_size}'
     
     print(f'the output suffix will be: {OUTPUT_SUFFIX}')
+
+    global JOURNAL, RETRIES, QUEUE_ONLY
+    QUEUE_ONLY = args.queue is not None
+    JOURNAL = JobJournal(args.queue if QUEUE_ONLY else Path(RESULTS_DIR) / 'campaigns' / f'{OUTPUT_SUFFIX}.sqlite')
+    RETRIES = args.retries
+    console.print(f'[bold]Campaign journal: {JOURNAL.path}, jobs: {JOURNAL.counts()}')
+
+    global SCHEDULER
+    workers = args.jobs if args.jobs > 0 else default_workers(simulatools.stage_memory())
+    if workers > 1 and not QUEUE_ONLY:
+        console.print(f'[bold]Running up to {workers} simulations concurrently')
+        SCHEDULER = RunScheduler(workers)
+
+    if args.resume:
+        for job_id, function, job_args, job_kwargs in JOURNAL.unfinished():
+            submit_job(job_id, function, job_args, job_kwargs)
     
     if args.run_base:
         run_full_ghost(file.name, trace_name, cache_size)
         run_all_simple(file.name, trace_name, cache_size)
         
-    if args.rounds is not None and (args.run_single_shc is not None or args.run_all_shc):
-        with Progress() as progress:
-            round_progress = progress.add_task('[bold #adc178]Rounds', total=args.rounds, start=True)
-            for round in range(args.rounds):
-                seed = abs(int.from_bytes(urandom(4), 'big', signed=True))
-                progress.console.log(f"Starting round {round + 1} of {args.rounds}: {100.0 * round / args.rounds}%, seed: {seed}",
-                                     style='bold #adc178')
-                
-                if args.run_single_shc:
-                    run_single_sampled(file.name, trace_name, cache_size, 
-                                       args.round_index_start + round + 1, seed, 
-                                       progress=progress, sample_rate=2)
-                elif args.run_all_shc:
-                    run_sampled_all(file.name, trace_name, cache_size, 
-                                    args.round_index_start + round + 1, seed, 
-                                    progress=progress)
-                else:
-                    raise AssertionError("Should be either run-single or run-all")
-                
-                progress.update(round_progress, advance=1)
+    if args.rounds is not None and (args.run_single_shc or args.run_all_shc):
+        if args.ci_tolerance is not None and QUEUE_ONLY:
+            console.print('[bold red]Error: stopping rounds early needs the results of the rounds, it cannot only queue its jobs')
+            exit(1)
+
+        run_rounds(file.name, trace_name, cache_size, args.rounds, args.round_index_start,
+                   [2] if args.run_single_shc else sample_rates(cache_size), args.run_single_shc,
+                   args.ci_tolerance, args.min_rounds)
     
     if args.run_aca:
         run_adaptive_CA(file.name, trace_name, cache_size)
@@ -422,8 +647,29 @@ def main():
     if args.run_grid_search:
         run_grid_search(file.name, trace_name, cache_size)
                 
+    if args.run_halving_search:
+        if QUEUE_ONLY:
+            console.print('[bold red]Error: the halving search needs the results of every rung, it cannot only queue its jobs')
+            exit(1)
+
+        run_halving_search(file.name, trace_name, cache_size)
+
     if args.run_other:
         run_other(file.name, trace_name, cache_size)
+
+    if SCHEDULER is not None:
+        SCHEDULER.close()
+
+    if QUEUE_ONLY:
+        console.print(f'[bold]Queued the jobs in {JOURNAL.path}, jobs: {JOURNAL.counts()}')
+        return
+
+    failed = JOURNAL.failed()
+    if len(failed) > 0:
+        for job_id, error in failed:
+            console.print(f'[bold red]Failed: {job_id}: {error}')
+        console.print(f'[bold red]{len(failed)} jobs failed, rerun with --resume to retry them')
+        exit(1)
         
     console.log("[bold #a3b18a]#####################\tDone\t#####################\n\n")
 
@@ -2,6 +2,8 @@
 
 import argparse
 import simulatools
+import results_db
+from journal import JobJournal, inputs_digest
 import re
 from pathlib import Path
 import json
@@ -20,6 +22,7 @@ caffeine_root = local_conf['caffeine_root']
 resources = local_conf['resources'] if local_conf['resources'] != '' else caffeine_root
 TRACES_DIR = f'{resources}'
 RESULTS_DIR = local_conf['results'] if local_conf['results'] != '' else './results/'
+RESULTS_DB = Path(RESULTS_DIR) / results_db.DB_NAME
 
 pretty.install()
 console = Console()
@@ -45,12 +48,11 @@ def get_trace_name(input_file: Path):
 
 def run_mock(fname: str, trace_name: str, cache_size: int, trace_folder: str, algorithm_name: str) -> None:
     output_filename = f'{algorithm_name}-{trace_name}'
-    output_path = Path(RESULTS_DIR) / f'{output_filename}.csv'
 
     console.log(f'[bold #a98467]Running {algorithm_name} on trace: {trace_name}, size: {cache_size}')
 
-    if output_path.exists():
-        console.log(f'[yellow]Output file already exists, skipping: {output_path}')
+    if not simulatools.use_store and results_db.has_run(RESULTS_DB, output_filename):
+        console.log(f'[yellow]Results already exist, skipping: {output_filename}')
         return
 
     Path(RESULTS_DIR).mkdir(parents=True, exist_ok=True)
@@ -68,19 +70,22 @@ def run_mock(fname: str, trace_name: str, cache_size: int, trace_folder: str, al
     )
 
     if single_run_result is False:
-        console.log(f'[bold red]Error running {algorithm_name} on {fname}: exiting')
-        exit(1)
+        raise RuntimeError(f'The simulator failed running {algorithm_name} on {fname}')
     else:
         single_run_result['Cache Size'] = cache_size
         single_run_result['Trace'] = trace_name
         single_run_result['Algorithm'] = algorithm_name
 
-        single_run_result.to_csv(output_path, index=False)
-        console.log(f"[bold #ffd166]Results saved to: {output_path}")
+        results_db.record_run(RESULTS_DB, output_filename, single_run_result)
+        console.log(f"[bold #ffd166]Results recorded as {output_filename} in: {RESULTS_DB}")
         console.log(f"[bold #ffd166]Hit Rate: {single_run_result['Hit Rate'].iloc[0]:.4f}")
         console.log(f"[bold #ffd166]Avg. Penalty: {int(single_run_result['Average Penalty'].iloc[0])}")
 
 
+# The functions a job of the shared queue may call, by name (see worker.py)
+JOBS = {'run_mock': run_mock}
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Run mock policy experiments on marked traces (traces with LHD/LRB predictions)'
@@ -91,6 +96,7 @@ def main():
     parser.add_argument('--cache-size', help='Cache size in entries (overrides default)', required=False, type=int)
     parser.add_argument('--trace-folder', help='Trace folder within resources directory', required=False, type=str, default='latency')
     parser.add_argument('--algorithm-name', help='Name to use for output files (default: mock)', required=False, type=str, default='mock')
+    parser.add_argument('--queue', help='Only add the run to this shared queue (an SQLite file), for workers (worker.py) to run', required=False, type=Path)
 
     args = parser.parse_args()
 
@@ -111,6 +117,16 @@ def main():
     console.print(f'[bold cyan]Trace folder: {args.trace_folder}')
     console.print(f'[bold cyan]Full trace path: {trace_file_path}')
 
+    if args.queue is not None:
+        queue = JobJournal(args.queue)
+        job_id = f'{args.algorithm_name}-{trace_name}'
+        inputs = inputs_digest(build=simulatools.simulator_build_id(), trace=simulatools.trace_digest(trace_file_path))
+        if queue.enqueue(job_id, 'run_mock', [input_filename, trace_name, cache_size, args.trace_folder, args.algorithm_name], {}, inputs):
+            console.print(f'[bold green]Queued {job_id} in {args.queue}')
+        else:
+            console.print(f'[bold yellow]{job_id} is already done in {args.queue}')
+        return
+
     dump_path = Path(caffeine_root)
     console.print(f'[bold yellow]Cleaning up temporary CSV files in {dump_path}')
 
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+
+import argparse
+import datetime
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+from rich.console import Console
+from rich.live import Live
+from rich.progress import Progress
+from rich.table import Table
+
+from staging import detect_compression, is_alive
+
+STATUS_INTERVAL = 5
+SAMPLE_SIZE = 1024 ** 2
+
+console = Console()
+
+
+def read_position(pid: int, path: Path) -> int | None:
+    """The offset of the process in the file at path, read from /proc, None if the process does not have the file open"""
+    fd_dir = Path(f'/proc/{pid}/fd')
+    try:
+        descriptors = list(fd_dir.iterdir())
+    except OSError:
+        return None
+
+    for descriptor in descriptors:
+        try:
+            if os.readlink(descriptor) != str(path):
+                continue
+            with open(f'/proc/{pid}/fdinfo/{descriptor.name}', 'r') as info:
+                for line in info:
+                    if line.startswith('pos:'):
+                        return int(line.split()[1])
+        except OSError:
+            continue
+
+    return None
+
+
+def estimate_requests(path: Path) -> int | None:
+    """The number of requests (lines) of a plain trace, estimated by the lines of its first megabyte, None if it is compressed"""
+    if detect_compression(path) is not None:
+        return None
+
+    with path.open('rb') as trace:
+        sample = trace.read(SAMPLE_SIZE)
+
+    lines = sample.count(b'\n')
+    if lines == 0:
+        return None
+
+    return round(path.stat().st_size * lines / len(sample))
+
+
+class StatusFile():
+    """
+        The progress of the running simulator runs of the host (or of the hosts sharing the output directory), by run id,
+        kept in a single JSON file for dashboards to poll. Every run updates its own entry under an exclusive lock of the file,
+        the entries of runs whose process died on this host are dropped.
+    """
+    __slots__ = 'path'
+    def __init__(self, path: Path):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.with_name(f'.{self.path.name}.lock').open('w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, dict]:
+        runs = {}
+        if self.path.exists():
+            with self.path.open('r') as file:
+                runs = json.load(file)
+
+        host = socket.gethostname()
+        return {run_id: status for run_id, status in runs.items() if status['host'] != host or is_alive(status['process'])}
+
+    def _save(self, runs: Dict[str, dict]) -> None:
+        with self.path.with_suffix('.tmp').open('w') as file:
+            json.dump(runs, file, indent=1)
+        self.path.with_suffix('.tmp').replace(self.path)
+
+    def load(self) -> Dict[str, dict]:
+        if not self.path.exists():
+            return {}
+
+        with self._locked():
+            return self._load()
+
+    def update(self, run_id: str, status: dict) -> None:
+        with self._locked():
+            runs = self._load()
+            runs[run_id] = status
+            self._save(runs)
+
+    def remove(self, run_id: str) -> None:
+        with self._locked():
+            runs = self._load()
+            runs.pop(run_id, None)
+            self._save(runs)
+
+
+def run_progress(pid: int, trace: Path, size: int, requests: int | None, limit: int | None, started: float) -> dict:
+    """The progress of the simulator process replaying the trace, by its offset in the trace (the trace is read sequentially)"""
+    position = read_position(pid, trace)
+    fraction = position / size if position is not None and size > 0 else 0.0
+    total = requests
+    if requests is not None and limit is not None:
+        fraction = min(1.0, fraction * requests / limit)
+        total = min(requests, limit)
+
+    elapsed = time.time() - started
+    replayed = round(fraction * total) if total is not None else None
+    return {'fraction': fraction,
+            'requests': replayed,
+            'total': total,
+            'rate': replayed / elapsed if replayed is not None and elapsed > 0 else None,
+            'eta': elapsed * (1 - fraction) / fraction if fraction > 0 else None}
+
+
+@contextmanager
+def monitored(status_file: StatusFile, run_id: str, pid: int, trace: Path, details: dict,
+              requests: int | None = None, limit: int | None = None, interval: float = STATUS_INTERVAL):
+    """
+        Records the progress of the simulator process in the status file every interval while the block runs, and removes it after.
+        requests is the length of the trace, estimated from the trace when not given, and limit the requests the run replays of it.
+    """
+    trace = trace.resolve()
+    size = trace.stat().st_size
+    if requests is None:
+        requests = estimate_requests(trace)
+
+    started = time.time()
+    status = {'host': socket.gethostname(), 'process': os.getpid(), 'parent': os.getppid(), 'simulator': pid, **details,
+              'started': started, 'updated': started, **run_progress(pid, trace, size, requests, limit, started)}
+    status_file.update(run_id, status)
+
+    stop = threading.Event()
+    def monitor():
+        while not stop.wait(interval):
+            status.update(run_progress(pid, trace, size, requests, limit, started), updated=time.time())
+            status_file.update(run_id, status)
+
+    thread = threading.Thread(target=monitor, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        status_file.remove(run_id)
+
+
+def format_seconds(seconds: float | None) -> str:
+    return str(datetime.timedelta(seconds=round(seconds))) if seconds is not None else '?'
+
+
+def describe(status: dict) -> str:
+    rate = f'{status["rate"]:,.0f} req/s' if status['rate'] is not None else '? req/s'
+    return f'[#bedcfe]{status["name"]}: {rate}, ETA {format_seconds(status["eta"])}'
+
+
+@contextmanager
+def mirrored(progress: Progress, status_file: StatusFile, interval: float = STATUS_INTERVAL):
+    """
+        Shows the runs of this process (inline or in its scheduler's workers) as tasks of the progress while the block runs,
+        with their request rate and ETA.
+    """
+    host = socket.gethostname()
+    tasks = {}
+    stop = threading.Event()
+    def mirror():
+        while not stop.wait(interval):
+            runs = {run_id: status for run_id, status in status_file.load().items()
+                    if status['host'] == host and os.getpid() in (status['process'], status['parent'])}
+            for run_id in [run_id for run_id in tasks if run_id not in runs]:
+                progress.remove_task(tasks.pop(run_id))
+            for run_id, status in runs.items():
+                if run_id not in tasks:
+                    tasks[run_id] = progress.add_task(describe(status), total=1.0, start=True)
+                progress.update(tasks[run_id], completed=status['fraction'], description=describe(status))
+
+    thread = threading.Thread(target=mirror, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+        for task in tasks.values():
+            progress.remove_task(task)
+
+
+def status_table(runs: Dict[str, dict]) -> Table:
+    table = Table('Host', 'Run', 'Trace', 'Progress', 'Requests', 'Rate (req/s)', 'Elapsed', 'ETA', 'Updated')
+    now = time.time()
+    for status in sorted(runs.values(), key=lambda status: status['started']):
+        requests = f'{status["requests"]:,} / {status["total"]:,}' if status['requests'] is not None else '?'
+        rate = f'{status["rate"]:,.0f}' if status['rate'] is not None else '?'
+        table.add_row(status['host'], status['name'], status['trace'], f'{100 * status["fraction"]:.1f}%', requests, rate,
+                      format_seconds(now - status['started']), format_seconds(status['eta']), f'{now - status["updated"]:.0f}s ago')
+
+    return table
+
+
+def main():
+    import simulatools
+
+    parser = argparse.ArgumentParser(description='Show the progress of the running simulator runs')
+    parser.add_argument('--status', help=f'The status file (default: {simulatools.status_file.path})',
+                        required=False, type=Path, default=simulatools.status_file.path)
+    parser.add_argument('--watch', help='Refresh the table every given seconds until interrupted', required=False, type=float)
+    parser.add_argument('--json', help='Print the status file as JSON', action='store_true', required=False)
+
+    args = parser.parse_args()
+    status_file = StatusFile(args.status)
+
+    if args.json:
+        print(json.dumps(status_file.load(), indent=1))
+    elif args.watch is None:
+        console.print(status_table(status_file.load()))
+    else:
+        with Live(status_table(status_file.load()), console=console) as live:
+            while True:
+                time.sleep(args.watch)
+                live.update(status_table(status_file.load()))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,9 +2,13 @@
 
 import argparse
 import simulatools
+import results_db
+import dumps
 import random
 from pathlib import Path
 import json
+import shutil
+import tempfile
 import pandas as pd
 import numpy as np
 
@@ -71,6 +75,7 @@ def run_pipeline_experiment(trace_file: str, cache_size: int, algorithm_name: st
 
     quantum_size = cache_size / NUM_OF_QUANTA
     settings = {**config, 'pipeline.quantum-size': quantum_size}
+    dump_dir = Path(tempfile.mkdtemp(prefix=f'{algorithm_name}-', dir=RESULTS_DIR))
 
     single_run_result = simulatools.single_run(
         'sampled_ghost',
@@ -81,7 +86,8 @@ def run_pipeline_experiment(trace_file: str, cache_size: int, algorithm_name: st
         additional_settings=settings,
         name=f'{algorithm_name}-synthetic',
         save=False,
-        verbose=False
+        verbose=False,
+        dump_dir=dump_dir
     )
 
     if single_run_result is False:
@@ -91,14 +97,15 @@ def run_pipeline_experiment(trace_file: str, cache_size: int, algorithm_name: st
     console.log(f"[bold #ffd166]{algorithm_name} - Hit Rate: {single_run_result['Hit Rate'].iloc[0]:.4f}")
     console.log(f"[bold #ffd166]{algorithm_name} - Avg. Penalty: {int(single_run_result['Average Penalty'].iloc[0])}")
 
-    dump_files = list(caffeine_root.rglob('*.results_dump'))
+    dump_files = list(dump_dir.rglob('*.results_dump'))
     if len(dump_files) != 1:
         console.log(f'[bold red]Error: Expected 1 results_dump file, found {len(dump_files)}')
         exit(1)
 
     dump_file = dump_files[0]
     destination = RESULTS_DIR / f'{algorithm_name}-synthetic.results_dump'
-    dump_file.rename(destination)
+    dumps.keep_dump(dump_file, destination, simulatools.encode_dumps)
+    shutil.rmtree(dump_dir)
     console.log(f'[bold green]Saved results dump to: {destination}')
 
     return destination
@@ -124,6 +131,12 @@ def run_mock_on_split(split_file: Path, cache_size: int, algorithm_name: str,
         console.log(f'[bold red]Error running mock on {split_file.name}')
         exit(1)
 
+    single_run_result['Cache Size'] = cache_size
+    single_run_result['Trace'] = 'synthetic'
+    single_run_result['Algorithm'] = algorithm_name
+    single_run_result['Traffic Type'] = trace_type
+    results_db.record_run(RESULTS_DIR / results_db.DB_NAME, f'mock-{algorithm_name}-{trace_type}-synthetic', single_run_result)
+
     hit_rate = single_run_result['Hit Rate'].iloc[0]
     avg_penalty = single_run_result['Average Penalty'].iloc[0]
 
@@ -235,7 +248,7 @@ def main():
     for algo_name, config in experiments:
         expected_dump = RESULTS_DIR / f'{algo_name}-synthetic.results_dump'
 
-        if expected_dump.exists():
+        if not simulatools.use_store and expected_dump.exists():
             console.print(f'[bold yellow]Skipping {algo_name} experiment, dump file already exists: {expected_dump}')
             dump_files[algo_name] = expected_dump
         else:
@@ -0,0 +1,72 @@
+import os
+
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from typing import Callable, List
+
+# Every simulator run is mostly single threaded, with its GC threads, and asks for an 8g heap (simulatools.SIMULATOR_HEAP)
+CORES_PER_RUN = 2
+MEMORY_PER_RUN = 9 * 1024 ** 3
+
+
+def available_memory() -> int:
+    with open('/proc/meminfo', 'r') as meminfo:
+        for line in meminfo:
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1]) * 1024
+
+    raise RuntimeError('MemAvailable is missing from /proc/meminfo')
+
+
+def default_workers(reserved_memory: int = 0) -> int:
+    """
+        The number of concurrent runs fitting both the available cores and the available memory,
+        leaving reserved_memory free (the trace stage, when it is kept in memory)
+    """
+    cores = len(os.sched_getaffinity(0))
+    return max(1, min(cores // CORES_PER_RUN, max(0, available_memory() - reserved_memory) // MEMORY_PER_RUN))
+
+
+class RunScheduler():
+    """
+        Runs independent simulator runs concurrently in a process pool.
+        The failure of a run (including exit()) is raised by wait(), after the submitted runs end.
+    """
+    __slots__ = 'workers', '_executor', '_futures'
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers)
+        self._futures : List[Future] = []
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = self._executor.submit(fn, *args, **kwargs)
+        self._futures.append(future)
+        return future
+
+    def wait(self) -> None:
+        futures, self._futures = self._futures, []
+        failure = None
+        for future in as_completed(futures):
+            if future.exception() is not None and failure is None:
+                failure = future.exception()
+
+        if failure is not None:
+            raise failure
+
+    def close(self) -> None:
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    print("This is a library file, please run experiments from another script.")
@@ -1,14 +1,24 @@
 from policies import Policy
+from staging import TraceStage, count_lines
+from run_status import StatusFile, monitored
 from pathlib import Path
+from contextlib import contextmanager, nullcontext
+import fcntl
+import hashlib
 import json
+import os
+import re
+import shutil
 import subprocess
+import tempfile
+import time
 from pyhocon import ConfigFactory
 from pyhocon import ConfigTree
 from pyhocon import HOCONConverter
 from enum import Enum
 import pandas as pd
 
-from typing import Union, List
+from typing import Callable, ContextManager, Union, List, Tuple
 
 
 with open(Path(__file__).parent / 'conf.json') as conf_file:
@@ -17,6 +27,69 @@ caffeine_root = Path(local_conf['caffeine_root'])
 resources_path = Path(local_conf['resources']) if local_conf['resources'] else caffeine_root / 'simulator' / 'src' / 'main' / 'resources' / 'com' / 'github' / 'benmanes' / 'caffeine' / 'cache' / 'simulator' / 'parser'
 output_path = Path(local_conf['output']) if local_conf['output'] else Path.cwd()
 output_csvs_path = output_path / 'csvs'
+runs_path = output_path / 'runs'
+base_conf_file = caffeine_root / 'simulator' / 'src' / 'main' / 'resources' / 'application.conf'
+launch_cache_file = output_path / 'simulator-launch.json'
+store_path = output_path / 'store'
+store_index_file = store_path / 'index.jsonl'
+
+# 'java' launches the simulator directly with the cached classpath, 'gradle' runs it through gradle as before
+launcher = local_conf.get('launcher', 'java')
+
+# Runs are looked up in the result store before running the simulator, unless "result_store" is false
+use_store = local_conf.get('result_store', True)
+
+# Compressed traces are decompressed once into the stage, in memory (/dev/shm) when the budget fits in it, unless "stage" is false
+use_stage = local_conf.get('stage', True)
+stage_budget = int(local_conf.get('stage_budget_gb', 32) * 1024 ** 3)
+shm_path = Path('/dev/shm')
+stage_path = Path(local_conf['stage_dir']) if local_conf.get('stage_dir') else \
+             shm_path / 'trace-stage' if shm_path.is_dir() and shutil.disk_usage(shm_path).free > stage_budget else output_path / 'stage'
+trace_stage = TraceStage(stage_path, stage_budget)
+
+# The progress of the running runs (requests replayed, rate and ETA) is kept in status.json for dashboards, unless "status" is false
+use_status = local_conf.get('status', True)
+status_file = StatusFile(output_path / 'status.json')
+
+# Dumps kept in the results directory are encoded as Parquet (see dumps.py), unless "encode_dumps" is false
+encode_dumps = local_conf.get('encode_dumps', True)
+
+SIMULATOR_HEAP = '8g'
+GRADLE_SKIP_ARGS = '-x caffeine:compileJava -x caffeine:compileCodeGenJava'
+DUMP_PATTERNS = ['*.results_dump', '*.quota_dump']
+SOURCE_PATTERNS = ['*.gradle*', 'gradle/*.toml', 'simulator/*.gradle*', 'caffeine/*.gradle*',
+                   'simulator/src/**/*.java', 'caffeine/src/**/*.java']
+HASH_CHUNK_SIZE = 16 * 1024 ** 2
+
+# A pause in the JVM's unified GC log (-Xlog:gc), e.g. 'GC(3) Pause Young (Normal) (G1 Evacuation Pause) 120M->30M(512M) 5.123ms'
+GC_PAUSE = re.compile(r'GC\(\d+\) Pause (\w+).* (\d+)M->(\d+)M\((\d+)M\) ([\d.]+)ms')
+
+# Adds a task printing the classpath, main class and JVM arguments of the simulator's run task
+LAUNCH_INIT_SCRIPT = """
+allprojects {
+    afterEvaluate { project ->
+        if (project.name == 'simulator') {
+            project.tasks.register('printSimulatorLaunch') {
+                dependsOn 'classes'
+                doLast {
+                    def run = project.tasks.getByName('run')
+                    def mainClass = run.hasProperty('mainClass') && run.mainClass.getOrNull() != null ? run.mainClass.get() : run.main
+                    println 'SIMULATOR-LAUNCH ' + groovy.json.JsonOutput.toJson([
+                        classpath: run.classpath.files.collect { it.absolutePath },
+                        main_class: mainClass,
+                        jvm_args: run.allJvmArgs,
+                        args: run.args,
+                        executable: run.executable ?: 'java'])
+                }
+            }
+        }
+    }
+}
+"""
+
+_launch = None
+_build_id = None
+_trace_digests = {}
 
 
 class Admission(Enum):
@@ -24,67 +97,477 @@ class Admission(Enum):
     TINY_LFU = 'TinyLfu'
 
 
+@contextmanager
+def file_lock(lock_path: Path, exclusive: bool = True):
+    with lock_path.open('w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def sources_stamp() -> int:
+    """The latest modification of the simulator's sources and build scripts, a newer one invalidates the cached launch"""
+    stamp = 0
+    for pattern in SOURCE_PATTERNS:
+        for file in caffeine_root.glob(pattern):
+            stamp = max(stamp, file.stat().st_mtime_ns)
+
+    return stamp
+
+
+def resolve_launch() -> dict:
+    """Compiles the simulator through gradle and returns its launch (classpath, main class and JVM arguments)"""
+    with tempfile.NamedTemporaryFile('w', suffix='.gradle') as init_script:
+        init_script.write(LAUNCH_INIT_SCRIPT)
+        init_script.flush()
+        output = subprocess.run(f'./gradlew -q --init-script {init_script.name} simulator:printSimulatorLaunch {GRADLE_SKIP_ARGS}',
+                                shell=True, cwd=str(caffeine_root), capture_output=True, text=True, check=True).stdout
+
+    for line in output.splitlines():
+        if line.startswith('SIMULATOR-LAUNCH '):
+            return json.loads(line[len('SIMULATOR-LAUNCH '):])
+
+    raise RuntimeError(f'Could not resolve the simulator classpath, gradle printed: {output}')
+
+
+def simulator_launch() -> dict:
+    """
+        The launch of the simulator, resolved once and cached in launch_cache_file until the sources change.
+        The sources are compared once per process, as a run does not recompile the simulator.
+    """
+    global _launch
+    if _launch is not None:
+        return _launch
+
+    output_path.mkdir(parents=True, exist_ok=True)
+    with file_lock(output_path / '.simulator-launch.lock'):
+        stamp = sources_stamp()
+        if launch_cache_file.exists():
+            with launch_cache_file.open('r') as cache_file:
+                cached = json.load(cache_file)
+            if cached['stamp'] == stamp:
+                _launch = cached['launch']
+                return _launch
+
+        _launch = resolve_launch()
+        with launch_cache_file.open('w') as cache_file:
+            json.dump({'stamp': stamp, 'launch': _launch}, cache_file)
+
+    return _launch
+
+
+def simulator_command(conf_file: Path, gc_log: Path) -> List[str]:
+    launch = simulator_launch()
+    jvm_args = [arg for arg in launch['jvm_args'] if not arg.startswith('-Xmx') and not arg.startswith('-Dconfig.file=')]
+    return [launch['executable'], *jvm_args, f'-Xmx{SIMULATOR_HEAP}', f'-Xlog:gc:file={gc_log}', f'-Dconfig.file={conf_file}',
+            '-cp', os.pathsep.join(launch['classpath']), launch['main_class'], *launch['args']]
+
+
+def find_dumps(path: Path) -> List[Path]:
+    return [file for pattern in DUMP_PATTERNS for file in path.rglob(pattern)]
+
+
+def call_accounted(command, monitor: Callable[[int], ContextManager] | None = None, **kwargs) -> Tuple[int, dict]:
+    """
+        Runs the command, returning its exit code and the wall time and CPU time of the process and its waited descendants,
+        with the largest peak RSS of a single one of them (not of the whole tree at once, as wait4 reports it).
+        The process is watched by the context of monitor (given its pid) while it runs.
+    """
+    started = time.monotonic()
+    process = subprocess.Popen(command, **kwargs)
+    with monitor(process.pid) if monitor is not None else nullcontext():
+        _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, {'Wall Time (s)': time.monotonic() - started,
+                                'CPU Time (s)': usage.ru_utime + usage.ru_stime,
+                                'Peak Process RSS (MB)': usage.ru_maxrss / 1024}
+
+
+def gc_summary(gc_log: Path) -> dict:
+    """The number and duration of the GC pauses in the log, and the peak heap usage and capacity before them"""
+    pauses = []
+    with gc_log.open('r') as log:
+        for line in log:
+            match = GC_PAUSE.search(line)
+            if match:
+                kind, before, _, capacity, duration = match.groups()
+                pauses.append((kind, int(before), int(capacity), float(duration)))
+
+    return {'GC Pauses': len(pauses),
+            'Full GC Pauses': sum(1 for kind, _, _, _ in pauses if kind == 'Full'),
+            'GC Pause Time (s)': sum(duration for _, _, _, duration in pauses) / 1000,
+            'GC Max Pause (ms)': max((duration for _, _, _, duration in pauses), default=0.0),
+            'Peak Heap (MB)': max((before for _, before, _, _ in pauses), default=0),
+            'Heap Capacity (MB)': max((capacity for _, _, capacity, _ in pauses), default=0)}
+
+
+def run_simulator(conf_file: Path, run_dir: Path, dump_dir: Path | None, verbose: bool,
+                  monitor: Callable[[int], ContextManager] | None = None) -> Tuple[int, dict]:
+    """
+        Runs the simulator on the configuration, moving the dumps it writes to dump_dir (or discarding them).
+        Launched directly, the simulator runs in run_dir, so its dumps are private.
+        Through gradle it runs in the simulator's project directory, runs collecting their dumps hold the dumps lock
+        exclusively, so concurrent runs would not mix their dumps, the rest share it.
+        Returns the exit code and the resource usage of the run, with the GC summary of the simulator's JVM when launched directly
+        (through gradle, the simulator runs in a JVM forked by the gradle daemon, so only gradle's client is accounted).
+        The simulator's process is watched by monitor when launched directly, through gradle its progress is not followed.
+    """
+    stdout = subprocess.DEVNULL if not verbose else None
+    if launcher == 'java':
+        gc_log = run_dir / 'gc.log'
+        retcode, usage = call_accounted(simulator_command(conf_file, gc_log), monitor=monitor, cwd=str(run_dir), stdout=stdout)
+        if gc_log.exists():
+            usage.update(gc_summary(gc_log))
+        dumps = find_dumps(run_dir)
+    else:
+        run_simulator_cmd = f'./gradlew simulator:run {GRADLE_SKIP_ARGS} -PjvmArgs=-Xmx{SIMULATOR_HEAP}'
+        # The forked simulator JVM inherits the environment, reading the configuration of this run instead of application.conf
+        run_env = {**os.environ, 'JAVA_TOOL_OPTIONS': f'-Dconfig.file={conf_file}'}
+        with file_lock(caffeine_root / '.dumps.lock', exclusive=dump_dir is not None):
+            if dump_dir is not None:
+                for stale_dump in find_dumps(caffeine_root):
+                    stale_dump.unlink()
+
+            retcode, usage = call_accounted(run_simulator_cmd, shell = True, cwd = str(caffeine_root), env = run_env, stdout = stdout)
+            dumps = find_dumps(caffeine_root)
+
+    for dump in dumps:
+        if dump_dir is not None:
+            shutil.move(dump, dump_dir / dump.name)
+        else:
+            dump.unlink(missing_ok=True)
+
+    return retcode, usage
+
+
+def file_digest(path: Path) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with path.open('rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def trace_digest(trace_path: Path) -> str:
+    """The digest of the trace's contents, cached in the store until the size or modification time of the trace changes"""
+    stat = trace_path.stat()
+    stamp = [stat.st_size, stat.st_mtime_ns]
+    path = str(trace_path.resolve())
+    cached = _trace_digests.get(path)
+    if cached is not None and cached['stamp'] == stamp:
+        return cached['digest']
+
+    store_path.mkdir(parents=True, exist_ok=True)
+    digests_file = store_path / 'traces.json'
+    with file_lock(store_path / '.traces.lock'):
+        digests = {}
+        if digests_file.exists():
+            with digests_file.open('r') as cache_file:
+                digests = json.load(cache_file)
+
+        entry = digests.get(path)
+        if entry is None or entry['stamp'] != stamp:
+            entry = {'stamp': stamp, 'digest': file_digest(trace_path)}
+            digests[path] = entry
+            with digests_file.open('w') as cache_file:
+                json.dump(digests, cache_file)
+
+    _trace_digests[path] = entry
+    return entry['digest']
+
+
+def simulator_build_id() -> str:
+    """The digest of the simulator's sources and build scripts, cached in the store until they change (see sources_stamp)"""
+    global _build_id
+    if _build_id is not None:
+        return _build_id
+
+    store_path.mkdir(parents=True, exist_ok=True)
+    build_file = store_path / 'build.json'
+    with file_lock(store_path / '.build.lock'):
+        stamp = sources_stamp()
+        if build_file.exists():
+            with build_file.open('r') as cache_file:
+                cached = json.load(cache_file)
+            if cached['stamp'] == stamp:
+                _build_id = cached['build_id']
+                return _build_id
+
+        digest = hashlib.blake2b(digest_size=20)
+        for pattern in SOURCE_PATTERNS:
+            for file in sorted(caffeine_root.glob(pattern)):
+                digest.update(str(file.relative_to(caffeine_root)).encode())
+                digest.update(file.read_bytes())
+
+        _build_id = digest.hexdigest()
+        with build_file.open('w') as cache_file:
+            json.dump({'stamp': stamp, 'build_id': _build_id}, cache_file)
+
+    return _build_id
+
+
+def stage_memory() -> int:
+    """The memory the trace stage may still take when it is kept in memory (/dev/shm), which the simulator runs should leave free"""
+    if not use_stage or not trace_stage.path.resolve().is_relative_to(shm_path):
+        return 0
+
+    return max(0, trace_stage.budget - trace_stage.used())
+
+
+def trace_length(trace_file: str, trace_folder: str) -> int:
+    """The number of requests (lines) of the trace, cached in the store by the trace's digest"""
+    trace_path = resources_path / trace_folder / trace_file
+    digest = trace_digest(trace_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+    lengths_file = store_path / 'lengths.json'
+    with file_lock(store_path / '.lengths.lock'):
+        lengths = {}
+        if lengths_file.exists():
+            with lengths_file.open('r') as cache_file:
+                lengths = json.load(cache_file)
+
+        if digest not in lengths:
+            with trace_stage.staged(trace_path) if use_stage else nullcontext(trace_path) as staged_trace:
+                lengths[digest] = count_lines(staged_trace)
+            with lengths_file.open('w') as cache_file:
+                json.dump(lengths, cache_file)
+
+    return lengths[digest]
+
+
+def known_trace_length(trace_path: Path) -> int | None:
+    """The number of requests of the trace if counted before (see trace_length), without counting it"""
+    lengths_file = store_path / 'lengths.json'
+    if not use_store or not lengths_file.exists():
+        return None
+
+    with file_lock(store_path / '.lengths.lock', exclusive=False):
+        with lengths_file.open('r') as cache_file:
+            lengths = json.load(cache_file)
+
+    return lengths.get(trace_digest(trace_path))
+
+
+def run_key(simulator: ConfigTree, trace_path: Path) -> str:
+    """
+        The key of a run in the store, hashing the trace's contents, the simulator build and the merged simulator settings
+        (policies, size, seed and the rest). The trace path and the report output are left out, they do not change the results.
+    """
+    settings = json.loads(HOCONConverter.to_json(simulator))
+    settings.pop('report', None)
+    settings.get('files', {}).pop('paths', None)
+    material = json.dumps({'trace': trace_digest(trace_path), 'build': simulator_build_id(), 'settings': settings}, sort_keys=True)
+    return hashlib.blake2b(material.encode(), digest_size=20).hexdigest()
+
+
+def link_or_copy(source: Path, destination: Path) -> None:
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy(source, destination)
+
+
+def store_entry(key: str) -> Path:
+    return store_path / key[:2] / key
+
+
+def load_stored(key: str, report: Path, dump_dir: Path | None) -> bool:
+    """Places the stored report of the run at report and its dumps in dump_dir, False if the store does not hold them"""
+    entry = store_entry(key)
+    with file_lock(store_path / '.store.lock', exclusive=False):
+        if not (entry / 'meta.json').is_file():
+            return False
+
+        with (entry / 'meta.json').open('r') as meta_file:
+            meta = json.load(meta_file)
+        if dump_dir is not None and not meta['dumps']:
+            return False
+
+        shutil.copy(entry / 'report.csv', report)
+        if dump_dir is not None:
+            for dump in find_dumps(entry):
+                link_or_copy(dump, dump_dir / dump.name)
+
+    return True
+
+
+def save_stored(key: str, report: Path, dump_dir: Path | None, record: dict) -> None:
+    """Stores the report of the run with its dumps (when kept), replacing the entry of the key, and indexes it"""
+    store_path.mkdir(parents=True, exist_ok=True)
+    staging = Path(tempfile.mkdtemp(prefix=f'{key}-', dir=store_path))
+    shutil.copy(report, staging / 'report.csv')
+    if dump_dir is not None:
+        for dump in find_dumps(dump_dir):
+            link_or_copy(dump, staging / dump.name)
+
+    record = {'key': key, **record, 'dumps': dump_dir is not None, 'created': time.time()}
+    with (staging / 'meta.json').open('w') as meta_file:
+        json.dump(record, meta_file)
+
+    entry = store_entry(key)
+    with file_lock(store_path / '.store.lock'):
+        shutil.rmtree(entry, ignore_errors=True)
+        entry.parent.mkdir(exist_ok=True)
+        staging.rename(entry)
+        with store_index_file.open('a') as index_file:
+            index_file.write(json.dumps(record) + '\n')
+
+
+def stored_runs() -> List[dict]:
+    """The index of the store, the latest record of every stored run"""
+    if not store_index_file.exists():
+        return []
+
+    records = {}
+    with file_lock(store_path / '.store.lock', exclusive=False):
+        with store_index_file.open('r') as index_file:
+            for line in index_file:
+                record = json.loads(line)
+                records[record['key']] = record
+
+    return [record for record in records.values() if (store_entry(record['key']) / 'meta.json').is_file()]
+
+
 def single_run(policy, trace_file:str, size:int, trace_folder:str,
                trace_format:str, additional_settings:dict={}, name:str | None=None,
                save:bool=True, reuse:bool=False, verbose:bool=False, readonly:bool=False,
-               seed:int=1033096058):
+               seed:int=1033096058, dump_dir:Path | None=None):
+    """
+        Every run writes its configuration and report to a private directory under runs_path,
+        the shared application.conf of the simulator is only read, so runs may execute concurrently.
+        The dump files of the run are moved to dump_dir when given, and discarded otherwise.
+        Unless verbose, a run found in the result store (see run_key) is not simulated again, its stored report and dumps are used.
+        policy may be a list of policies, simulated together in a single pass over the trace (see multi_run).
+        While the simulator runs, its progress over the trace is recorded in status_file (see run_status.monitored).
+    """
 
     name = name if name else f'{trace_file}-{size}-{policy}'
-    policy = Policy[policy]
+    policies = [Policy[policy]] if isinstance(policy, str) else [Policy[p] for p in policy]
 
-    conf_path = caffeine_root / 'simulator' / 'src' / 'main' / 'resources'
-    conf_file = conf_path / 'application.conf'
+    output_csvs_path.mkdir(parents=True, exist_ok=True)
+    runs_path.mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix=f'{name}-', dir=runs_path))
+    # The run directory is removed however the run ends, a failed or interrupted run included
+    try:
+        conf_file = run_dir / 'application.conf'
+        saved_report = output_csvs_path / f'{name}.csv'
+        run_report = run_dir / f'{name}.csv'
 
-    if not output_csvs_path.exists():
-        output_csvs_path.mkdir(parents=True, exist_ok=True)
+        if base_conf_file.exists():
+            conf = ConfigFactory.parse_file(str(base_conf_file))
+        else:
+            conf = ConfigFactory.parse_string("""
+                                              caffeine {
+                                                simulator {
+                                                }
+                                              }
+                                              """)
+        
+        simulator : ConfigTree = conf['caffeine']['simulator']
 
-    run_simulator_cmd = './gradlew simulator:run -x caffeine:compileJava -x caffeine:compileCodeGenJava -PjvmArgs=-Xmx8g'
+        trace_path = resources_path / trace_folder / trace_file
+        simulator.put('files.paths', [ str(trace_path) ])
 
-    if conf_file.exists():
-        conf = ConfigFactory.parse_file(str(conf_file))
-    else:
-        conf = ConfigFactory.parse_string("""
-                                          caffeine {
-                                            simulator {
-                                            }
-                                          }
-                                          """)
-        
-    simulator : ConfigTree = conf['caffeine']['simulator']
+        simulator.put('files.format', trace_format)
+        simulator.put('maximum-size', size)
+        simulator.put('policies', [ policy.value for policy in policies ])
+        simulator.put('admission', [ Admission.ALWAYS.value ])
+        simulator.put('random-seed', seed)
 
-    simulator.put('files.paths', [ str(resources_path / trace_folder / trace_file) ])
+        if verbose:
+            simulator.put('report.format', 'table')
+            simulator.put('report.output', 'console')
+        else:
+            simulator.put('report.format', 'csv')
+            simulator.put('report.output', str(run_report))
 
-    simulator.put('files.format', trace_format)
-    simulator.put('maximum-size', size)
-    simulator.put('policies', [ policy.value ])
-    simulator.put('admission', [ Admission.ALWAYS.value ])
-    simulator.put('random-seed', seed)
+        for k,v in additional_settings.items():
+            simulator.put(k,v)
 
-    if verbose:
-        simulator.put('report.format', 'table')
-        simulator.put('report.output', 'console')
-    else:
-        simulator.put('report.format', 'csv')
-        simulator.put('report.output', str(output_csvs_path / f'{name}.csv'))
+        report = saved_report
+        if (not reuse or not saved_report.is_file()) and not readonly:
+            key = run_key(simulator, trace_path) if use_store and not verbose else None
+            if key is None or not load_stored(key, run_report, dump_dir):
+                with trace_stage.staged(trace_path) if use_stage else nullcontext(trace_path) as staged_trace:
+                    simulator.put('files.paths', [ str(staged_trace) ])
+                    with open(conf_file, 'w') as f:
+                        f.write(HOCONConverter.to_hocon(conf))
 
-    for k,v in additional_settings.items():
-        simulator.put(k,v)
+                    monitor = None
+                    if use_status:
+                        details = {'name': name, 'trace': trace_file, 'policies': [policy.name for policy in policies], 'size': size}
+                        monitor = lambda pid: monitored(status_file, run_dir.name, pid, staged_trace, details,
+                                                        requests=known_trace_length(trace_path), limit=simulator.get('trace.limit', None))
+
+                    retcode, usage = run_simulator(conf_file, run_dir, dump_dir, verbose, monitor)
+
+                if (not retcode == 0):
+                    return False
+
+                # The resource usage is recorded as columns of the report, so it is stored and recorded with the results
+                if not verbose:
+                    accounted = pd.read_csv(run_report)
+                    for column, value in usage.items():
+                        accounted[column] = value
+                    accounted.to_csv(run_report, index=False)
+
+                if key is not None:
+                    save_stored(key, run_report, dump_dir, {'name': name, 'trace': trace_file, 'trace_folder': trace_folder,
+                                                             'policies': [policy.name for policy in policies], 'size': size, 'seed': seed})
+
+            # Unsaved reports are read from the run directory, so concurrent runs sharing a name do not collide
+            if not verbose and save:
+                shutil.move(run_report, saved_report)
+            else:
+                report = run_report
+
+        results = None
+        if not verbose:
+            with open(report, 'r') as csvfile:
+                results = pd.read_csv(csvfile)
+
+            if not save:
+                report.unlink()
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    return results
+
+def split_report(report: pd.DataFrame, policies: List[str]) -> List[pd.DataFrame] | None:
+    """The row of each policy in a combined report, as the report of a run of the policy alone, None if a policy is not found once"""
+    names = report['Policy'].astype(str)
+    reports = []
+    for policy in policies:
+        value = Policy[policy].value
+        rows = report[names == value]
+        if len(rows) != 1:
+            rows = report[names.str.startswith(value)]
+        if len(rows) != 1:
+            return None
+
+        reports.append(rows.reset_index(drop=True))
+
+    return reports
 
-    with open(conf_file, 'w') as f:
-        f.write(HOCONConverter.to_hocon(conf))
-    if (not reuse or not Path(simulator['report']['output']).is_file()) and not readonly:
-        retcode = subprocess.call(run_simulator_cmd, shell = True, cwd = str(caffeine_root), stdout = subprocess.DEVNULL if not verbose else None)
-        if (not retcode == 0):
-            return False
 
-    if not verbose:
-        with open(simulator['report']['output'], 'r') as csvfile:
-            results = pd.read_csv(csvfile)
+def multi_run(policies: List[str], trace_file:str, size:int, trace_folder:str,
+              trace_format:str, additional_settings:dict={}, name:str | None=None,
+              seed:int=1033096058) -> List[pd.DataFrame] | None | bool:
+    """
+        Runs the policies with the same settings in a single simulator invocation, reading the trace once.
+        Returns the report of each policy, None if the combined report could not be split, and False on failure.
+    """
+    name = name if name else f'{trace_file}-{size}-{"-".join(policies)}'
+    results = single_run(policies, trace_file=trace_file, size=size, trace_folder=trace_folder, trace_format=trace_format,
+                         additional_settings=additional_settings, name=name, save=False, verbose=False, seed=seed)
+    if results is False:
+        return False
 
-        if not save:
-            Path(simulator['report']['output']).unlink()
+    return split_report(results, policies)
 
-        return results
 
 if __name__ == '__main__':
     print("This is a library file, please run experiments from another script.")
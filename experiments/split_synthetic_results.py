@@ -3,6 +3,10 @@ from typing import Dict
 from rich import print
 import json
 
+import polars as pl
+
+from dumps import RESULTS_COLUMNS, iter_dump
+
 config_file = Path(__file__).parent / 'synthetic_trace_config.json'
 with config_file.open('r') as f:
     config = json.load(f)
@@ -10,6 +14,11 @@ with config_file.open('r') as f:
 TRACE_CONF = config['items']
 
 
+def write_lines(frame: pl.DataFrame, file) -> None:
+    """Writes the rows as the lines of a text results dump, with the values as read"""
+    frame.select(pl.concat_str(RESULTS_COLUMNS, separator=' ')).write_csv(file, include_header=False, quote_style='never')
+
+
 def split_results_dump(input_file: Path, output_dir: Path = None) -> Dict[str, Path]:
     recency_start = 0
     recency_end = TRACE_CONF['recency']
@@ -43,31 +52,29 @@ def split_results_dump(input_file: Path, output_dir: Path = None) -> Dict[str, P
     other_count = 0
     row_count = 0
 
-    with input_file.open('r') as input_f, \
-         recency_output.open('w') as recency_f, \
-         frequency_output.open('w') as frequency_f, \
-         burstiness_output.open('w') as burstiness_f:
-
-        for line in input_f:
-            row_count += 1
-            parts = line.split()
-            if len(parts) != 4:
-                continue
-
-            timestamp, key, miss_penalty, result = parts
-            key = int(key)
-
-            if recency_start <= key < recency_end:
-                recency_f.write(line)
-                recency_count += 1
-            elif frequency_start <= key < frequency_end:
-                frequency_f.write(line)
-                frequency_count += 1
-            elif burstiness_start <= key < burstiness_end:
-                burstiness_f.write(line)
-                burstiness_count += 1
-            else:
-                other_count += 1
+    # The splits stay text dumps, the mock policy of the simulator replays them as traces
+    with recency_output.open('wb') as recency_f, \
+         frequency_output.open('wb') as frequency_f, \
+         burstiness_output.open('wb') as burstiness_f:
+
+        for chunk in iter_dump(input_file, RESULTS_COLUMNS):
+            row_count += chunk.height
+            # * Lines without 4 fields or an integer key are skipped, Int128 holds signed and unsigned 64-bit keys
+            chunk = chunk.with_columns(pl.col('Key').cast(pl.Int128, strict=False).alias('key')).drop_nulls()
+            key = pl.col('key')
+
+            recency = chunk.filter((key >= recency_start) & (key < recency_end))
+            frequency = chunk.filter((key >= frequency_start) & (key < frequency_end))
+            burstiness = chunk.filter((key >= burstiness_start) & (key < burstiness_end))
+
+            write_lines(recency, recency_f)
+            write_lines(frequency, frequency_f)
+            write_lines(burstiness, burstiness_f)
+
+            recency_count += recency.height
+            frequency_count += frequency.height
+            burstiness_count += burstiness.height
+            other_count += chunk.height - recency.height - frequency.height - burstiness.height
 
     print(f'\n[bold green]Processing complete:')
     print(f'  RECENCY entries: {recency_count:,}')
@@ -0,0 +1,191 @@
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+# The compressions are detected and decompressed as the trace processing tools do, by their shared module
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'trace_processing'))
+from compression import detect_compression, open_input
+
+COPY_CHUNK_SIZE = 16 * 1024 ** 2
+
+
+def decompress(source: Path, destination: Path, limit: int | None = None) -> bool:
+    """Decompresses the source into destination, stopping (and returning False) once more than limit bytes are written"""
+    written = 0
+    with open_input(source, 'rb') as stream, destination.open('wb') as output:
+        while chunk := stream.read(COPY_CHUNK_SIZE):
+            written += len(chunk)
+            if limit is not None and written > limit:
+                return False
+            output.write(chunk)
+
+    return True
+
+
+def count_lines(path: Path) -> int:
+    """The number of lines of the plain or compressed file, decompressing it while counting"""
+    lines = 0
+    with open_input(path, 'rb') as stream:
+        while chunk := stream.read(COPY_CHUNK_SIZE):
+            lines += chunk.count(b'\n')
+
+    return lines
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+class TraceStage():
+    """
+        Keeps decompressed copies of compressed traces in a local directory, so the runs on a trace decompress it once.
+        The entries are shared by the processes of the host, every process using an entry holds a reference to it,
+        and the least recently used unreferenced entries are evicted when the entries exceed the budget (in bytes).
+        The state of the entries is kept in stage.json, changed under an exclusive lock of the directory.
+        A trace found too large for the budget is kept there as well, holding no bytes, so it is not decompressed again.
+    """
+    __slots__ = 'path', 'budget'
+    def __init__(self, path: Path, budget: int):
+        self.path = path
+        self.budget = budget
+
+    @contextmanager
+    def _locked(self, name: str = '.stage.lock'):
+        self.path.mkdir(parents=True, exist_ok=True)
+        with (self.path / name).open('w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, dict]:
+        state_file = self.path / 'stage.json'
+        entries = {}
+        if state_file.exists():
+            with state_file.open('r') as file:
+                entries = json.load(file)
+
+        # * The references of processes that died without releasing them
+        for entry in entries.values():
+            entry['refs'] = [pid for pid in entry['refs'] if is_alive(pid)]
+
+        return entries
+
+    def _save(self, entries: Dict[str, dict]) -> None:
+        state_file = self.path / 'stage.json'
+        with state_file.with_suffix('.tmp').open('w') as file:
+            json.dump(entries, file)
+        state_file.with_suffix('.tmp').replace(state_file)
+
+    def _evict(self, entries: Dict[str, dict]) -> None:
+        total = sum(entry['size'] for entry in entries.values())
+        for key in sorted(entries, key=lambda key: entries[key]['last_used']):
+            if total <= self.budget:
+                break
+
+            if len(entries[key]['refs']) == 0 and 'too_large' not in entries[key]:
+                (self.path / key).unlink(missing_ok=True)
+                total -= entries.pop(key)['size']
+
+    def used(self) -> int:
+        """The bytes of the staged traces"""
+        if not self.path.exists():
+            return 0
+
+        with self._locked():
+            return sum(entry['size'] for entry in self._load().values())
+
+    def _acquire(self, key: str) -> bool:
+        with self._locked():
+            entries = self._load()
+            if key not in entries or 'too_large' in entries[key]:
+                return False
+
+            if not (self.path / key).exists():
+                entries.pop(key)
+                self._save(entries)
+                return False
+
+            entries[key]['refs'].append(os.getpid())
+            entries[key]['last_used'] = time.time()
+            self._save(entries)
+
+        return True
+
+    def _release(self, key: str) -> None:
+        with self._locked():
+            entries = self._load()
+            if key in entries:
+                if os.getpid() in entries[key]['refs']:
+                    entries[key]['refs'].remove(os.getpid())
+                entries[key]['last_used'] = time.time()
+                self._evict(entries)
+                self._save(entries)
+
+    def _stage(self, trace: Path, key: str) -> bool:
+        """Decompresses the trace into the entry of the key, holding a reference to it, False if it does not fit the budget"""
+        with self._locked():
+            # * The budget it was found too large for, a trace does not fit a smaller one either
+            if self._load().get(key, {}).get('too_large', -1) >= self.budget:
+                return False
+
+        staging = self.path / f'{key}.{os.getpid()}.tmp'
+        try:
+            if not decompress(trace, staging, self.budget):
+                with self._locked():
+                    entries = self._load()
+                    entries[key] = {'size': 0, 'refs': [], 'last_used': time.time(), 'too_large': self.budget}
+                    self._save(entries)
+                return False
+
+            size = staging.stat().st_size
+            with self._locked():
+                entries = self._load()
+                staging.rename(self.path / key)
+                entries[key] = {'size': size, 'refs': [os.getpid()], 'last_used': time.time()}
+                self._evict(entries)
+                self._save(entries)
+        finally:
+            staging.unlink(missing_ok=True)
+
+        return True
+
+    @contextmanager
+    def staged(self, trace: Path):
+        """The path of a decompressed copy of the trace while the block runs, the trace itself if not compressed (or too large)"""
+        compression = detect_compression(trace)
+        if compression is None:
+            yield trace
+            return
+
+        stat = trace.stat()
+        source = f'{trace.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'
+        key = f'{trace.name.removesuffix(f".{compression}")}-{hashlib.blake2b(source.encode(), digest_size=8).hexdigest()}'
+
+        # * Processes staging the same trace wait for the first one to decompress it
+        with self._locked(f'.{key}.lock'):
+            staged = self._acquire(key) or self._stage(trace, key)
+
+        if not staged:
+            yield trace
+            return
+
+        try:
+            yield self.path / key
+        finally:
+            self._release(key)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import socket
+import time
+from multiprocessing import Process
+from pathlib import Path
+
+from rich import pretty
+from rich.console import Console
+
+import simulatools
+import run_experiments
+import run_mock_experiments
+from journal import JobJournal, run_job
+from scheduler import default_workers
+
+pretty.install()
+console = Console()
+
+# The jobs these workers run, the jobs of run_lhd_lrb.py are claimed by the workers of its container
+JOBS = {**run_experiments.JOBS, **run_mock_experiments.JOBS}
+
+POLL_SECONDS = 30
+
+
+def work(queue_path: Path, lease_seconds: float, retries: int, wait: bool) -> None:
+    """Claims and runs jobs from the queue until it holds no job for these workers, or forever when waiting for new jobs"""
+    queue = JobJournal(queue_path)
+    owner = f'{socket.gethostname()}-{os.getpid()}'
+    while True:
+        job = queue.claim(owner, list(JOBS), lease_seconds)
+        if job is None:
+            if not wait:
+                return
+
+            time.sleep(POLL_SECONDS)
+            continue
+
+        job_id, function, args, kwargs = job
+        console.log(f'[bold #a98467]{owner} claimed {job_id}')
+        with queue.leased(job_id, owner, lease_seconds):
+            run_job(queue, job_id, JOBS[function], args, kwargs, retries, run_experiments.BACKOFF_SECONDS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the jobs of a shared queue, filled by run_experiments.py and run_mock_experiments.py with --queue')
+
+    parser.add_argument('--queue', help='The shared queue (an SQLite file, e.g. on the shared results mount)', required=True, type=Path)
+    parser.add_argument('-j', '--workers', help='Number of worker processes, 0 picks it by the available cores and memory (default: 1)',
+                        required=False, type=int, default=1)
+    parser.add_argument('--lease', help='Seconds a claimed job is held without a heartbeat before other workers may claim it (default: 600)',
+                        required=False, type=float, default=600)
+    parser.add_argument('--retries', help='Number of times a failed job is retried, with an exponential backoff (default: 2)',
+                        required=False, type=int, default=2)
+    parser.add_argument('--wait', help='Keep polling the queue for new jobs instead of exiting once it is drained', action='store_true', required=False)
+    parser.add_argument('--retry-failed', help='Queue the failed jobs again before starting', action='store_true', required=False)
+
+    args = parser.parse_args()
+
+    queue = JobJournal(args.queue)
+    if args.retry_failed:
+        console.print(f'[bold yellow]Queued {queue.requeue_failed()} failed jobs again')
+
+    workers = args.workers if args.workers > 0 else default_workers(simulatools.stage_memory())
+    console.print(f'[bold]Running {workers} workers on {args.queue}, jobs: {queue.counts()}')
+
+    processes = [Process(target=work, args=(args.queue, args.lease, args.retries, args.wait)) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    console.print(f'[bold #a3b18a]Done, jobs: {queue.counts()}')
+    if len(queue.failed()) > 0:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
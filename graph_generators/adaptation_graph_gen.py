@@ -1,4 +1,5 @@
 import argparse
+import sys
 import polars as pl
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
@@ -8,6 +9,10 @@ from typing import List, Tuple, Dict, Literal
 from rich import print, pretty
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
 
+# The quota dumps are read in either encoding as the experiments keep them, by their shared module
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'experiments'))
+from dumps import scan_dump
+
 pretty.install()
 
 OUTPUT_FORMAT = 'pdf'
@@ -34,9 +39,7 @@ def plot_adaptions(dump_file: Path, output_path: Path, parts_length: List[int])
     part_start_ids = [0]
     for length in parts_length:
         part_start_ids.append(part_start_ids[-1] + length)
-    df: pl.Dataframe = pl.read_csv(dump_file, has_header=False, new_columns=['Event Number', 'LRU', 'LFU', 'LBU', 'Average Penalty', 
-                                                           'Direction 1', 'Direction 2', 'Direction 3', 'Direction 4', 'Direction 5', 'Direction 6'],
-                                   null_values=["NA"])
+    df: pl.Dataframe = scan_dump(dump_file, ['Event Number', 'LRU', 'LFU', 'LBU', 'Average Penalty']).collect()
     print(df.describe())
     
     plt.rcParams["figure.figsize"] = (60, 19)
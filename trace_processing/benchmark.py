@@ -0,0 +1,338 @@
+import argparse
+import contextlib
+import io
+import json
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple
+
+from rich import pretty, print
+from rich.console import Console
+from rich.progress import Progress
+from rich.table import Table
+
+import parse_IBM
+import parse_meta
+import parse_twitter
+import latency_appender
+import trace_merger
+from latency_generators import NormalDist, RANDOM_BATCH_SIZE
+from instrumentation import machine
+
+pretty.install()
+
+DISTRIBUTION_CONFIG = Path(__file__).parent / 'latency_distributions.json'
+BENCHMARK_SEED = 43215
+KEY_SPACE_FRACTION = 0.1
+LAST_LINE_READS = 10_000
+
+
+class Benchmark(NamedTuple):
+    """A timed function, prepare builds its inputs (untimed) and returns the run, which returns the number of items it handled"""
+    name: str
+    kind: str
+    prepare: Callable[['SyntheticInputs'], Callable[[], int]]
+
+
+class SyntheticInputs():
+    """Deterministic raw traces of the given number of requests, written once into the work directory and shared by the benchmarks"""
+    __slots__ = 'path', 'requests', 'seed', '_keys', '_timestamps', '_operations'
+    def __init__(self, path: Path, requests: int, seed: int):
+        self.path = path
+        self.requests = requests
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+
+        # Zipf-like popularity over a key space of a tenth of the requests, as the traces are skewed
+        key_space = max(1, int(requests * KEY_SPACE_FRACTION))
+        self._keys = (rng.zipf(1.2, size=requests) % key_space).astype(np.uint64) * np.uint64(0x9E3779B97F4A7C15)
+        self._timestamps = np.cumsum(rng.integers(0, 3, size=requests))
+        self._operations = rng.random(size=requests)
+
+    def output(self, name: str) -> Path:
+        """A fresh path in the work directory, for the outputs of a run"""
+        output = self.path / 'outputs' / name
+        if output.is_dir():
+            shutil.rmtree(output)
+        else:
+            output.unlink(missing_ok=True)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        return output
+
+    def keys(self) -> np.ndarray:
+        return self._keys
+
+    def parsed_requests(self) -> int:
+        """The requests the parsers keep (the GET operations)"""
+        return int((self._operations < 0.8).sum())
+
+    def ibm_lines(self) -> List[str]:
+        operations = np.where(self._operations < 0.8, 'REST.GET.OBJECT', np.where(self._operations < 0.95, 'REST.PUT.OBJECT', 'REST.HEAD.OBJECT'))
+        return [f'{timestamp} {operation} {key:x} 1024\n'
+                for timestamp, operation, key in zip(self._timestamps.tolist(), operations.tolist(), self._keys.tolist())]
+
+    def meta_lines(self) -> List[str]:
+        operations = np.where(self._operations < 0.8, 'GET', 'SET')
+        return [f'{timestamp},{key:x},64,{operation},1024,0,0,0\n'
+                for timestamp, operation, key in zip(self._timestamps.tolist(), operations.tolist(), self._keys.tolist())]
+
+    def twitter_keys(self) -> List[str]:
+        return [f'q:q:1:{key:x}' for key in self._keys.tolist()]
+
+    def _file(self, name: str, lines: Callable[[], List[str]]) -> Path:
+        path = self.path / name
+        if not path.exists():
+            with path.open('w') as file:
+                file.writelines(lines())
+
+        return path
+
+    def ibm_trace(self) -> Path:
+        return self._file('IBMObjectStoreTrace010Part0', self.ibm_lines)
+
+    def twitter_trace(self) -> Path:
+        # Within the time parse_twitter keeps, the timestamps are in seconds and it compares them in milliseconds
+        operations = np.where(self._operations < 0.8, 'get', 'set')
+        timestamps = self._timestamps * (parse_twitter.MAX_TIME_TO_PROCESS // 1000) // max(1, int(self._timestamps[-1]))
+        return self._file('cluster01.sort', lambda: [f'{timestamp},{key},10,1024,1,{operation},0\n' for timestamp, key, operation
+                                                     in zip(timestamps.tolist(), self.twitter_keys(), operations.tolist())])
+
+    def parsed_trace(self, output_format: str) -> Path:
+        """The IBM trace parsed by parse_IBM, as the input of the latency appender"""
+        path = self.path / f'IBM010{".trace" if output_format == "text" else ".btrace"}'
+        if not path.exists():
+            with contextlib.redirect_stdout(io.StringIO()):
+                if output_format == 'text':
+                    parse_IBM.processFile(self.ibm_trace(), path)
+                else:
+                    parse_IBM.processFileBinary(self.ibm_trace(), path)
+
+        return path
+
+
+def dist_sets() -> List[tuple]:
+    return latency_appender.named_dist_sets(latency_appender.load_distributions_from_config(DISTRIBUTION_CONFIG, BENCHMARK_SEED), 'bench')
+
+
+def append_latencies(input_path: Path, output_dir: Path, output_format: str) -> List[Path]:
+    output_dir.mkdir(parents=True)
+    progress = Progress(console=Console(file=io.StringIO()))
+    return latency_appender.addDelayAndWriteToFiles(input_path, output_dir, dist_sets(), progress=progress, verbose=False,
+                                                    output_format=output_format)
+
+
+def prepare_normal_refill(inputs: SyntheticInputs) -> Callable[[], int]:
+    dist = NormalDist(120, 12.16, BENCHMARK_SEED)
+    def run() -> int:
+        values = 0
+        while values < inputs.requests:
+            dist.refill_values(min(inputs.requests - values, RANDOM_BATCH_SIZE))
+            values += len(dist.gen_values)
+        return values
+    return run
+
+
+def prepare_choose_dists(inputs: SyntheticInputs) -> Callable[[], int]:
+    keys = inputs.keys()
+    weights = dist_sets()[0][1]
+    return lambda: len(latency_appender.choose_dists(keys, weights))
+
+
+def prepare_parse_lines(parse_line: Callable[[str], str | None], lines: Callable[[SyntheticInputs], List[str]]):
+    def prepare(inputs: SyntheticInputs) -> Callable[[], int]:
+        trace_lines = lines(inputs)
+        def run() -> int:
+            for line in trace_lines:
+                parse_line(line)
+            return len(trace_lines)
+        return run
+    return prepare
+
+
+def prepare_process_key(inputs: SyntheticInputs) -> Callable[[], int]:
+    keys = inputs.twitter_keys()
+    def run() -> int:
+        for key in keys:
+            parse_twitter.process_key(key)
+        return len(keys)
+    return run
+
+
+def prepare_read_last_line(inputs: SyntheticInputs) -> Callable[[], int]:
+    trace = inputs.parsed_trace('text')
+    def run() -> int:
+        for _ in range(LAST_LINE_READS):
+            trace_merger.read_last_line(trace)
+        return LAST_LINE_READS
+    return run
+
+
+def prepare_parse_ibm(output_format: str):
+    def prepare(inputs: SyntheticInputs) -> Callable[[], int]:
+        trace = inputs.ibm_trace()
+        def run() -> int:
+            output = inputs.output(f'parse-ibm-{output_format}')
+            if output_format == 'text':
+                parse_IBM.processFile(trace, output)
+            else:
+                parse_IBM.processFileBinary(trace, output)
+            return inputs.requests
+        return run
+    return prepare
+
+
+def prepare_parse_twitter(engine: str):
+    def prepare(inputs: SyntheticInputs) -> Callable[[], int]:
+        trace = inputs.twitter_trace()
+        process = parse_twitter.process_csv_vectorized if engine == 'polars' else parse_twitter.process_csv_batches
+        def run() -> int:
+            process(trace, inputs.output(f'parse-twitter-{engine}'), output_format='binary')
+            return inputs.requests
+        return run
+    return prepare
+
+
+def prepare_latency(output_format: str):
+    def prepare(inputs: SyntheticInputs) -> Callable[[], int]:
+        trace = inputs.parsed_trace(output_format)
+        def run() -> int:
+            append_latencies(trace, inputs.output(f'latency-{output_format}'), output_format)
+            return inputs.parsed_requests()
+        return run
+    return prepare
+
+
+def prepare_merge(inputs: SyntheticInputs) -> Callable[[], int]:
+    merged_inputs = append_latencies(inputs.parsed_trace('binary'), inputs.output('merge-inputs'), 'binary') * 2
+    def run() -> int:
+        trace_merger.changeTimestampsAndWriteToFile(merged_inputs, inputs.output('merged.btrace'), 'binary')
+        return inputs.parsed_requests() * len(merged_inputs)
+    return run
+
+
+def prepare_pipeline(inputs: SyntheticInputs) -> Callable[[], int]:
+    """parse -> latency -> merge of the raw IBM trace with itself, in the binary format"""
+    trace = inputs.ibm_trace()
+    def run() -> int:
+        parsed = inputs.output('pipeline-IBM010.btrace')
+        parse_IBM.processFileBinary(trace, parsed)
+        appended = append_latencies(parsed, inputs.output('pipeline-latency'), 'binary')
+        trace_merger.changeTimestampsAndWriteToFile(appended * 2, inputs.output('pipeline-merged.btrace'), 'binary')
+        return inputs.requests
+    return run
+
+
+BENCHMARKS = [Benchmark('normal_refill_values', 'micro', prepare_normal_refill),
+              Benchmark('choose_dists', 'micro', prepare_choose_dists),
+              Benchmark('parse_IBM.parseLine', 'micro', prepare_parse_lines(parse_IBM.parseLine, SyntheticInputs.ibm_lines)),
+              Benchmark('parse_meta.parseLine', 'micro', prepare_parse_lines(parse_meta.parseLine, SyntheticInputs.meta_lines)),
+              Benchmark('parse_twitter.process_key', 'micro', prepare_process_key),
+              Benchmark('trace_merger.read_last_line', 'micro', prepare_read_last_line),
+              Benchmark('parse_IBM_text', 'macro', prepare_parse_ibm('text')),
+              Benchmark('parse_IBM_binary', 'macro', prepare_parse_ibm('binary')),
+              Benchmark('parse_twitter_polars', 'macro', prepare_parse_twitter('polars')),
+              Benchmark('parse_twitter_csv', 'macro', prepare_parse_twitter('csv')),
+              Benchmark('latency_appender_text', 'macro', prepare_latency('text')),
+              Benchmark('latency_appender_binary', 'macro', prepare_latency('binary')),
+              Benchmark('trace_merger_binary', 'macro', prepare_merge),
+              Benchmark('pipeline_binary', 'macro', prepare_pipeline)]
+
+
+def run_benchmark(benchmark: Benchmark, inputs: SyntheticInputs, repeats: int) -> dict:
+    """The best time of the repeats, and the throughput (items per second) of it"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        run = benchmark.prepare(inputs)
+        times = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            items = run()
+            times.append(time.perf_counter() - started)
+
+    best = min(times)
+    return {'kind': benchmark.kind, 'items': items, 'seconds': best, 'all_seconds': times, 'throughput': items / best}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Prints the throughput of every benchmark against its baseline, returning the benchmarks that regressed beyond the threshold"""
+    table = Table('Benchmark', 'Kind', 'Throughput (items/s)', 'Baseline (items/s)', 'Change')
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            table.add_row(name, result['kind'], f'{result["throughput"]:,.0f}', '-', '-')
+            continue
+
+        change = result['throughput'] / base['throughput'] - 1
+        regressed = change < -threshold
+        if regressed:
+            regressions.append(name)
+        style = 'bold red' if regressed else 'green' if change > threshold else 'default'
+        table.add_row(name, result['kind'], f'{result["throughput"]:,.0f}', f'{base["throughput"]:,.0f}', f'[{style}]{100 * change:+.1f}%')
+
+    print(table)
+    return regressions
+
+
+def main():
+    names = [benchmark.name for benchmark in BENCHMARKS]
+    parser = argparse.ArgumentParser(description='Benchmark the hot functions and the tools of the trace pipeline on synthetic traces')
+    parser.add_argument('-n', '--requests', help='Number of requests of the synthetic traces (default: 1,000,000)', type=int, default=1_000_000)
+    parser.add_argument('--repeats', help='Runs of every benchmark, the best one is kept (default: 3)', type=int, default=3)
+    parser.add_argument('--seed', help='Seed of the synthetic traces (default: 0)', type=int, default=0)
+    parser.add_argument('--kind', help='Run only the micro (functions) or macro (tools) benchmarks', choices=['micro', 'macro'], default=None)
+    parser.add_argument('--only', help='Run only these benchmarks', nargs='+', choices=names, default=None)
+    parser.add_argument('--work-dir', help='Directory of the synthetic traces and outputs (default: a temporary directory)', type=Path, default=None)
+    parser.add_argument('-o', '--output', help='Write the results to this JSON file', type=Path, default=None)
+    parser.add_argument('--baseline', help='Compare with the results of this JSON file, failing on regressions', type=Path, default=None)
+    parser.add_argument('--save-baseline', help='Write the results as the baseline to this JSON file', type=Path, default=None)
+    parser.add_argument('--threshold', help='Fraction of the baseline throughput a benchmark may lose before failing (default: 0.15)',
+                        type=float, default=0.15)
+
+    args = parser.parse_args()
+
+    benchmarks = [benchmark for benchmark in BENCHMARKS if (args.kind is None or benchmark.kind == args.kind) and
+                  (args.only is None or benchmark.name in args.only)]
+
+    work_dir = args.work_dir if args.work_dir is not None else Path(tempfile.mkdtemp(prefix='trace-benchmark-'))
+    work_dir.mkdir(parents=True, exist_ok=True)
+    inputs = SyntheticInputs(work_dir, args.requests, args.seed)
+
+    results = {}
+    try:
+        for benchmark in benchmarks:
+            print(f'[orange]Running [purple]{benchmark.name}')
+            results[benchmark.name] = run_benchmark(benchmark, inputs, args.repeats)
+            print(f'[green]{benchmark.name}: {results[benchmark.name]["throughput"]:,.0f} items/s')
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {'machine': machine(), 'requests': args.requests, 'seed': args.seed, 'repeats': args.repeats, 'created': time.time(),
+              'results': results}
+    for path in [args.output, args.save_baseline]:
+        if path is not None:
+            with path.open('w') as output:
+                json.dump(report, output, indent=2)
+
+    baseline = {'results': {}}
+    if args.baseline is not None:
+        with args.baseline.open('r') as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline['requests'] != args.requests:
+            print(f'[yellow]The baseline ran on {baseline["requests"]:,} requests, the throughputs may not be comparable')
+        if baseline['machine']['host'] != report['machine']['host']:
+            print(f'[yellow]The baseline ran on {baseline["machine"]["host"]} ({baseline["machine"]["cpu_model"]})')
+
+    regressions = compare(results, baseline['results'], args.threshold)
+    if len(regressions) > 0:
+        print(f'[bold red]Regressed beyond {100 * args.threshold:.0f}%: {regressions}')
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
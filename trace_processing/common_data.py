@@ -3,6 +3,9 @@ seeds = {'ibm010' : 43215, 'ibm012' : 32153, 'ibm024' : 23516, 'ibm029' : 38573,
          'twitter01' : 31238019, "twitter03" : 76934554, "twitter09" : 44722549,
          'twitter28' : 50779077, "metakv2" : 516352, "metakv4" : 335607}
 
+# The seed used for hashing the keys when latencies are appended.
+hash_seed = 830981
+
 
 
 if __name__ == "__main__":
@@ -0,0 +1,196 @@
+import gzip
+import io
+import lzma
+import shutil
+import subprocess
+
+from pathlib import Path
+from typing import BinaryIO, IO
+
+MAGICS = {'xz': b'\xfd7zXZ\x00',
+          'gz': b'\x1f\x8b',
+          'zst': b'\x28\xb5\x2f\xfd'}
+
+# Preferring the external tools, as they decompress in a separate (and for xz, multithreaded) process
+DECOMPRESS_COMMANDS = {'xz': [['xz', '-T0', '-d', '-c']],
+                       'gz': [['pigz', '-d', '-c'], ['gzip', '-d', '-c']],
+                       'zst': [['zstd', '-d', '-c', '-q']]}
+
+COMPRESS_COMMANDS = {'xz': [['xz', '-T0', '-z', '-c']],
+                     'gz': [['pigz', '-c'], ['gzip', '-c']],
+                     'zst': [['zstd', '-T0', '-q', '-c']]}
+
+COMPRESSIONS = list(MAGICS)
+
+
+def detect_compression(path: Path) -> str | None:
+    with Path(path).open('rb') as file:
+        head = file.read(max(len(magic) for magic in MAGICS.values()))
+
+    for name, magic in MAGICS.items():
+        if head.startswith(magic):
+            return name
+
+    return None
+
+
+def is_compressed(path: Path) -> bool:
+    return detect_compression(path) is not None
+
+
+def strip_compression_suffix(path: Path) -> Path:
+    path = Path(path)
+    if path.suffix.lstrip('.') in MAGICS:
+        return path.with_suffix('')
+
+    return path
+
+
+class _ProcessOutput(io.RawIOBase):
+    """The stdout of a decompressing process, the process is reaped (or killed if not fully read) on close"""
+    def __init__(self, process: subprocess.Popen, path: Path):
+        self._process = process
+        self._path = path
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        read = self._process.stdout.readinto(buffer)
+        if read == 0:
+            self._eof = True
+        return read
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        if not self._eof:
+            self._process.kill()
+        self._process.stdout.close()
+        returncode = self._process.wait()
+        super().close()
+
+        if self._eof and returncode != 0:
+            raise IOError(f'Decompressing {self._path} failed with exit code {returncode}')
+
+
+class _CompressedOutput(io.RawIOBase):
+    """
+        Writes to a compressing stream, the stdin of a compressing process or a python compressor.
+        The output is not seekable, as the compressed file can only be appended to.
+    """
+    def __init__(self, stream: BinaryIO, path: Path, process: subprocess.Popen | None = None):
+        self._stream = stream
+        self._path = path
+        self._process = process
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._stream.write(data)
+        return len(data)
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        super().close()
+        self._stream.close()
+        if self._process is not None and self._process.wait() != 0:
+            raise IOError(f'Compressing {self._path} failed with exit code {self._process.returncode}')
+
+
+def _python_decompressor(compression: str, path: Path) -> BinaryIO:
+    if compression == 'xz':
+        return lzma.open(path, 'rb')
+    if compression == 'gz':
+        return gzip.open(path, 'rb')
+
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f'Cannot decompress {path}: install zstd or the zstandard python package')
+
+    return zstandard.ZstdDecompressor().stream_reader(path.open('rb'), closefd=True)
+
+
+def open_input(path: Path, mode: str = 'rb', encoding: str | None = None, errors: str | None = None,
+               newline: str | None = None) -> IO:
+    """
+        Opens a plain or a compressed (xz, gz, zst) file for streaming reading, detecting the compression by its magic.
+        Text mode ('r') behaves as Path.open with the same encoding, errors and newline arguments.
+    """
+    path = Path(path)
+    compression = detect_compression(path)
+    if compression is None:
+        return path.open(mode, encoding=encoding, errors=errors, newline=newline)
+
+    stream = None
+    for command in DECOMPRESS_COMMANDS[compression]:
+        if shutil.which(command[0]) is not None:
+            process = subprocess.Popen(command + [str(path)], stdout=subprocess.PIPE, stdin=subprocess.DEVNULL)
+            stream = io.BufferedReader(_ProcessOutput(process, path), buffer_size=1024 * 1024)
+            break
+
+    if stream is None:
+        stream = _python_decompressor(compression, path)
+
+    if 'b' in mode:
+        return stream
+
+    return io.TextIOWrapper(stream, encoding=encoding, errors=errors, newline=newline)
+
+
+def compressed_path(path: Path, compression: str | None) -> Path:
+    path = Path(path)
+    return path if compression is None else path.with_name(f'{path.name}.{compression}')
+
+
+def _python_compressor(compression: str, path: Path) -> BinaryIO:
+    if compression == 'xz':
+        return lzma.open(path, 'wb')
+    if compression == 'gz':
+        return gzip.open(path, 'wb')
+
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError(f'Cannot compress {path}: install zstd or the zstandard python package')
+
+    return zstandard.ZstdCompressor(threads=-1).stream_writer(path.open('wb'), closefd=True)
+
+
+def open_output(path: Path, mode: str = 'wb', encoding: str | None = None, errors: str | None = None,
+                newline: str | None = None) -> IO:
+    """
+        Opens a file for writing, compressing while streaming when the path ends with a compression suffix (.xz, .gz, .zst),
+        so an uncompressed copy is never written. Text mode ('w') behaves as Path.open with the same arguments.
+    """
+    path = Path(path)
+    compression = path.suffix.lstrip('.')
+    if compression not in COMPRESS_COMMANDS:
+        return path.open(mode, encoding=encoding, errors=errors, newline=newline)
+
+    stream = None
+    for command in COMPRESS_COMMANDS[compression]:
+        if shutil.which(command[0]) is not None:
+            with path.open('wb') as output_file:
+                process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=output_file)
+            stream = io.BufferedWriter(_CompressedOutput(process.stdin, path, process), buffer_size=1024 * 1024)
+            break
+
+    if stream is None:
+        stream = io.BufferedWriter(_CompressedOutput(_python_compressor(compression, path), path), buffer_size=1024 * 1024)
+
+    if 'b' in mode:
+        return stream
+
+    return io.TextIOWrapper(stream, encoding=encoding, errors=errors, newline=newline)
+
+
+if __name__ == "__main__":
+    print("Not intended to be run")
+    exit(1)
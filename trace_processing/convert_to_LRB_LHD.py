@@ -5,6 +5,10 @@ from typing import List
 
 from rich import print, pretty
 from rich.progress import Progress
+
+from trace_format import is_binary_trace, open_trace, record_dtype
+from compression import open_input, open_output, compressed_path, strip_compression_suffix, COMPRESSIONS
+from instrumentation import span, add_arguments, instrumented
 pretty.install()
 
 MAX_INT64 = 2 ** 63 - 1
@@ -20,28 +24,50 @@ def _parseLine(entry: str) -> str:
 
 
 def _processFile(file: Path, output_path: Path, progress: Progress) -> None:
-    with file.open('r', encoding='utf-8',errors='replace') as original_format_file:
+    with open_input(file, 'r', encoding='utf-8', errors='replace') as original_format_file:
         lines_processed = 0
-        with output_path.open('w') as LRB_format_file:
+        bytes_processed = 0
+        # Converted line by line, so the whole conversion is a single stage, of the bytes read after decompression
+        with open_output(output_path, 'w') as LRB_format_file, span('convert and write') as convert:
             line = original_format_file.readline()
             while line:
                 lines_processed += 1
+                bytes_processed += len(line)
                 output_line = _parseLine(line)
                 LRB_format_file.write(f'{output_line}\n')
                 line = original_format_file.readline()
+            convert.lines = lines_processed
+            convert.bytes = bytes_processed
+        progress.console.print(f"[green]Processed {lines_processed} lines")
+
+
+def _processBinaryFile(file: Path, output_path: Path, progress: Progress) -> None:
+    """The LRB and LHD simulators read text traces, hence only the input may be binary"""
+    lines_processed = 0
+    with open_trace(file) as reader, open_output(output_path, 'w') as LRB_format_file:
+        record_size = record_dtype(reader.flags).itemsize
+        for batch in reader.iter_batches():
+            lines_processed += len(batch.keys)
+            with span('convert', lines=len(batch.keys), bytes=len(batch.keys) * record_size):
+                object_ids = [int(str(key), 16) & MAX_INT64 for key in batch.keys.tolist()]
+            with span('write', lines=len(object_ids)):
+                LRB_format_file.write(''.join(f'{time} {object_id} 1\n' for time, object_id in zip(batch.timestamps.tolist(), object_ids)))
         progress.console.print(f"[green]Processed {lines_processed} lines")
 
                 
-def processFiles(files : List[Path], output_dir: Path):
+def processFiles(files : List[Path], output_dir: Path, compression: str | None = None):
     with Progress() as progress:
         files_progress = progress.add_task('[bold #bedcfe]Files processed', total=len(files), start=True)
         progress.console.print(f'[bold yellow]Processing the files: [bold cyan]{files}\n')
         for file in files:
-            output_path = output_dir / f'{file.stem}-LRB.trace'
+            output_path = compressed_path(output_dir / f'{strip_compression_suffix(file).stem}-LRB.trace', compression)
             print(output_path.resolve())
             if not output_path.exists():
                 progress.console.print(f'[orange]Start processing [purple]{file}')
-                _processFile(file, output_path, progress)
+                if is_binary_trace(file):
+                    _processBinaryFile(file, output_path, progress)
+                else:
+                    _processFile(file, output_path, progress)
 
                 progress.console.print(f'[green]Done processing: [purple]{file}')
                 progress.update(files_progress, advance=1)
@@ -53,6 +79,9 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('-i', '--input', help="The input dir of all the files to convert, \
                         each line needs to be space-seperated with the two first parts: timestamp key", type=str, required=True)
+    parser.add_argument('-c', '--compress', help="Compress the converted files while writing them", action='store_true')
+    parser.add_argument('--compression', help='The compression used with --compress (default: xz)', choices=COMPRESSIONS, default='xz')
+    add_arguments(parser)
 
     args = parser.parse_args()
     input_dir = Path(args.input)
@@ -67,7 +96,8 @@ def main():
 
     print(f'Writing output to: {str(output_dir.resolve())}')
 
-    processFiles(input_files_paths, output_dir)
+    with instrumented('convert_to_LRB_LHD', args):
+        processFiles(input_files_paths, output_dir, args.compression if args.compress else None)
 
      
 if __name__ == '__main__':
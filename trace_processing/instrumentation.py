@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import platform
+import socket
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict
+
+PROFILE_INTERVAL = 0.005
+
+
+class Span():
+    """Times a stage while the block runs, the lines and bytes it handled may be set inside the block"""
+    __slots__ = 'recorder', 'stage', 'lines', 'bytes', '_started'
+    def __init__(self, recorder: 'StageRecorder', stage: str, lines: int = 0, bytes: int = 0):
+        self.recorder = recorder
+        self.stage = stage
+        self.lines = lines
+        self.bytes = bytes
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(self.stage, time.perf_counter() - self._started, self.lines, self.bytes)
+
+
+class StageRecorder():
+    """
+        The accumulated time, calls, lines and bytes of every stage of a tool (read, parse, hash, latency, write...).
+        Stages are timed per batch, so the overhead is negligible, stages timed in worker processes are taken there and merged
+        by the main process, summing the time of all the workers.
+    """
+    __slots__ = 'stages'
+    def __init__(self):
+        self.stages : Dict[str, list] = {}
+
+    def span(self, stage: str, lines: int = 0, bytes: int = 0) -> Span:
+        return Span(self, stage, lines, bytes)
+
+    def add(self, stage: str, seconds: float, lines: int = 0, bytes: int = 0, calls: int = 1) -> None:
+        totals = self.stages.setdefault(stage, [0.0, 0, 0, 0])
+        totals[0] += seconds
+        totals[1] += calls
+        totals[2] += lines
+        totals[3] += bytes
+
+    def take(self) -> Dict[str, list]:
+        """The stages recorded so far, resetting them (for worker processes returning their stages)"""
+        stages, self.stages = self.stages, {}
+        return stages
+
+    def merge(self, stages: Dict[str, list]) -> None:
+        for stage, (seconds, calls, lines, bytes) in stages.items():
+            self.add(stage, seconds, lines, bytes, calls)
+
+    def summary(self, wall_seconds: float) -> Dict[str, dict]:
+        summary = {}
+        for stage, (seconds, calls, lines, bytes) in self.stages.items():
+            summary[stage] = {'seconds': seconds, 'calls': calls, 'lines': lines, 'bytes': bytes,
+                              'lines_per_second': lines / seconds if seconds > 0 and lines > 0 else None,
+                              'bytes_per_second': bytes / seconds if seconds > 0 and bytes > 0 else None,
+                              'share_of_wall': seconds / wall_seconds if wall_seconds > 0 else None}
+
+        return summary
+
+
+# The stages of the running tool
+RECORDER = StageRecorder()
+span = RECORDER.span
+
+
+class SamplingProfiler():
+    """
+        Samples the stacks of the threads of this process every interval, counting the folded stacks
+        ('module:function;module:function count' lines), the input of flamegraph.pl, speedscope and inferno.
+        Worker processes are not sampled.
+    """
+    __slots__ = 'interval', 'samples', '_stop', '_thread'
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+
+    def _sample(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+
+                stack = []
+                while frame is not None:
+                    stack.append(f'{Path(frame.f_code.co_filename).stem}:{frame.f_code.co_name}')
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: Path) -> None:
+        with path.open('w') as output:
+            for stack, count in self.samples.most_common():
+                output.write(f'{stack} {count}\n')
+
+
+def machine() -> dict:
+    """The host the report was taken on, so reports of different machines can be compared"""
+    cpu_model = None
+    if Path('/proc/cpuinfo').exists():
+        with open('/proc/cpuinfo', 'r') as cpuinfo:
+            for line in cpuinfo:
+                if line.startswith('model name'):
+                    cpu_model = line.split(':', 1)[1].strip()
+                    break
+
+    return {'host': socket.gethostname(), 'platform': platform.platform(), 'python': platform.python_version(),
+            'cpu_model': cpu_model, 'cpus': len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()}
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument('--stats', help='Write the time, lines/sec and bytes/sec of every stage to this JSON report', type=Path, default=None)
+    parser.add_argument('--profile', help='Run under a sampling profiler, writing the folded stacks (flamegraph input) to this file',
+                        type=Path, default=None)
+
+
+@contextmanager
+def instrumented(tool: str, args: argparse.Namespace):
+    """Runs the block with the stages recorded, writing the report to args.stats and the profile to args.profile when given"""
+    RECORDER.take()
+    profiler = SamplingProfiler() if args.profile is not None else None
+    if profiler is not None:
+        profiler.start()
+
+    started = time.time()
+    wall_started = time.perf_counter()
+    try:
+        yield RECORDER
+    finally:
+        wall_seconds = time.perf_counter() - wall_started
+        if profiler is not None:
+            profiler.stop()
+            profiler.write(args.profile)
+
+        if args.stats is not None:
+            report = {'tool': tool, 'args': {name: str(value) for name, value in vars(args).items()}, 'machine': machine(),
+                      'started': started, 'wall_seconds': wall_seconds, 'stages': RECORDER.summary(wall_seconds)}
+            with args.stats.open('w') as output:
+                json.dump(report, output, indent=2)
+
+
+if __name__ == "__main__":
+    print("Not intended to be run")
+    exit(1)
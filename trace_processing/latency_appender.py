@@ -1,57 +1,36 @@
 import argparse
+import multiprocessing
+import queue
 import re
-import subprocess
 import json
 
+import numpy as np
+
 from rich import pretty, print
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn, TaskProgressColumn
 
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Callable, NamedTuple
 
 from itertools import islice
 from xxhash import xxh3_64_intdigest
 
-from common_data import seeds
-from latency_generators import NormalDist, UniformDist, MultiplePeaksDist, SingleValueDist, RANDOM_BATCH_SIZE
+from common_data import seeds, hash_seed
+from latency_generators import NormalDist, UniformDist, MultiplePeaksDist, SingleValueDist
+from compression import open_input, open_output, compressed_path, strip_compression_suffix, COMPRESSIONS
+from trace_format import TraceWriter, FLAG_PENALTY, FLAG_HASHED_KEYS, FLAG_INTEGER_PENALTY, OUTPUT_FORMATS, is_binary_trace, open_trace, trace_suffix
+from parallel_parse import default_workers
+from instrumentation import RECORDER, span, add_arguments, instrumented
 
 pretty.install()
 
-weights_sum = 0
-hash_seed = 830981
+# The progress messages of the worker processes, set by _init_worker
+_progress_queue = None
 
 
-def compress_file_xz(file_path: Path, progress: Progress | None = None) -> None:
-    try:
-        if progress:
-            progress.console.print(f'[bold #F3DFC1]Compressing {file_path.name}...')
-
-        subprocess.run(
-            ['xz', '-T0', '-z', file_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-
-        if progress:
-            progress.console.print(f'[bold #DDBEA8]{file_path} compressed successfully.')
-
-    except subprocess.CalledProcessError as e:
-        if progress:
-            progress.console.print(f'[red bold]Error compressing {file_path}: {e.stderr}')
-        else:
-            print(f'[red bold]Error compressing {file_path}: {e.stderr}')
-    except FileNotFoundError:
-        error_msg = '[red bold]xz command not found. Please install xz-utils (apt-get install xz-utils or yum install xz)'
-        if progress:
-            progress.console.print(error_msg)
-        else:
-            print(error_msg)
-
-
-def calculate_sum_of_dists(cluster_dist: List[int]) -> None:
-    global weights_sum
+def calculate_sum_of_dists(cluster_dist: List[int]) -> int:
     weights_sum = 0
     for weight in cluster_dist:
         weights_sum += weight
@@ -59,36 +38,66 @@ def calculate_sum_of_dists(cluster_dist: List[int]) -> None:
     if weights_sum <= 1:
         raise ValueError("Weights should be integers")
 
+    return weights_sum
 
-def choose_dist(key : int | str, cluster_dists: List[int]) -> int:
-    hashed_key = key % weights_sum # since weight_sum > 0 this is also positive number
-    weights_acc = 0
-    for idx, weight in enumerate(cluster_dists):
-        weights_acc += weight
-        if (hashed_key <= weights_acc):
-            return idx
-        
-    print(f'[red bold]Error: no cluster chosen for {key}')
-    exit(1)
+
+def choose_dists(keys: np.ndarray, cluster_dists: List[int]) -> np.ndarray:
+    """
+        Chooses the generator of every key, a key chooses the first generator whose accumulated weight
+        is at least key % weights_sum.
+    """
+    weights_acc = np.cumsum(cluster_dists)
+    hashed_keys = keys % np.uint64(weights_acc[-1])
+    chosen = np.searchsorted(weights_acc, hashed_keys, side='left')
+    if len(chosen) > 0 and chosen.max() >= len(cluster_dists):
+        print(f'[red bold]Error: no cluster chosen for {keys[np.argmax(chosen)]}')
+        exit(1)
+
+    return chosen
+
+
+def integer_penalties(time_generators: List) -> bool:
+    """Whether every generator gives whole penalties (constants and peaks of ints), decided once for the whole output"""
+    return all(generator.values_at(np.zeros(1, dtype=np.uint64)).dtype.kind in 'iu' for generator in time_generators)
+
+
+def gather_penalties(chosen: np.ndarray, time_generators: List, first_index: int | None = None,
+                     dtype: np.dtype = np.float64) -> np.ndarray:
+    """
+        Gathers the penalty of each request from its chosen generator, each generator hands its values in order
+        exactly as it would have request by request.
+        Given the trace index of the first request, the values are taken from the counter based generators instead.
+    """
+    positions = [np.flatnonzero(chosen == idx) for idx in range(len(time_generators))]
+    if first_index is None:
+        values = [generator.draw(len(gen_positions)) for generator, gen_positions in zip(time_generators, positions)]
+    else:
+        values = [generator.values_at(first_index + gen_positions) for generator, gen_positions in zip(time_generators, positions)]
+
+    penalties = np.empty(len(chosen), dtype=dtype)
+    for gen_positions, gen_values in zip(positions, values):
+        penalties[gen_positions] = gen_values
+
+    return penalties
     
 
-def create_distribution_from_config(dist_config: Dict[str, Any], seed: int):
+def create_distribution_from_config(dist_config: Dict[str, Any], seed: int, stream: int = 0):
     dist_type = dist_config.get('type', '').lower()
 
     if dist_type == 'normal':
         mean = dist_config['mean']
         std_dev = dist_config['std_dev']
-        return NormalDist(mean, std_dev, seed)
+        return NormalDist(mean, std_dev, seed, stream)
 
     elif dist_type == 'uniform':
         low = dist_config['low']
         high = dist_config['high']
-        return UniformDist(low, high)
+        return UniformDist(low, high, seed, stream)
 
     elif dist_type == 'multiplepeaks' or dist_type == 'peaks':
         values = dist_config['values']
         probs = dist_config['probs']
-        return MultiplePeaksDist(values, probs)
+        return MultiplePeaksDist(values, probs, seed, stream)
 
     elif dist_type == 'single' or dist_type == 'constant':
         value = dist_config['value']
@@ -105,8 +114,8 @@ def load_distributions_from_config(config_path: Path, seed: int) -> List[tuple]:
     distributions = []
     for dist_set in config.get('distributions', []):
         generators = []
-        for gen_config in dist_set['generators']:
-            generators.append(create_distribution_from_config(gen_config, seed))
+        for stream, gen_config in enumerate(dist_set['generators']):
+            generators.append(create_distribution_from_config(gen_config, seed, stream))
 
         weights = dist_set['weights']
         distributions.append((generators, weights))
@@ -114,69 +123,272 @@ def load_distributions_from_config(config_path: Path, seed: int) -> List[tuple]:
     return distributions
 
 
+def read_hashed_requests(input_path: Path, time_multiplier: int, batch_size: int) -> Iterator[tuple]:
+    """Yields batches of (timestamps, hashed keys) arrays from either a text or a binary trace, which may be compressed"""
+    if is_binary_trace(input_path):
+        with open_trace(input_path) as reader:
+            batches = reader.iter_batches(batch_size)
+            while True:
+                with span('read') as read:
+                    batch = next(batches, None)
+                    read.lines = len(batch.timestamps) if batch is not None else 0
+                if batch is None:
+                    break
+
+                if reader.flags & FLAG_HASHED_KEYS:
+                    keys = batch.keys
+                else:
+                    with span('hash', lines=len(batch.keys)):
+                        keys = np.array([xxh3_64_intdigest(str(key).encode('utf-8'), seed=hash_seed) for key in batch.keys.tolist()],
+                                        dtype=np.uint64)
+                yield batch.timestamps * time_multiplier, keys
+    else:
+        with open_input(input_path, 'r') as inputFile:
+            def read_lines() -> List[str]:
+                with span('read') as read:
+                    lines = [line for line in islice(inputFile, 0, batch_size)]
+                    read.lines = len(lines)
+                    read.bytes = sum(map(len, lines))
+                return lines
+
+            lines = read_lines()
+            while (lines):
+                with span('parse', lines=len(lines)):
+                    timestamps, keys = zip(*(line.split(' ') for line in lines))
+                    timestamps = np.array(timestamps, dtype=np.int64) * time_multiplier
+                with span('hash', lines=len(keys)):
+                    keys = np.array([xxh3_64_intdigest(key.strip(' \n').encode('utf-8'), seed=hash_seed) for key in keys], dtype=np.uint64)
+                yield timestamps, keys
+
+                lines = read_lines()
+
+
 def addDelayAndWriteToFile(input_path: Path, output_path: Path, time_generators: List, cluster_dists: List[int],
-                           progress: Progress, verbose: bool, set_name: str, time_multiplier: int = 1, compress: bool = False) -> None:
-    calculate_sum_of_dists(cluster_dists)
-    timestamp = 1
+                           progress: Progress, verbose: bool, set_name: str, time_multiplier: int = 1, compression: str | None = None,
+                           output_format: str = 'text', counter_rng: bool = False) -> None:
+    addDelayAndWriteToFiles(input_path, output_path, [(time_generators, cluster_dists, set_name)], progress=progress,
+                            verbose=verbose, time_multiplier=time_multiplier, compression=compression, output_format=output_format,
+                            counter_rng=counter_rng)
+
+
+def addDelayAndWriteToFiles(input_path: Path, output_path: Path, dist_sets: List[tuple], progress: Progress, verbose: bool,
+                            time_multiplier: int = 1, compression: str | None = None, output_format: str = 'text',
+                            counter_rng: bool = False, on_batch: Callable[[int], None] | None = None) -> List[Path]:
+    """
+        Reads and hashes the input once, writing an output for each (generators, weights, set name) in dist_sets.
+        Every set has its own generators, so each output is the same as writing it alone.
+        With counter_rng, the penalty of a request depends only on (seed, generator index, request index).
+        Given a compression, the outputs are compressed while written.
+        Returns the newly written outputs, on_batch is called with the number of requests of every batch.
+    """
+    outputs = []
+    for time_generators, cluster_dists, set_name in dist_sets:
+        calculate_sum_of_dists(cluster_dists)
+        output_file : Path = compressed_path(output_path / f'{set_name}{trace_suffix(output_format)}', compression)
+        if not output_file.exists():
+            outputs.append((time_generators, cluster_dists, output_file))
+
+    if not outputs:
+        return []
+
     num_of_lines = 0
-    chosen_dist_counter = [0] * len(cluster_dists)
-    
-    output_file : Path = output_path / f'{set_name}.trace'
-    if output_file.exists():
-        return
-    
-    with output_file.open('w') as outputFile:
-        with input_path.open('r') as inputFile:
-            BATCH_SIZE = 10_000
-            lines = [line for line in islice(inputFile, 0, BATCH_SIZE)]
-            num_of_lines += len(lines)
-            
-            while (lines):
-                for idx in range(len(lines)):
-                    line = lines[idx]
-                    timestamp, key = line.split(' ')
-                    timestamp = int(timestamp) * time_multiplier
-                    key = key.strip(' \n')
-                    key = xxh3_64_intdigest(key, seed=hash_seed)
-                    
-                    chosen_dist = choose_dist(key, cluster_dists)
-                    chosen_gen = time_generators[chosen_dist]
-                    chosen_dist_counter[chosen_dist] += 1
-                                     
-                    """
-                    Here, using the fields instead of functions in order to reduce the call time.
-                    Moreover, the usage of batches lowers the computation time by 90%!
-                    """
-                    if chosen_gen.index >= RANDOM_BATCH_SIZE:
-                        chosen_gen.refill_values()
-                        
-                    miss_penalty = chosen_gen.gen_values[chosen_gen.index]
-                    chosen_gen.index += 1
-                    
-                    
-                    outputFile.write(f'{timestamp} {key} {miss_penalty}\n')
-                
-                lines = [line for line in islice(inputFile, 0, BATCH_SIZE)]
-                num_of_lines += len(lines)
-            
-                if verbose and num_of_lines % 1_000_000 == 0:
-                    progress.console.print(f'[dark_orange]Added latencies to [cyan bold]{num_of_lines:,}')
-                    progress.console.print(f'[cyan]Dists: {chosen_dist_counter}')
+    chosen_dist_counters = [np.zeros(len(cluster_dists), dtype=np.int64) for _, cluster_dists, _ in outputs]
+    output_files = [open_output(output_file, 'w' if output_format == 'text' else 'wb') for _, _, output_file in outputs]
+    # Whole penalties are written as integers in both formats, when all the generators of a set give them
+    penalty_dtypes = [np.int64 if integer_penalties(time_generators) else np.float64 for time_generators, _, _ in outputs]
+    binary_writers = [TraceWriter(outputFile, FLAG_PENALTY | FLAG_HASHED_KEYS | (FLAG_INTEGER_PENALTY if penalty_dtype == np.int64 else 0))
+                      if output_format == 'binary' else None for outputFile, penalty_dtype in zip(output_files, penalty_dtypes)]
+
+    try:
+        BATCH_SIZE = 100_000
+        for timestamps, keys in read_hashed_requests(input_path, time_multiplier, BATCH_SIZE):
+            first_index = num_of_lines
+            num_of_lines += len(timestamps)
+            if on_batch is not None:
+                on_batch(len(timestamps))
+            text_prefixes = None
+
+            for (time_generators, cluster_dists, _), chosen_dist_counter, outputFile, binary_writer, penalty_dtype in \
+                    zip(outputs, chosen_dist_counters, output_files, binary_writers, penalty_dtypes):
+                """
+                The whole batch is handled at once: choosing the generators, gathering the penalties from
+                the generators' buffers and writing.
+                """
+                with span('latency', lines=len(keys)):
+                    chosen = choose_dists(keys, cluster_dists)
+                    chosen_dist_counter += np.bincount(chosen, minlength=len(cluster_dists))
+                    miss_penalties = gather_penalties(chosen, time_generators, first_index if counter_rng else None, penalty_dtype)
+
+                with span('write', lines=len(keys)):
+                    if binary_writer is None:
+                        if text_prefixes is None:
+                            text_prefixes = [f'{timestamp} {key} ' for timestamp, key in zip(timestamps.tolist(), keys.tolist())]
+                        outputFile.write(''.join(f'{prefix}{miss_penalty}\n' for prefix, miss_penalty
+                                                 in zip(text_prefixes, miss_penalties.tolist())))
+                    else:
+                        binary_writer.write_batch(timestamps, keys, penalties=miss_penalties)
+        
+            if verbose and num_of_lines % 1_000_000 == 0:
+                progress.console.print(f'[dark_orange]Added latencies to [cyan bold]{num_of_lines:,}')
+                progress.console.print(f'[cyan]Dists: {[counter.tolist() for counter in chosen_dist_counters]}')
+
+        for binary_writer in binary_writers:
+            if binary_writer is not None:
+                binary_writer.close()
+    finally:
+        for outputFile in output_files:
+            outputFile.close()
+
+    for (_, _, output_file), chosen_dist_counter in zip(outputs, chosen_dist_counters):
+        progress.console.print(f'[bold #ccd8ab]Processed f{input_path.name} with {num_of_lines:,} into {output_file.name}, '
+                               f'splitting to {chosen_dist_counter.tolist()}')
+
+    return [output_file for _, _, output_file in outputs]
+
+
+def trace_parameters(file: Path) -> tuple:
+    """The time multiplier, seed and set name of an input trace"""
+    file_stem = strip_compression_suffix(file).stem
+    trace_name = file_stem.lower()
+    time_multiplier = 1
+    if (file_stem.startswith("twitter") or file_stem.lower().startswith("meta")):
+        time_multiplier = 1000
+
+    seed = seeds[trace_name]
+    set_name = f'IBMOS-{trace_name}-' if "IBMObjectStore" in file_stem else trace_name
+    return time_multiplier, seed, set_name
+
+
+def named_dist_sets(dists: List[tuple], set_name: str) -> List[tuple]:
+    dist_sets = []
+    for (dist_gens, probs) in dists:
+        suffix = '-'.join(f'{chr(ord('A') + i)}-{repr(dist)}' for i, dist in enumerate(dist_gens))
+        dist_sets.append((dist_gens, probs, set_name + '-' + suffix))
+
+    return dist_sets
+
+
+class AppenderJob(NamedTuple):
+    """Appending the latencies of the given distribution sets (indices in the config) to a single input file"""
+    input_path: Path
+    config_path: Path
+    set_indices: List[int]
+    output_dir: Path
+    output_format: str
+    compression: str | None
+    counter_rng: bool
+    verbose: bool
 
-    progress.console.print(f'[bold #ccd8ab]Processed f{input_path.name} with {num_of_lines:,}, splitting to {chosen_dist_counter}')
 
-    if compress:
-        compress_file_xz(output_file, progress=progress)
+class QueueReporter():
+    """Stands for the rich Progress in the worker processes, forwarding the prints and progress of a job to the main process"""
+    __slots__ = 'job_id', '_queue'
+    def __init__(self, job_id: int, progress_queue):
+        self.job_id = job_id
+        self._queue = progress_queue
+
+    @property
+    def console(self):
+        return self
+
+    def print(self, message: str) -> None:
+        self._queue.put((self.job_id, 'print', message))
+
+    def start(self, name: str) -> None:
+        self._queue.put((self.job_id, 'start', name))
+
+    def advance(self, requests: int) -> None:
+        self._queue.put((self.job_id, 'advance', requests))
+
+    def stages(self, stages: dict) -> None:
+        self._queue.put((self.job_id, 'stages', stages))
+
+
+def _init_worker(progress_queue) -> None:
+    global _progress_queue
+    _progress_queue = progress_queue
+
+
+def run_appender_job(job_id: int, job: AppenderJob) -> List[Path]:
+    reporter = QueueReporter(job_id, _progress_queue)
+    time_multiplier, seed, set_name = trace_parameters(job.input_path)
+    dist_sets = named_dist_sets(load_distributions_from_config(job.config_path, seed), set_name)
+    dist_sets = [dist_sets[idx] for idx in job.set_indices]
+
+    reporter.start(job.input_path.name if len(dist_sets) > 1 else dist_sets[0][2])
+    reporter.print(f'Processing {job.input_path} with [cyan]{time_multiplier}[/cyan] as time multiplier, '
+                   f'dists: {[' '.join(repr(dist) for dist in dist_gens) for dist_gens, _, _ in dist_sets]}')
+
+    RECORDER.take()
+    try:
+        return addDelayAndWriteToFiles(job.input_path, job.output_dir, dist_sets, progress=reporter, verbose=job.verbose,
+                                       time_multiplier=time_multiplier, compression=job.compression, output_format=job.output_format,
+                                       counter_rng=job.counter_rng, on_batch=reporter.advance)
+    finally:
+        reporter.stages(RECORDER.take())
+
+
+def run_appender_jobs(jobs: List[AppenderJob], workers: int, progress: Progress) -> None:
+    """Runs the jobs in a process pool, every running job has its own progress task"""
+    jobs_progress = progress.add_task('[bold #6c7e3a]Jobs', total=len(jobs), start=True)
+    job_tasks = {}
+    finished_jobs = set()
+
+    def handle_messages(block: bool) -> None:
+        while True:
+            try:
+                job_id, kind, value = progress_queue.get(timeout=0.2) if block else progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            block = False
+
+            if kind == 'print':
+                progress.console.print(value)
+            elif kind == 'start':
+                job_tasks[job_id] = progress.add_task(f'[bold #adc178]{value}', total=None, start=True)
+            elif kind == 'advance' and job_id not in finished_jobs:
+                progress.update(job_tasks[job_id], advance=value)
+            elif kind == 'stages':
+                RECORDER.merge(value)
+
+    progress_queue = multiprocessing.Queue()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(progress_queue,)) as executor:
+        pending = {executor.submit(run_appender_job, job_id, job): job_id for job_id, job in enumerate(jobs)}
+        while pending:
+            handle_messages(block=True)
+            done, _ = wait(pending, timeout=0, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_id = pending.pop(future)
+                future.result()
+                handle_messages(block=False)
+                finished_jobs.add(job_id)
+                if job_id in job_tasks:
+                    progress.remove_task(job_tasks.pop(job_id))
+                progress.update(jobs_progress, advance=1)
+
+        handle_messages(block=False)
+
+    progress.remove_task(jobs_progress)
 
         
 def main():
     parser = argparse.ArgumentParser(description='Add latency information to parsed trace files')
 
-    parser.add_argument('-c', '--compress', help="Compress the newly created traces files", action='store_true')
+    parser.add_argument('-c', '--compress', help="Compress the newly created traces files while writing them", action='store_true')
+    parser.add_argument('--compression', help='The compression used with --compress (default: xz)', choices=COMPRESSIONS, default='xz')
     parser.add_argument('-v', '--verbose', help='Prints the time elapsed and number of unique entries for each file, in addition to the progress bar', action='store_true')
     parser.add_argument('-i', '--input-dir', help='The processed files dir path', type=str, default=None)
     parser.add_argument('-o', '--output-dir', help='The path for the newly created files, default = (input_dir)/out_latencies', type=str, default=None)
     parser.add_argument('-d', '--distribution-config', help='Path to JSON config file for latency distributions (required)', type=str, required=True)
+    parser.add_argument('--output-format', help='Output trace format (default: text), the input format is detected automatically',
+                        choices=OUTPUT_FORMATS, default='text')
+    parser.add_argument('--fan-out', help='Read and hash each input once, writing the outputs of all the distribution sets together',
+                        action='store_true')
+    parser.add_argument('-w', '--workers', help='Number of jobs run in parallel, a job is a file and a distribution set '
+                        '(or all of the sets with --fan-out), 0 uses all cores (default: 1)', type=int, default=1)
+    parser.add_argument('--counter-rng', help='Draw the latencies from a counter based generator keyed by (seed, generator, request index), '
+                        'instead of the sequential generators (which reproduce the published traces)', action='store_true')
+    add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -197,39 +409,23 @@ def main():
 
     OUTPUT_DIR.mkdir(exist_ok=True)
 
-    print(f'Processing files: {input_files_paths}')
+    workers = args.workers if args.workers > 0 else default_workers()
+    jobs = []
+    for file in input_files_paths:
+        _, seed, _ = trace_parameters(file)
+        num_of_sets = len(load_distributions_from_config(config_path, seed))
+        set_groups = [list(range(num_of_sets))] if args.fan_out else [[idx] for idx in range(num_of_sets)]
+        jobs.extend(AppenderJob(file, config_path, set_indices, OUTPUT_DIR, args.output_format,
+                                args.compression if args.compress else None, args.counter_rng, args.verbose)
+                    for set_indices in set_groups)
+
+    print(f'Processing files: {input_files_paths} in {len(jobs)} jobs on {workers} workers')
     with Progress(TextColumn("[progress.description]{task.description}"),
                   BarColumn(),
                   TaskProgressColumn(),
-                  SpinnerColumn()) as progress:
-        file_progress = progress.add_task('[bold #6c7e3a]File progress', total=len(input_files_paths), start=True)
-        for file in input_files_paths:
-            progress.console.print(f'Processing {file}')
-            trace_name = file.stem.lower()
-            time_multiplier = 1
-            if (file.stem.startswith("twitter") or file.stem.lower().startswith("meta")):
-                time_multiplier = 1000
-
-            progress.console.print(f'[cyan]Chose {time_multiplier} as time multiplier')
-            seed = seeds[trace_name]
-            set_name = f'IBMOS-{trace_name}-' if "IBMObjectStore" in file.stem else trace_name
-
-            progress.console.print(f'[cyan]Loading distributions from config: {config_path}')
-            dists = load_distributions_from_config(config_path, seed)
-
-            gen_progress = progress.add_task('[bold #adc178]Configuration', total=len(dists), start=True)
-            for (dist_gens, probs) in dists:
-                suffix = '-'.join(f'{chr(ord('A') + i)}-{repr(dist)}' for i, dist in enumerate(dist_gens))
-                progress.console.print(f'Dists: {' '.join([repr(dist) for dist in dist_gens])}')
-
-                addDelayAndWriteToFile(file, OUTPUT_DIR, dist_gens,
-                                       probs, progress=progress, verbose=args.verbose,
-                                       set_name=set_name + '-' + suffix, time_multiplier=time_multiplier,
-                                       compress=args.compress)
-                progress.update(gen_progress, advance=1)
-
-            progress.remove_task(gen_progress)
-            progress.update(file_progress, advance=1)
+                  TextColumn("{task.completed:,.0f}"),
+                  SpinnerColumn()) as progress, instrumented('latency_appender', args):
+        run_appender_jobs(jobs, workers, progress)
 
     print(f'[green]Done appending times to [cyan]{len(input_files_paths)}[green] files')
             
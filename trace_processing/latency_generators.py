@@ -1,4 +1,6 @@
-RANDOM_BATCH_SIZE = 10000000
+# The buffer of a generator grows with the requested draws up to RANDOM_BATCH_SIZE values
+MIN_BATCH_SIZE = 1024
+RANDOM_BATCH_SIZE = 1000000
 
 import numpy as np 
 from typing import Generator, List, Dict
@@ -12,25 +14,109 @@ def verifyDists(cluster_dist: List[float], num_of_generators : int):
     if dist_sum != 1.0 or num_of_generators != len(cluster_dist):
         raise ValueError(f'Bad configuration {dist_sum}, num of generators: {num_of_generators} ' +
                          f'and num of clusters {len(cluster_dist)}')
+
+
+PHILOX_MULTIPLIERS = (0xD2511F53, 0xCD9E8D57)
+PHILOX_WEYL = (0x9E3779B9, 0xBB67AE85)
+PHILOX_ROUNDS = 10
+MASK32 = 0xFFFFFFFF
+
+
+def philox4x32(counters: List[np.ndarray], key: tuple) -> List[np.ndarray]:
+    """Philox4x32-10 over arrays of counter words, returning the four random words of every counter"""
+    c0, c1, c2, c3 = (np.asarray(word, dtype=np.uint64) for word in counters)
+    k0, k1 = key
+    m0, m1 = (np.uint64(multiplier) for multiplier in PHILOX_MULTIPLIERS)
+    mask = np.uint64(MASK32)
+    shift = np.uint64(32)
+    for round_index in range(PHILOX_ROUNDS):
+        if round_index > 0:
+            k0 = (k0 + PHILOX_WEYL[0]) & MASK32
+            k1 = (k1 + PHILOX_WEYL[1]) & MASK32
+        product0 = m0 * c0
+        product1 = m1 * c2
+        c0, c1, c2, c3 = ((product1 >> shift) ^ c1 ^ np.uint64(k0), product1 & mask,
+                          (product0 >> shift) ^ c3 ^ np.uint64(k1), product0 & mask)
+
+    return [c0, c1, c2, c3]
+
+
+def counter_uniforms(seed: int, stream: int, indices: np.ndarray) -> tuple:
+    """
+        Two uniform values in [0, 1) for every request index, a pure function of (seed, stream, index),
+        so any chunk of the requests gets the same values regardless of the order they are drawn in.
+    """
+    indices = np.asarray(indices, dtype=np.uint64)
+    counters = [indices & np.uint64(MASK32), indices >> np.uint64(32),
+                np.full(len(indices), stream & MASK32, dtype=np.uint64), np.zeros(len(indices), dtype=np.uint64)]
+    words = philox4x32(counters, (seed & MASK32, (seed >> 32) & MASK32))
+
+    # 53 random bits out of every pair of words, as numpy does for doubles
+    return tuple(((high >> np.uint64(5)) * np.uint64(1 << 26) + (low >> np.uint64(6))) / float(1 << 53)
+                 for high, low in (words[:2], words[2:]))
         
 
-class NormalDist():
-    __slots__ = '_std_div', '_random_gen', '_mean', 'index', 'gen_values'
-    def __init__(self, mean: float, std_div: float, seed: int):
+class BufferedDist():
+    """
+        Base of the generators drawing their values in batches, subclasses implement _generate.
+        Drawing in batches of any size gives the same values, so the batch only bounds the memory of the generator.
+    """
+    __slots__ = 'index', 'gen_values', '_batch_size'
+    def __init__(self):
+        self.gen_values = np.empty(0)
+        self.index = 0
+        self._batch_size = MIN_BATCH_SIZE
+
+    def _generate(self, size: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def refill_values(self, batch_size: int | None = None):
+        """
+            Replaces the buffer with the next batch_size values (default: the current size of the buffer),
+            the following refills keep the size.
+        """
+        if batch_size is not None:
+            self._batch_size = batch_size
+        self.index = 0
+        self.gen_values = self._generate(self._batch_size)
+
+    def draw(self, count: int) -> np.ndarray:
+        """Returns the next count values of the generator"""
+        values = []
+        while count > 0:
+            if self.index >= len(self.gen_values):
+                self.refill_values(min(max(self._batch_size, count), RANDOM_BATCH_SIZE))
+
+            taken = min(count, len(self.gen_values) - self.index)
+            values.append(self.gen_values[self.index:self.index + taken])
+            self.index += taken
+            count -= taken
+
+        return np.concatenate(values) if values else np.empty(0)
+
+
+class NormalDist(BufferedDist):
+    __slots__ = '_std_div', '_random_gen', '_mean', '_seed', '_stream'
+    def __init__(self, mean: float, std_div: float, seed: int, stream: int = 0):
+        super().__init__()
         self._std_div = std_div
         self._random_gen = np.random.default_rng(seed)
+        self._seed = seed
+        self._stream = stream
         
         self._mean = mean
-        self.gen_values = None
-        self.index = RANDOM_BATCH_SIZE
     
-    def refill_values(self):
-        self.index = 0
-        self.gen_values = self._random_gen.normal(self._mean, self._std_div, size=RANDOM_BATCH_SIZE)
-        
-        for i in range(RANDOM_BATCH_SIZE):
-            val = self.gen_values[i]
-            self.gen_values[i] = max(val, self._mean - 3 * self._std_div, 5)
+    def _clamp(self, values: np.ndarray) -> np.ndarray:
+        return np.maximum(values, max(self._mean - 3 * self._std_div, 5))
+
+    def _generate(self, size: int) -> np.ndarray:
+        return self._clamp(self._random_gen.normal(self._mean, self._std_div, size=size))
+
+    def values_at(self, indices: np.ndarray) -> np.ndarray:
+        """The values of the given request indices, drawn with Box-Muller from the counter based generator"""
+        first, second = counter_uniforms(self._seed, self._stream, indices)
+        normals = np.sqrt(-2 * np.log1p(-first)) * np.cos(2 * np.pi * second)
+        return self._clamp(self._mean + self._std_div * normals)
     
     def __str__(self):
         return f'Normal with mean {self._mean} and sigma {self._std_div}'
@@ -39,19 +125,24 @@ class NormalDist():
         return f"N-{int(self._mean - 1.6449 * self._std_div)}-{int(self._mean + 1.6449 * self._std_div)}"
 
 
-class UniformDist():
-    __slots__ = '_low', '_high', '_random_gen', 'mean', 'index', 'gen_values'
-    def __init__(self, low: float, high: float):
+class UniformDist(BufferedDist):
+    __slots__ = '_low', '_high', '_random_gen', 'mean', '_seed', '_stream'
+    def __init__(self, low: float, high: float, seed: int, stream: int = 0):
+        super().__init__()
         self._low = low
         self._high = high
-        self._random_gen = np.random.default_rng()
+        self._random_gen = np.random.default_rng([seed, stream])
+        self._seed = seed
+        self._stream = stream
         
         self.mean = (low + high * 1.0) / 2
-        self.refill_values()
         
-    def refill_values(self):
-        self.index = 0
-        self.gen_values = self._random_gen.uniform(self._low, self._high, size=RANDOM_BATCH_SIZE)
+    def _generate(self, size: int) -> np.ndarray:
+        return self._random_gen.uniform(self._low, self._high, size=size)
+
+    def values_at(self, indices: np.ndarray) -> np.ndarray:
+        first, _ = counter_uniforms(self._seed, self._stream, indices)
+        return self._low + (self._high - self._low) * first
         
     def __str__(self):
         return f'Uniform between {self._low} and {self._high}'
@@ -60,9 +151,10 @@ class UniformDist():
         return f'U-{self._low}-{self._high}'
 
 
-class MultiplePeaksDist():
-    __slots__ = '_values', '_probs', 'mean', 'index', 'gen_values'
-    def __init__(self, values : List[float], probs : List[float]):
+class MultiplePeaksDist(BufferedDist):
+    __slots__ = '_values', '_probs', 'mean', '_random_gen', '_seed', '_stream'
+    def __init__(self, values : List[float], probs : List[float], seed: int, stream: int = 0):
+        super().__init__()
         if not len(probs) == len(values):
             raise ValueError(f'length mismatch for probs: {probs} and values {values} {len(probs)} != {len(values)}')
         
@@ -73,11 +165,17 @@ class MultiplePeaksDist():
         self._probs = probs
         
         self.mean = reduce(lambda acc, curr: acc + curr[0] * curr[1], zip(self._values, self._probs), 0)
-        self.refill_values()
+        self._random_gen = np.random.default_rng([seed, stream])
+        self._seed = seed
+        self._stream = stream
     
-    def refill_values(self):
-        self.index = 0
-        self.gen_values = np.random.choice(self._values, p=self._probs, size=RANDOM_BATCH_SIZE)
+    def _generate(self, size: int) -> np.ndarray:
+        return self._random_gen.choice(self._values, p=self._probs, size=size)
+
+    def values_at(self, indices: np.ndarray) -> np.ndarray:
+        first, _ = counter_uniforms(self._seed, self._stream, indices)
+        chosen = np.searchsorted(np.cumsum(self._probs), first, side='right')
+        return np.asarray(self._values)[np.minimum(chosen, len(self._values) - 1)]
         
     def __str__(self):
         return f'{len(self._values)} Peaks with values {self._values} and probabilty {self._probs}'
@@ -88,16 +186,15 @@ class MultiplePeaksDist():
 
      
 class SingleValueDist():
-    __slots__ = 'mean', 'index', 'gen_values'
+    __slots__ = 'mean',
     def __init__(self, val: float):
         self.mean = val
-        self.gen_values = [val] * RANDOM_BATCH_SIZE
-        
-        self.refill_values()
         
-        
-    def refill_values(self):
-        self.index = 0
+    def draw(self, count: int) -> np.ndarray:
+        return np.full(count, self.mean)
+
+    def values_at(self, indices: np.ndarray) -> np.ndarray:
+        return np.full(len(indices), self.mean)
     
     def __str__(self):
         return f'Single Value of {self.mean}'
@@ -5,13 +5,23 @@ from pathlib import Path
 from itertools import islice
 from typing import Iterator, List
 
+import numpy as np
+
+from trace_format import TraceWriter, TraceBatch, FLAG_PENALTY, FLAG_HIT, FLAG_HASHED_KEYS, FLAG_INTEGER_PENALTY, OUTPUT_FORMATS, \
+                         is_binary_trace, open_trace, parse_text_lines, format_text, text_trace_flags
+from compression import open_input, open_output
+from instrumentation import span, add_arguments, instrumented
+
 pretty.install()
 BATCH_SIZE = 10_000
 
 def batched_file_reader(file_path: Path) -> Iterator[List[str]]:
-    with open(file_path, 'r', encoding='utf-8') as f:
+    with open_input(file_path, 'r', encoding='utf-8') as f:
         while True:
-            batch = list(islice(f, BATCH_SIZE))
+            with span('read') as read:
+                batch = list(islice(f, BATCH_SIZE))
+                read.lines = len(batch)
+                read.bytes = sum(map(len, batch))
             if not batch:
                 break
             
@@ -21,7 +31,7 @@ def batched_file_reader(file_path: Path) -> Iterator[List[str]]:
 
 
 def process_batches(trace_file: Path, marked_file: Path, output_path: Path, multiplier: int) -> None:
-    with open(output_path, 'w', encoding='utf-8') as output_file:
+    with open_output(output_path, 'w', encoding='utf-8') as output_file:
         trace_file_batches = batched_file_reader(trace_file)
         marked_file_batches = batched_file_reader(marked_file)
         
@@ -35,22 +45,23 @@ def process_batches(trace_file: Path, marked_file: Path, output_path: Path, mult
                 print(f"[red bold]Error: Batch {batch_num} size mismatch - trace_file: {len(batch1)}, marked_file: {len(batch2)}")
                 exit(1)
             
-            for line1, line2 in zip(batch1, batch2):
-                line_num = total_processed + 1
-                time1, id1, miss_penalty = line1.split()
-                time2, _, is_hit = line2.split()
-                time1 = int(time1)
-                time2 = int(time2)
-                time2 *= multiplier
-                
-                if time1 != time2:
-                    print(f"[bold red]Error: Line {line_num} - timestamp mismatch: {time1} != {time2}")
-                    exit(1)
-                
-                merged_line = f"{time1} {id1} {miss_penalty} {is_hit}\n"
-                output_file.write(merged_line)
-                
-                total_processed += 1
+            with span('merge and write', lines=len(batch1)):
+                for line1, line2 in zip(batch1, batch2):
+                    line_num = total_processed + 1
+                    time1, id1, miss_penalty = line1.split()
+                    time2, _, is_hit = line2.split()
+                    time1 = int(time1)
+                    time2 = int(time2)
+                    time2 *= multiplier
+                    
+                    if time1 != time2:
+                        print(f"[bold red]Error: Line {line_num} - timestamp mismatch: {time1} != {time2}")
+                        exit(1)
+                    
+                    merged_line = f"{time1} {id1} {miss_penalty} {is_hit}\n"
+                    output_file.write(merged_line)
+                    
+                    total_processed += 1
             
             if batch_num % 100 == 0:
                 print(f"[yellow]Processed {total_processed:_} lines...")
@@ -69,6 +80,79 @@ def process_batches(trace_file: Path, marked_file: Path, output_path: Path, mult
     print(f"[bold cyan]Output written to: {output_path}")
 
 
+def trace_batches(trace_file: Path) -> Iterator[TraceBatch]:
+    if is_binary_trace(trace_file):
+        with open_trace(trace_file) as reader:
+            yield from reader.iter_batches(BATCH_SIZE)
+    else:
+        for batch in batched_file_reader(trace_file):
+            yield parse_text_lines(batch, ['timestamp', 'key', 'penalty'], hash_keys=False)
+
+
+def process_batches_columnar(trace_file: Path, marked_file: Path, output_path: Path, multiplier: int, output_format: str) -> None:
+    """Same as process_batches, for binary inputs or outputs, working on whole batches"""
+    flags = FLAG_PENALTY | FLAG_HIT
+    if is_binary_trace(trace_file):
+        with open_trace(trace_file) as reader:
+            flags |= reader.flags & (FLAG_HASHED_KEYS | FLAG_INTEGER_PENALTY)
+    else:
+        flags |= text_trace_flags(trace_file, ['timestamp', 'key', 'penalty']) & FLAG_INTEGER_PENALTY
+
+    with open_output(output_path, 'w' if output_format == 'text' else 'wb') as output_file:
+        binary_writer = TraceWriter(output_file, flags) if output_format == 'binary' else None
+        trace_file_batches = trace_batches(trace_file)
+        marked_file_batches = batched_file_reader(marked_file)
+
+        total_processed = 0
+        batch_num = 0
+
+        for batch1, batch2 in zip(trace_file_batches, marked_file_batches):
+            batch_num += 1
+
+            if len(batch1.timestamps) != len(batch2):
+                print(f"[red bold]Error: Batch {batch_num} size mismatch - trace_file: {len(batch1.timestamps)}, marked_file: {len(batch2)}")
+                exit(1)
+
+            with span('parse', lines=len(batch2)):
+                marked = [line.split() for line in batch2]
+                time2 = np.array([int(parts[0]) for parts in marked], dtype=np.int64) * multiplier
+                is_hit = np.array([int(parts[2]) for parts in marked], dtype=np.uint8)
+
+            mismatches = np.flatnonzero(batch1.timestamps != time2)
+            if len(mismatches) > 0:
+                idx = mismatches[0]
+                print(f"[bold red]Error: Line {total_processed + idx + 1} - timestamp mismatch: {batch1.timestamps[idx]} != {time2[idx]}")
+                exit(1)
+
+            merged = batch1._replace(hit_penalties=None, hits=is_hit)
+            with span('write', lines=len(time2)):
+                if binary_writer is None:
+                    output_file.write(format_text(merged, flags))
+                else:
+                    binary_writer.write(merged)
+
+            total_processed += len(time2)
+
+            if batch_num % 100 == 0:
+                print(f"[yellow]Processed {total_processed:_} lines...")
+
+        remaining1 = list(islice(trace_file_batches, 1))
+        remaining2 = list(islice(marked_file_batches, 1))
+
+        if remaining1:
+            print(f"[bold red]Error: The trace file has more lines after line {total_processed:_}")
+            exit(1)
+        if remaining2:
+            print(f"[bold red]Error: The marked file has more lines after line {total_processed:_}")
+            exit(1)
+
+        if binary_writer is not None:
+            binary_writer.close()
+
+    print(f"[bold green]Successfully processed {total_processed:_} lines.")
+    print(f"[bold cyan]Output written to: {output_path}")
+
+
 def main():
     parser = argparse.ArgumentParser()
     
@@ -78,7 +162,11 @@ def main():
     parser.add_argument('--marked_file', '-m', type=str, required=True,
                         help='Path to marked trace file (format: request-time item-id is-hit)')
     
-    parser.add_argument('--output', '-o', type=str, required=True, help='Path to output marked and latency appended file')
+    parser.add_argument('--output', '-o', type=str, required=True, help='Path to output marked and latency appended file, '
+                        'compressed while written when ending with .xz, .gz or .zst')
+    parser.add_argument('--output-format', help='Output trace format (default: text), the format of the trace file is detected automatically',
+                        choices=OUTPUT_FORMATS, default='text')
+    add_arguments(parser)
     args = parser.parse_args()
     
     trace_file = Path(args.trace_file)
@@ -102,7 +190,11 @@ def main():
     print(f"Input file 2: {marked_file_path}")
     print(f"Output file: {output_path}")
     
-    process_batches(trace_file, marked_file_path, output_path, multiplier)
+    with instrumented('mark_existing_trace', args):
+        if args.output_format == 'binary' or is_binary_trace(trace_file):
+            process_batches_columnar(trace_file, marked_file_path, output_path, multiplier, args.output_format)
+        else:
+            process_batches(trace_file, marked_file_path, output_path, multiplier)
 
 
 if __name__ == "__main__":
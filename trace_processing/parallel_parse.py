@@ -0,0 +1,136 @@
+import io
+import os
+
+import numpy as np
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, List
+
+from rich import print
+
+from trace_format import TraceWriter, FLAG_HASHED_KEYS
+from instrumentation import RECORDER, span
+
+RANGE_SIZE = 64 * 1024 * 1024
+
+
+def split_byte_ranges(input_path: Path, range_size: int = RANGE_SIZE) -> List[tuple]:
+    """Splits the file to ranges of about range_size bytes, each range ends right after a newline"""
+    file_size = input_path.stat().st_size
+    ranges = []
+    start = 0
+    with input_path.open('rb') as file:
+        while start < file_size:
+            file.seek(min(start + range_size, file_size))
+            file.readline()
+            end = min(file.tell(), file_size)
+            ranges.append((start, end))
+            start = end
+
+    return ranges
+
+
+def _read_lines(input_path: Path, start: int, end: int) -> io.StringIO:
+    with input_path.open('rb') as file, span('read', bytes=end - start):
+        file.seek(start)
+        raw = file.read(end - start)
+
+    # Same decoding and newline translation as reading the whole file in text mode
+    return io.StringIO(raw.decode('utf-8', errors='replace'), newline=None)
+
+
+def _parse_range_text(input_path: Path, start: int, end: int, parse_line: Callable) -> tuple:
+    lines_processed = 0
+    output_lines = []
+    lines = _read_lines(input_path, start, end)
+    with span('parse') as parse:
+        for line in lines:
+            lines_processed += 1
+            output_line = parse_line(line)
+            if output_line != None:
+                output_lines.append(f'{output_line}\n')
+        parse.lines = lines_processed
+
+    return ''.join(output_lines), lines_processed, lines_processed - len(output_lines), RECORDER.take()
+
+
+def _parse_range_binary(input_path: Path, start: int, end: int, parse_line: Callable) -> tuple:
+    lines_processed = 0
+    timestamps = []
+    keys = []
+    lines = _read_lines(input_path, start, end)
+    with span('parse and hash') as parse:
+        for line in lines:
+            lines_processed += 1
+            request = parse_line(line)
+            if request is not None:
+                timestamps.append(request[0])
+                keys.append(request[1])
+        parse.lines = lines_processed
+
+    requests = (np.array(timestamps, dtype=np.int64), np.array(keys, dtype=np.uint64))
+    return requests, lines_processed, lines_processed - len(timestamps), RECORDER.take()
+
+
+def _ordered_results(input_path: Path, range_parser: Callable, parse_line: Callable, workers: int) -> Iterator[tuple]:
+    """
+        Parses the ranges in a process pool, yielding the results in the order of the file with a bounded number in flight.
+        The stages timed by the workers are merged into the recorder of this process.
+    """
+    ranges = split_byte_ranges(input_path)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for start, end in ranges:
+            pending.append(executor.submit(range_parser, input_path, start, end, parse_line))
+            if len(pending) >= 2 * workers:
+                *result, stages = pending.popleft().result()
+                RECORDER.merge(stages)
+                yield result
+
+        while pending:
+            *result, stages = pending.popleft().result()
+            RECORDER.merge(stages)
+            yield result
+
+
+def parallel_process_file(input_path: Path, output_path: Path, parse_line: Callable, workers: int) -> None:
+    """
+        Parallel version of processFile, the output is identical to the serial one.
+        parse_line must be a module level function, returning the output line or None for dropped lines.
+    """
+    lines_processed = 0
+    lines_removed = 0
+    with output_path.open('w') as output_file:
+        for output, processed, removed in _ordered_results(input_path, _parse_range_text, parse_line, workers):
+            with span('write', lines=processed - removed, bytes=len(output)):
+                output_file.write(output)
+            lines_processed += processed
+            lines_removed += removed
+    print(f"[green]Processed {lines_processed} lines ignoring [yellow]{lines_removed}")
+
+
+def parallel_process_file_binary(input_path: Path, output_path: Path, parse_line: Callable, workers: int) -> None:
+    """
+        Parallel version of processFileBinary.
+        parse_line must be a module level function, returning (timestamp, hashed key) or None for dropped lines.
+    """
+    lines_processed = 0
+    lines_removed = 0
+    with TraceWriter(output_path, FLAG_HASHED_KEYS) as writer:
+        for (timestamps, keys), processed, removed in _ordered_results(input_path, _parse_range_binary, parse_line, workers):
+            with span('write', lines=len(timestamps)):
+                writer.write_batch(timestamps, keys)
+            lines_processed += processed
+            lines_removed += removed
+    print(f"[green]Processed {lines_processed} lines ignoring [yellow]{lines_removed}")
+
+
+def default_workers() -> int:
+    return len(os.sched_getaffinity(0))
+
+
+if __name__ == "__main__":
+    print("Not intended to be run")
+    exit(1)
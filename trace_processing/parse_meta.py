@@ -1,12 +1,20 @@
 import argparse
 import re
 from pathlib import Path
+from itertools import islice
 
+from xxhash import xxh3_64_intdigest
 from rich import pretty, print
 
+from common_data import hash_seed
+from trace_format import TraceWriter, FLAG_HASHED_KEYS, OUTPUT_FORMATS, BATCH_SIZE, trace_suffix
+from compression import open_input, is_compressed
+from parallel_parse import parallel_process_file, parallel_process_file_binary, default_workers
+from instrumentation import span, add_arguments, instrumented
+
 pretty.install()
 
-def parseLine(entry: str) -> str | None:
+def parseRequest(entry: str) -> tuple | None:
     parts = entry.strip().split(',')
 
     if len(parts) != 8:
@@ -17,24 +25,75 @@ def parseLine(entry: str) -> str | None:
     op = parts[3]
 
     if 'GET' in op.upper():
-        return f'{timestamp} {key}'
+        return timestamp, key
     else:
         return None
 
+def parseLine(entry: str) -> str | None:
+    request = parseRequest(entry)
+    if request is None:
+        return None
+
+    timestamp, key = request
+    return f'{timestamp} {key}'
+
+def hashKey(key: str) -> int:
+    """The keys are hashed here as latency_appender would have, since the binary format holds integer keys"""
+    return xxh3_64_intdigest(key.strip(' \n').encode('utf-8'), seed=hash_seed)
+
+def parseHashedRequest(entry: str) -> tuple | None:
+    request = parseRequest(entry)
+    if request is None:
+        return None
+
+    timestamp, key = request
+    return int(timestamp), hashKey(key)
+
+def readBatch(raw_file) -> list:
+    with span('read') as read:
+        lines = list(islice(raw_file, BATCH_SIZE))
+        read.lines = len(lines)
+        read.bytes = sum(map(len, lines))
+
+    return lines
+
 def processFile(input_path: Path, output_path: Path) -> None:
-    with input_path.open(encoding='utf-8', errors='replace') as raw_file:
+    with open_input(input_path, 'r', encoding='utf-8', errors='replace') as raw_file:
         lines_processed = 0
         lines_removed = 0
         with output_path.open('w') as output_file:
-            line = raw_file.readline()
-            while line:
-                lines_processed += 1
-                output_line = parseLine(line)
-                if output_line != None:
-                    output_file.write(f'{output_line}\n')
-                else:
-                    lines_removed += 1
-                line = raw_file.readline()
+            lines = readBatch(raw_file)
+            while lines:
+                with span('parse', lines=len(lines)):
+                    output_lines = [f'{output_line}\n' for output_line in map(parseLine, lines) if output_line != None]
+                with span('write', lines=len(output_lines)) as write:
+                    output = ''.join(output_lines)
+                    write.bytes = len(output)
+                    output_file.write(output)
+
+                lines_processed += len(lines)
+                lines_removed += len(lines) - len(output_lines)
+                lines = readBatch(raw_file)
+        print(f"[green]Processed {lines_processed} lines ignoring [yellow]{lines_removed}")
+
+def processFileBinary(input_path: Path, output_path: Path) -> None:
+    with open_input(input_path, 'r', encoding='utf-8', errors='replace') as raw_file, \
+         TraceWriter(output_path, FLAG_HASHED_KEYS) as writer:
+        lines_processed = 0
+        lines_removed = 0
+        lines = readBatch(raw_file)
+        while lines:
+            with span('parse', lines=len(lines)):
+                requests = [request for request in map(parseRequest, lines) if request is not None]
+                timestamps = [int(timestamp) for timestamp, _ in requests]
+            with span('hash', lines=len(requests)):
+                keys = [hashKey(key) for _, key in requests]
+            with span('write', lines=len(timestamps)):
+                writer.write_batch(timestamps, keys)
+
+            lines_processed += len(lines)
+            lines_removed += len(lines) - len(timestamps)
+            lines = readBatch(raw_file)
         print(f"[green]Processed {lines_processed} lines ignoring [yellow]{lines_removed}")
 
 def extract_metakv_version(filename: str) -> str | None:
@@ -54,6 +113,9 @@ def main():
     parser = argparse.ArgumentParser(description='Parse metaKV trace file')
     parser.add_argument('-i', '--input-file', help='Input trace file', type=str, required=True)
     parser.add_argument('-o', '--output-path', help='Output directory path', type=str, required=True)
+    parser.add_argument('--output-format', help='Output trace format (default: text)', choices=OUTPUT_FORMATS, default='text')
+    parser.add_argument('-w', '--workers', help='Number of parsing processes, 0 for all the available cores (default: 1)', type=int, default=1)
+    add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -70,7 +132,7 @@ def main():
         print(f'[yellow]Expected format: metakvX-... or 202210_kv_... or 202401_kv_...')
         return
 
-    output_filename = f'metakv{version}.trace'
+    output_filename = f'metakv{version}{trace_suffix(args.output_format)}'
     output_file = output_dir / output_filename
 
     print(f'Input file: {str(input_file.resolve())}')
@@ -79,7 +141,22 @@ def main():
     output_dir.mkdir(exist_ok=True, parents=True)
 
     print(f'[orange]Start processing [purple]{input_file.name}')
-    processFile(input_file, output_file)
+    workers = args.workers if args.workers > 0 else default_workers()
+    if workers > 1 and is_compressed(input_file):
+        print('[yellow]Compressed inputs cannot be split to byte ranges, parsing with a single process')
+        workers = 1
+
+    with instrumented('parse_meta', args):
+        if workers > 1:
+            print(f'[cyan]Parsing with {workers} processes')
+            if args.output_format == 'binary':
+                parallel_process_file_binary(input_file, output_file, parseHashedRequest, workers)
+            else:
+                parallel_process_file(input_file, output_file, parseLine, workers)
+        elif args.output_format == 'binary':
+            processFileBinary(input_file, output_file)
+        else:
+            processFile(input_file, output_file)
     print(f'[green]Done processing: [purple]{input_file.name} -> [cyan]{output_filename}')
 
 
@@ -1,21 +1,34 @@
 import csv
+import io
 import re
 import xxhash
 import argparse
+import numpy as np
+import polars as pl
 from pathlib import Path
 from itertools import islice
-from typing import List, Iterator
+from typing import List, Iterator, BinaryIO
 from rich import print, pretty
+
+from compression import open_input
+from trace_format import TraceWriter, OUTPUT_FORMATS, trace_suffix
+from instrumentation import span, add_arguments, instrumented
 pretty.install()
 
 # Shortening the traces to be either 200mil requests or 10 hours long.
 MAX_REQUESTS_TO_PROCESS = 200000000
 MAX_TIME_TO_PROCESS = 36000
 
+BLOCK_SIZE = 64 * 1024 * 1024
+ENGINES = ['polars', 'csv']
+BLANK_LINES = re.compile(rb'^\r?\n', re.MULTILINE)
+
 
 def read_batches(reader: csv.DictReader, batch_size: int) -> Iterator[List[dict]]:
     while True:
-        batch = list(islice(reader, batch_size))
+        with span('read') as read:
+            batch = list(islice(reader, batch_size))
+            read.lines = len(batch)
         if not batch:
             break
         yield batch
@@ -31,34 +44,43 @@ def process_key(key: str) -> int:
     return hash_value
 
 
-def process_csv_batches(input_file: Path, output_file: Path, batch_size: int = 10000) -> None:
+def process_csv_batches(input_file: Path, output_file: Path, batch_size: int = 10000, output_format: str = 'text') -> None:
     processed_count = 0
     total_filtered = 0
     batch_number = 0
     last_timestamp = 0
     
-    with input_file.open('r', newline='', encoding='utf-8') as infile, \
-         output_file.open('w', newline='', encoding='utf-8') as outfile:
+    with open_input(input_file, 'r', newline='', encoding='utf-8') as infile, \
+         (output_file.open('w', newline='', encoding='utf-8') if output_format == 'text' else output_file.open('wb')) as outfile:
              
         fieldnames = ['timestamp', 'key', 'key_size', 'value_size', 'client_id', 'operation', 'TTL']
         reader = csv.DictReader(infile, fieldnames=fieldnames)
-        writer = csv.writer(outfile, delimiter=' ')
+        if output_format == 'binary':
+            binary_writer = TraceWriter(outfile, flags=0)
+        else:
+            writer = csv.writer(outfile, delimiter=' ')
         
         for batch in read_batches(reader, batch_size):
             batch_number += 1
             filtered_rows = []
-            for row in batch:
-                operation = row.get('operation', '').strip().lower()
-                if operation in ['get', 'gets']:
-                    timestamp = int(row.get('timestamp', '').strip()) * 1000  # Convert to milliseconds
-                    last_timestamp = int(timestamp)
-                    key = row.get('key', '').strip()
-                    hashed_key = process_key(key)
-                    filtered_rows.append([timestamp, hashed_key])
-                    total_filtered += 1
+            with span('parse and hash', lines=len(batch)):
+                for row in batch:
+                    operation = row.get('operation', '').strip().lower()
+                    if operation in ['get', 'gets']:
+                        timestamp = int(row.get('timestamp', '').strip()) * 1000  # Convert to milliseconds
+                        last_timestamp = int(timestamp)
+                        key = row.get('key', '').strip()
+                        hashed_key = process_key(key)
+                        filtered_rows.append([timestamp, hashed_key])
+                        total_filtered += 1
             
             if filtered_rows:
-                writer.writerows(filtered_rows)
+                with span('write', lines=len(filtered_rows)):
+                    if output_format == 'binary':
+                        timestamps, keys = zip(*filtered_rows)
+                        binary_writer.write_batch(timestamps, keys)
+                    else:
+                        writer.writerows(filtered_rows)
             
             processed_count += len(batch)
             if (batch_number % 100 == 0):
@@ -66,6 +88,9 @@ def process_csv_batches(input_file: Path, output_file: Path, batch_size: int = 1
                 
             if (last_timestamp > MAX_TIME_TO_PROCESS or total_filtered > MAX_REQUESTS_TO_PROCESS):
                 break
+
+        if output_format == 'binary':
+            binary_writer.close()
     
     print(f"\nCompleted processing:")
     print(f"Total rows processed: {processed_count}")
@@ -75,6 +100,105 @@ def process_csv_batches(input_file: Path, output_file: Path, batch_size: int = 1
     print(f"Output file: {output_file}")
 
 
+def read_line_blocks(infile: BinaryIO, block_size: int) -> Iterator[bytes]:
+    while True:
+        with span('read') as read:
+            block = infile.read(block_size)
+            if block and not block.endswith(b'\n'):
+                block += infile.readline()
+            read.bytes = len(block)
+        if not block:
+            break
+        yield block
+
+
+def drop_blank_lines(block: bytes) -> bytes:
+    """csv.DictReader skips blank lines, and polars takes the number of columns from the first line of the block"""
+    return BLANK_LINES.sub(b'', block)
+
+
+def process_csv_vectorized(input_file: Path, output_file: Path, batch_size: int = 10000, output_format: str = 'text') -> None:
+    """
+        Same output as process_csv_batches, processing blocks of the file as polars columns.
+        Only the timestamp, key and operation columns are parsed, and the keys are hashed per block.
+    """
+    processed_count = 0
+    total_filtered = 0
+    block_number = 0
+    last_timestamp = 0
+    reached_limit = False
+
+    with open_input(input_file, 'rb') as infile, output_file.open('wb') as outfile:
+        binary_writer = TraceWriter(outfile, flags=0) if output_format == 'binary' else None
+
+        for block in read_line_blocks(infile, BLOCK_SIZE):
+            block_number += 1
+            with span('parse', bytes=len(block)) as parse:
+                block = drop_blank_lines(block)
+                if not block:
+                    continue
+
+                df = pl.read_csv(io.BytesIO(block), has_header=False, columns=[0, 1, 5], infer_schema=False, truncate_ragged_lines=True)
+                df.columns = ['timestamp', 'key', 'operation']
+
+                operations = df['operation'].str.strip_chars().str.to_lowercase()
+                kept = operations.is_in(['get', 'gets']).fill_null(False).to_numpy()
+                kept_rows = df.filter(kept)
+                kept_idx = np.flatnonzero(kept)
+                timestamps = kept_rows['timestamp'].str.strip_chars().cast(pl.Int64).to_numpy() * 1000  # Convert to milliseconds
+
+                # The limits are checked at the end of every batch of batch_size rows, as in process_csv_batches
+                block_rows = df.height
+                kept_count = len(kept_idx)
+                batch_ends = np.flatnonzero((processed_count + np.arange(1, block_rows + 1)) % batch_size == 0)
+                if len(batch_ends) > 0:
+                    kept_at_end = np.searchsorted(kept_idx, batch_ends, side='right')
+                    if kept_count > 0:
+                        last_at_end = np.where(kept_at_end > 0, timestamps[np.maximum(kept_at_end - 1, 0)], last_timestamp)
+                    else:
+                        last_at_end = np.full(len(batch_ends), last_timestamp)
+                    over_limit = (last_at_end > MAX_TIME_TO_PROCESS) | (total_filtered + kept_at_end > MAX_REQUESTS_TO_PROCESS)
+                    if over_limit.any():
+                        first_over = int(np.argmax(over_limit))
+                        block_rows = int(batch_ends[first_over]) + 1
+                        kept_count = int(kept_at_end[first_over])
+                        reached_limit = True
+
+                timestamps = timestamps[:kept_count]
+                key_suffixes = kept_rows['key'].head(kept_count).str.strip_chars().str.split(':').list.last()
+                parse.lines = block_rows
+
+            with span('hash', lines=kept_count):
+                hashed_keys = np.array([xxhash.xxh3_64_intdigest(key.encode('utf-8')) for key in key_suffixes.to_list()], dtype=np.uint64)
+
+            with span('write', lines=kept_count):
+                if binary_writer is not None:
+                    binary_writer.write_batch(timestamps, hashed_keys)
+                elif kept_count > 0:
+                    # csv.writer terminates the lines with \r\n, keeping the output identical
+                    pl.DataFrame({'timestamp': timestamps, 'key': hashed_keys}).write_csv(outfile, separator=' ', include_header=False,
+                                                                                          line_terminator='\r\n')
+
+            processed_count += block_rows
+            total_filtered += kept_count
+            if kept_count > 0:
+                last_timestamp = int(timestamps[-1])
+
+            print(f"Processed {processed_count} rows, filtered {total_filtered} rows so far...")
+            if reached_limit:
+                break
+
+        if binary_writer is not None:
+            binary_writer.close()
+
+    print("\nCompleted processing:")
+    print(f"Total rows processed: {processed_count}")
+    print(f"Total rows written to output: {total_filtered}")
+    print(f"The last timestamp written is: {last_timestamp}")
+    print(f"Kept {(total_filtered) / processed_count * 100}% of the lines")
+    print(f"Output file: {output_file}")
+
+
 def extract_cluster_number(filename: str) -> str | None:
     match = re.search(r'cluster(\d{2})', filename)
     if match:
@@ -88,6 +212,10 @@ def main():
     parser.add_argument('-o', '--output-path', required=True, type=str, help='Output directory path')
     parser.add_argument('--batch-size', type=int, required=False, default=10000,
                         help='Number of rows to process at a time (default: 10000)')
+    parser.add_argument('--output-format', help='Output trace format (default: text)', choices=OUTPUT_FORMATS, default='text')
+    parser.add_argument('--engine', help='polars processes whole blocks as columns, csv processes row by row (default: polars)',
+                        choices=ENGINES, default='polars')
+    add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -103,7 +231,7 @@ def main():
         exit(1)
 
     output_dir = Path(args.output_path)
-    output_filename = f'twitter{cluster_number}.trace'
+    output_filename = f'twitter{cluster_number}{trace_suffix(args.output_format)}'
     output_file = output_dir / output_filename
 
     print(f'Input file: {str(input_file.resolve())}')
@@ -111,7 +239,11 @@ def main():
 
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    process_csv_batches(input_file, output_file, args.batch_size)
+    with instrumented('parse_twitter', args):
+        if args.engine == 'polars':
+            process_csv_vectorized(input_file, output_file, args.batch_size, args.output_format)
+        else:
+            process_csv_batches(input_file, output_file, args.batch_size, args.output_format)
 
     print(f'[green]Done processing: [purple]{input_file.name} -> [cyan]{output_filename}')
 
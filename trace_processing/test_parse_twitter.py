@@ -0,0 +1,31 @@
+import parse_twitter
+
+LINES = ['1,q:q:1:8WTwl7huJeQ,12,100,1,get,0\n',
+         '2,q:q:1:Xk3dPq0aZ2m,12,100,2,set,0\n',
+         '3,q:q:1:8WTwl7huJeQ,12,100,1,gets,0\n',
+         '4,q:q:1:Lq9sVb1nT0p,12,100,3,get,0\n']
+
+
+def parse_with_both_engines(tmp_path, content: str) -> tuple:
+    input_file = tmp_path / 'cluster01.sort'
+    input_file.write_text(content)
+    parse_twitter.process_csv_batches(input_file, tmp_path / 'csv.trace')
+    parse_twitter.process_csv_vectorized(input_file, tmp_path / 'polars.trace')
+
+    return (tmp_path / 'csv.trace').read_bytes(), (tmp_path / 'polars.trace').read_bytes()
+
+
+def test_blank_line_at_block_start(tmp_path, monkeypatch):
+    # The first block ends after the first line, so the second block starts with the blank line
+    monkeypatch.setattr(parse_twitter, 'BLOCK_SIZE', len(LINES[0]))
+    by_csv, by_polars = parse_with_both_engines(tmp_path, LINES[0] + '\n' + ''.join(LINES[1:]))
+
+    assert by_polars == by_csv
+    assert by_polars.count(b'\r\n') == 3
+
+
+def test_blank_lines_at_file_start_and_inside_block(tmp_path):
+    by_csv, by_polars = parse_with_both_engines(tmp_path, '\n\r\n' + LINES[0] + LINES[1] + '\n\n' + LINES[2] + LINES[3])
+
+    assert by_polars == by_csv
+    assert by_polars.count(b'\r\n') == 3
@@ -0,0 +1,412 @@
+import argparse
+import mmap
+import struct
+
+import numpy as np
+
+from pathlib import Path
+from itertools import islice
+from typing import BinaryIO, Iterator, List, NamedTuple
+
+from xxhash import xxh3_64_intdigest
+from rich import pretty, print
+
+from common_data import hash_seed
+from compression import open_input, open_output, is_compressed
+
+pretty.install()
+
+"""
+    Binary trace format:
+    A 32 bytes header (magic, version, flags, number of records, base timestamp) followed by fixed-width
+    little-endian records. Each record holds the delta of the timestamp from the previous record (int32),
+    the key (uint64), and depending on the flags the hit penalty (float64), the miss penalty (float64)
+    and the hit flag (uint8).
+    Penalties flagged as integer are whole numbers, written back to text as integers (100, not 100.0).
+"""
+
+MAGIC = b'NSDITRC\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHQq')
+HEADER_SIZE = 32
+UNKNOWN_COUNT = 2 ** 64 - 1
+
+FLAG_PENALTY = 1
+FLAG_HIT_PENALTY = 2
+FLAG_HIT = 4
+FLAG_HASHED_KEYS = 8 # the keys were already hashed using hash_seed, no need to hash them again
+FLAG_INTEGER_PENALTY = 16
+FLAG_INTEGER_HIT_PENALTY = 32
+
+TEXT_SUFFIX = '.trace'
+BINARY_SUFFIX = '.btrace'
+OUTPUT_FORMATS = ['text', 'binary']
+
+BATCH_SIZE = 1_000_000
+
+COLUMNS = ['timestamp', 'key', 'hit_penalty', 'penalty', 'hit']
+COLUMN_FLAGS = {'hit_penalty': FLAG_HIT_PENALTY, 'penalty': FLAG_PENALTY, 'hit': FLAG_HIT}
+INTEGER_FLAGS = {'hit_penalty': FLAG_INTEGER_HIT_PENALTY, 'penalty': FLAG_INTEGER_PENALTY}
+
+MIN_DELTA = np.iinfo(np.int32).min
+MAX_DELTA = np.iinfo(np.int32).max
+
+
+class TraceBatch(NamedTuple):
+    timestamps: np.ndarray
+    keys: np.ndarray
+    penalties: np.ndarray | None = None
+    hit_penalties: np.ndarray | None = None
+    hits: np.ndarray | None = None
+
+
+def record_dtype(flags: int) -> np.dtype:
+    fields = [('delta', '<i4'), ('key', '<u8')]
+    if flags & FLAG_HIT_PENALTY:
+        fields.append(('hit_penalty', '<f8'))
+    if flags & FLAG_PENALTY:
+        fields.append(('penalty', '<f8'))
+    if flags & FLAG_HIT:
+        fields.append(('hit', 'u1'))
+
+    return np.dtype(fields)
+
+
+def flags_for_columns(columns: List[str]) -> int:
+    flags = 0
+    for column in columns:
+        flags |= COLUMN_FLAGS.get(column, 0)
+
+    return flags
+
+
+def whole_numbers(values) -> bool:
+    values = np.asarray(values)
+    return values.dtype.kind in 'iu' or bool(np.all(np.isfinite(values)) and np.all(values == np.trunc(values)))
+
+
+def text_trace_flags(path: Path, columns: List[str]) -> int:
+    """
+        The flags of the columns of a text trace, the penalty columns are flagged as integer when they are written
+        as integers on the first line, as the tools write a whole trace with the same generators.
+    """
+    flags = flags_for_columns(columns)
+    with open_input(path, 'r') as file:
+        first_row = next((line.split() for line in file if line.strip()), [])
+
+    for column, value in zip(columns, first_row):
+        if column in INTEGER_FLAGS and value.lstrip('-').isdigit():
+            flags |= INTEGER_FLAGS[column]
+
+    return flags
+
+
+def trace_suffix(output_format: str) -> str:
+    return BINARY_SUFFIX if output_format == 'binary' else TEXT_SUFFIX
+
+
+def is_binary_trace(path: Path) -> bool:
+    with open_input(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def read_header(file: BinaryIO) -> tuple:
+    raw_header = file.read(HEADER_SIZE)
+    if len(raw_header) < HEADER_SIZE:
+        raise ValueError('Truncated binary trace header')
+
+    magic, version, flags, count, base_timestamp = HEADER.unpack_from(raw_header)
+    if magic != MAGIC:
+        raise ValueError('Not a binary trace file')
+    if version != VERSION:
+        raise ValueError(f'Unsupported binary trace version: {version}')
+
+    return flags, count, base_timestamp
+
+
+class TraceWriter():
+    """
+        Writes batches of requests in the binary format.
+        The header is written with the first batch, since the base timestamp is the first timestamp.
+        When the output is seekable the number of records is patched in the header on close.
+        A penalty column flagged as integer that gets a fractional value loses the flag, which is patched as well,
+        so on an output that is not seekable it can only be lost before the header is written.
+    """
+    __slots__ = 'flags', 'dtype', 'count', '_file', '_owns_file', '_base_timestamp', '_last_timestamp'
+    def __init__(self, output: Path | BinaryIO, flags: int):
+        self.flags = flags
+        self.dtype = record_dtype(flags)
+        self.count = 0
+
+        if isinstance(output, (str, Path)):
+            self._file = Path(output).open('wb')
+            self._owns_file = True
+        else:
+            self._file = output
+            self._owns_file = False
+
+        self._base_timestamp = None
+        self._last_timestamp = None
+
+    def _write_header(self, count: int) -> None:
+        header = HEADER.pack(MAGIC, VERSION, self.flags, count, self._base_timestamp or 0)
+        self._file.write(header.ljust(HEADER_SIZE, b'\x00'))
+
+    def write_batch(self, timestamps, keys, penalties=None, hit_penalties=None, hits=None) -> None:
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        if len(timestamps) == 0:
+            return
+
+        for values, flag in ((hit_penalties, FLAG_INTEGER_HIT_PENALTY), (penalties, FLAG_INTEGER_PENALTY)):
+            if self.flags & flag and not whole_numbers(values):
+                if self._base_timestamp is not None and not self._file.seekable():
+                    raise ValueError(f'Penalties flagged as integer are not whole numbers, around record {self.count:,}')
+                self.flags &= ~flag
+
+        if self._base_timestamp is None:
+            self._base_timestamp = int(timestamps[0])
+            self._last_timestamp = self._base_timestamp
+            self._write_header(UNKNOWN_COUNT)
+
+        deltas = np.diff(timestamps, prepend=self._last_timestamp)
+        if deltas.min() < MIN_DELTA or deltas.max() > MAX_DELTA:
+            raise ValueError(f'Timestamp delta does not fit in the binary trace format, around record {self.count:,}')
+
+        records = np.empty(len(timestamps), dtype=self.dtype)
+        records['delta'] = deltas
+        records['key'] = keys
+        if self.flags & FLAG_HIT_PENALTY:
+            records['hit_penalty'] = hit_penalties
+        if self.flags & FLAG_PENALTY:
+            records['penalty'] = penalties
+        if self.flags & FLAG_HIT:
+            records['hit'] = hits
+
+        self._file.write(records.data)
+        self.count += len(records)
+        self._last_timestamp = int(timestamps[-1])
+
+    def write(self, batch: TraceBatch) -> None:
+        self.write_batch(batch.timestamps, batch.keys, batch.penalties, batch.hit_penalties, batch.hits)
+
+    def close(self) -> None:
+        if self._base_timestamp is None:
+            self._write_header(0)
+        elif self._file.seekable():
+            self._file.seek(0)
+            self._write_header(self.count)
+            self._file.seek(0, 2)
+
+        if self._owns_file:
+            self._file.close()
+        else:
+            self._file.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TraceReader():
+    """
+        Reads a binary trace through mmap, the batches are views of the mapped file except for the timestamps
+        which are reconstructed from the deltas.
+    """
+    __slots__ = 'path', 'flags', 'base_timestamp', 'records', '_file', '_mmap'
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = self.path.open('rb')
+        self.flags, count, self.base_timestamp = read_header(self._file)
+
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        dtype = record_dtype(self.flags)
+        available = (len(self._mmap) - HEADER_SIZE) // dtype.itemsize
+        if count != UNKNOWN_COUNT:
+            available = min(available, count)
+
+        self.records = np.frombuffer(self._mmap, dtype=dtype, count=available, offset=HEADER_SIZE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def iter_batches(self, batch_size: int = BATCH_SIZE) -> Iterator[TraceBatch]:
+        last_timestamp = self.base_timestamp
+        for start in range(0, len(self.records), batch_size):
+            records = self.records[start:start + batch_size]
+            timestamps = np.cumsum(records['delta'], dtype=np.int64) + last_timestamp
+            last_timestamp = int(timestamps[-1])
+
+            yield TraceBatch(timestamps, records['key'],
+                             records['penalty'] if self.flags & FLAG_PENALTY else None,
+                             records['hit_penalty'] if self.flags & FLAG_HIT_PENALTY else None,
+                             records['hit'] if self.flags & FLAG_HIT else None)
+
+    def time_range(self) -> (int, int):
+        if len(self.records) == 0:
+            return self.base_timestamp, self.base_timestamp
+
+        end_time = self.base_timestamp + int(self.records['delta'].sum(dtype=np.int64))
+        return self.base_timestamp, end_time
+
+    def close(self) -> None:
+        self.records = None
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass # batches are still referenced by the caller, the mapping is released with them
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TraceStreamReader():
+    """Reads a compressed binary trace while decompressing it, with the same interface as TraceReader"""
+    __slots__ = 'path', 'flags', 'base_timestamp', '_count', '_dtype', '_file'
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = open_input(self.path, 'rb')
+        self.flags, self._count, self.base_timestamp = read_header(self._file)
+        self._dtype = record_dtype(self.flags)
+
+    def __len__(self) -> int:
+        if self._count == UNKNOWN_COUNT:
+            raise TypeError('The number of requests in a streamed trace is unknown')
+        return self._count
+
+    def iter_batches(self, batch_size: int = BATCH_SIZE) -> Iterator[TraceBatch]:
+        last_timestamp = self.base_timestamp
+        while True:
+            raw = self._file.read(batch_size * self._dtype.itemsize)
+            records = np.frombuffer(raw, dtype=self._dtype, count=len(raw) // self._dtype.itemsize)
+            if len(records) == 0:
+                break
+
+            timestamps = np.cumsum(records['delta'], dtype=np.int64) + last_timestamp
+            last_timestamp = int(timestamps[-1])
+
+            yield TraceBatch(timestamps, records['key'],
+                             records['penalty'] if self.flags & FLAG_PENALTY else None,
+                             records['hit_penalty'] if self.flags & FLAG_HIT_PENALTY else None,
+                             records['hit'] if self.flags & FLAG_HIT else None)
+
+    def time_range(self) -> (int, int):
+        """Requires decompressing the whole trace, and consumes the reader"""
+        end_time = self.base_timestamp
+        for batch in self.iter_batches():
+            end_time = int(batch.timestamps[-1])
+
+        return self.base_timestamp, end_time
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def open_trace(path: Path) -> TraceReader | TraceStreamReader:
+    return TraceStreamReader(path) if is_compressed(path) else TraceReader(path)
+
+
+def format_text(batch: TraceBatch, flags: int = 0) -> str:
+    """
+        Formats the batch as space-separated lines, with the same column order the text tools use.
+        The penalties flagged as integer in the flags of the trace are written as integers.
+    """
+    columns = [batch.timestamps.tolist(), batch.keys.tolist()]
+    for values, flag in ((batch.hit_penalties, FLAG_INTEGER_HIT_PENALTY), (batch.penalties, FLAG_INTEGER_PENALTY)):
+        if values is not None:
+            columns.append((values.astype(np.int64) if flags & flag else values).tolist())
+    if batch.hits is not None:
+        columns.append(batch.hits.tolist())
+
+    return ''.join(' '.join(map(str, row)) + '\n' for row in zip(*columns))
+
+
+def parse_text_lines(lines: List[str], columns: List[str], hash_keys: bool) -> TraceBatch:
+    rows = [line.split() for line in lines]
+    rows = [row for row in rows if row]
+    parsed = {}
+    for idx, column in enumerate(columns):
+        values = [row[idx] for row in rows]
+        if column == 'timestamp':
+            parsed[column] = np.array([int(value) for value in values], dtype=np.int64)
+        elif column == 'key':
+            keys = [xxh3_64_intdigest(value.encode('utf-8'), seed=hash_seed) for value in values] if hash_keys else [int(value) for value in values]
+            parsed[column] = np.array(keys, dtype=np.uint64)
+        elif column == 'hit':
+            parsed[column] = np.array([int(value) for value in values], dtype=np.uint8)
+        else:
+            parsed[column] = np.array([float(value) for value in values], dtype=np.float64)
+
+    return TraceBatch(parsed['timestamp'], parsed['key'], parsed.get('penalty'),
+                      parsed.get('hit_penalty'), parsed.get('hit'))
+
+
+def import_text(input_path: Path, output_path: Path, columns: List[str], hash_keys: bool) -> int:
+    flags = text_trace_flags(input_path, columns) | (FLAG_HASHED_KEYS if hash_keys else 0)
+    with open_input(input_path, 'r') as input_file, TraceWriter(output_path, flags) as writer:
+        lines = list(islice(input_file, BATCH_SIZE))
+        while lines:
+            writer.write(parse_text_lines(lines, columns, hash_keys))
+            lines = list(islice(input_file, BATCH_SIZE))
+
+        return writer.count
+
+
+def export_text(input_path: Path, output_path: Path) -> int:
+    count = 0
+    with open_trace(input_path) as reader, open_output(output_path, 'w') as output_file:
+        for batch in reader.iter_batches():
+            output_file.write(format_text(batch, reader.flags))
+            count += len(batch.timestamps)
+
+        return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert traces between the text and the binary formats')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='Convert a space-separated text trace to the binary format')
+    import_parser.add_argument('-i', '--input-file', help='Input text trace', type=str, required=True)
+    import_parser.add_argument('-o', '--output-file', help='Output binary trace', type=str, required=True)
+    import_parser.add_argument('--columns', help='The columns of the text trace, in order (default: timestamp key)',
+                               nargs='+', choices=COLUMNS, default=['timestamp', 'key'])
+    import_parser.add_argument('--hash-keys', help='Hash the keys as latency_appender does, for non-integer keys (IBM, Meta)',
+                               action='store_true')
+
+    export_parser = subparsers.add_parser('export', help='Convert a binary trace to the space-separated text format')
+    export_parser.add_argument('-i', '--input-file', help='Input binary trace', type=str, required=True)
+    export_parser.add_argument('-o', '--output-file', help='Output text trace', type=str, required=True)
+
+    args = parser.parse_args()
+
+    input_path = Path(args.input_file)
+    output_path = Path(args.output_file)
+    if not input_path.exists():
+        print(f'[bold red]Error: Input file {input_path} does not exist')
+        exit(1)
+
+    if args.command == 'import':
+        if args.columns[:2] != ['timestamp', 'key']:
+            print('[bold red]Error: the first two columns must be timestamp and key')
+            exit(1)
+        count = import_text(input_path, output_path, args.columns, args.hash_keys)
+    else:
+        count = export_text(input_path, output_path)
+
+    print(f'[green]Converted {count:,} requests: [purple]{input_path.name} -> [cyan]{output_path.name}')
+
+
+if __name__ == '__main__':
+    main()
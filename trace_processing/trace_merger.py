@@ -8,11 +8,18 @@ from rich.progress import Progress
 from pathlib import Path
 from os import SEEK_END
 
-from typing import List
+from typing import List, Iterator
 
 from itertools import islice
 
+from trace_format import TraceWriter, TraceBatch, FLAG_PENALTY, FLAG_HIT_PENALTY, FLAG_INTEGER_PENALTY, FLAG_INTEGER_HIT_PENALTY, \
+                         OUTPUT_FORMATS, is_binary_trace, open_trace, parse_text_lines, format_text, trace_suffix
+from compression import open_input, open_output, compressed_path, COMPRESSIONS
+from instrumentation import span, add_arguments, instrumented
+
 CONSOLE = Console()
+# The lines of text traces are merged with integer hit penalties and float miss penalties, and so are the requests of binary traces
+MERGED_INTEGER_FLAGS = FLAG_INTEGER_HIT_PENALTY
 pretty.install()
 
 
@@ -53,54 +60,109 @@ def read_last_line(file_path: Path):
     return last_line
 
 
-def calculate_file_start_and_end_times(file_path: Path) -> (int, int):
-    with file_path.open('r') as file:
-        first_line = file.readline()
-    
-    last_line = read_last_line(file_path) # more efficient for larger files
-    
-    start_time = first_line.split(' ')[0]
-    end_time = last_line.split(' ')[0]
-    
-    return int(start_time), int(end_time)
-
-
-def changeTimestampsAndWriteToFile(input_files: List[Path], output_path: Path):
+def trace_flags(file_path: Path) -> int:
+    if is_binary_trace(file_path):
+        with open_trace(file_path) as reader:
+            return reader.flags
+
+    return FLAG_HIT_PENALTY | FLAG_PENALTY
+
+
+def trace_batches(file_path: Path, batch_size: int) -> Iterator[TraceBatch]:
+    if is_binary_trace(file_path):
+        with open_trace(file_path) as reader:
+            batches = reader.iter_batches(batch_size)
+            while True:
+                with span('read') as read:
+                    batch = next(batches, None)
+                    read.lines = len(batch.timestamps) if batch is not None else 0
+                if batch is None:
+                    break
+                yield batch
+    else:
+        with open_input(file_path, 'r') as file_reader:
+            lines = list(islice(file_reader, batch_size))
+            while lines:
+                with span('parse', lines=len(lines), bytes=sum(map(len, lines))):
+                    batch = parse_text_lines(lines, ['timestamp', 'key', 'hit_penalty', 'penalty'], hash_keys=False)
+                yield batch
+                lines = list(islice(file_reader, batch_size))
+
+
+def changeTimestampsAndWriteToFile(input_files: List[Path], output_path: Path, output_format: str = 'text'):
     last_file_end = 0
     timestamp = 1
     file_ends = list()
+
+    binary_writer = None
+    if output_format == 'binary':
+        flags = {trace_flags(input_file) & ~(FLAG_INTEGER_PENALTY | FLAG_INTEGER_HIT_PENALTY) for input_file in input_files}
+        if len(flags) != 1:
+            raise ValueError(f'Cannot merge traces with different columns into a binary trace: {flags}')
     
-    with output_path.open('w') as outputFile, Progress() as progress:
+    with open_output(output_path, 'w' if output_format == 'text' else 'wb') as outputFile, Progress() as progress:
+        if output_format == 'binary':
+            flags = flags.pop()
+            binary_writer = TraceWriter(outputFile, flags | (MERGED_INTEGER_FLAGS if flags & FLAG_HIT_PENALTY else 0))
+
         file_progress = progress.add_task('[bold #bedcfe]Files added', total=len(input_files), start=True)
         for input_file in input_files:
-            with input_file.open('r') as file_reader:
-                num_of_lines = 0
-                BATCH_SIZE = 10000
-                lines = list(islice(file_reader, BATCH_SIZE))
-                
-                file_start, file_end = calculate_file_start_and_end_times(input_file)
-                progress.console.print((file_start, file_end))
-                
-                while (lines) :
-                    for line in lines:
-                        written_time, key, hit_penalty, miss_penalty = line.split(' ')
-                        written_time = int(written_time)
-                        key = int(key)
-                        hit_penalty = int(hit_penalty)
-                        miss_penalty = float(miss_penalty.strip(' \n'))
-                            
-                        timestamp = written_time - file_start + last_file_end + 1
-                        num_of_lines += 1
-                            
+            # The time range (and the duration printed) is taken while merging, so a compressed trace is decompressed once
+            file_start, file_end = None, None
+            num_of_lines = 0
+
+            if output_format == 'binary' or is_binary_trace(input_file):
+                for batch in trace_batches(input_file, 1_000_000):
+                    if file_start is None:
+                        file_start = int(batch.timestamps[0])
+                    file_end = int(batch.timestamps[-1])
+                    batch = batch._replace(timestamps=batch.timestamps - file_start + last_file_end + 1)
+                    num_of_lines += len(batch.timestamps)
+
+                    with span('write', lines=len(batch.timestamps)):
+                        if binary_writer is not None:
+                            binary_writer.write(batch)
+                        else:
+                            outputFile.write(format_text(batch, MERGED_INTEGER_FLAGS))
+            else:
+                with open_input(input_file, 'r') as file_reader:
+                    BATCH_SIZE = 10000
+                    with span('read') as read:
+                        lines = list(islice(file_reader, BATCH_SIZE))
+                        read.lines = len(lines)
+                    
+                    while (lines) :
+                        with span('merge and write', lines=len(lines), bytes=sum(map(len, lines))):
+                            for line in lines:
+                                written_time, key, hit_penalty, miss_penalty = line.split(' ')
+                                written_time = int(written_time)
+                                if file_start is None:
+                                    file_start = written_time
+                                file_end = written_time
+                                key = int(key)
+                                hit_penalty = int(hit_penalty)
+                                miss_penalty = float(miss_penalty.strip(' \n'))
+                                    
+                                timestamp = written_time - file_start + last_file_end + 1
+                                num_of_lines += 1
+                                    
+                                    
+                                outputFile.write(f'{timestamp} {key} {hit_penalty} {miss_penalty}\n')
                             
-                        outputFile.write(f'{timestamp} {key} {hit_penalty} {miss_penalty}\n')
-                        
-                    lines = list(islice(file_reader, BATCH_SIZE))
-                
-                last_file_end = last_file_end + file_end - file_start
-                file_ends.append((str(input_file), last_file_end, num_of_lines))
-                
-                progress.update(file_progress, advance=1)
+                        with span('read') as read:
+                            lines = list(islice(file_reader, BATCH_SIZE))
+                            read.lines = len(lines)
+            
+            if file_start is None:
+                file_start, file_end = 0, 0
+            progress.console.print(f'{str(input_file)}: {file_end - file_start} ({file_start}, {file_end})')
+            last_file_end = last_file_end + file_end - file_start
+            file_ends.append((str(input_file), last_file_end, num_of_lines))
+            
+            progress.update(file_progress, advance=1)
+
+        if binary_writer is not None:
+            binary_writer.close()
                 
     CONSOLE.print(file_ends)
     
@@ -123,6 +185,11 @@ Example:
     parser.add_argument('--input-dir', help='The directory containing the original trace', type=str, required=True)
     parser.add_argument('--trace', help='A trace file to merge', type=str, action=TraceAction)
     parser.add_argument('--times', help='Number of times to repeat the previous trace (default: 1)', type=int, action=TimesAction)
+    parser.add_argument('--output-format', help='Output trace format (default: text), the input formats are detected automatically',
+                        choices=OUTPUT_FORMATS, default='text')
+    parser.add_argument('-c', '--compress', help='Compress the merged trace while writing it', action='store_true')
+    parser.add_argument('--compression', help='The compression used with --compress (default: xz)', choices=COMPRESSIONS, default='xz')
+    add_arguments(parser)
 
     args = parser.parse_args()
 
@@ -151,10 +218,6 @@ Example:
         CONSOLE.print(f"  {trace_name}: {times}x")
     CONSOLE.print(f"\n[bold cyan]Total files to merge:[/] {len(input_files)}")
 
-    for file in input_files:
-        start_time, end_time = calculate_file_start_and_end_times(file)
-        CONSOLE.print(f'{str(file)}: {end_time - start_time}')
-
     filename_parts = []
     for trace, times in trace_list:
         trace_name = get_trace_name(trace)
@@ -163,9 +226,10 @@ Example:
         else:
             filename_parts.append(f"{trace_name}x{times}")
 
-    setname = "-".join(filename_parts) + ".trace"
-    output_path = output_dir / setname
-    changeTimestampsAndWriteToFile(input_files, output_path)
+    setname = "-".join(filename_parts) + trace_suffix(args.output_format)
+    output_path = compressed_path(output_dir / setname, args.compression if args.compress else None)
+    with instrumented('trace_merger', args):
+        changeTimestampsAndWriteToFile(input_files, output_path, args.output_format)
     
     CONSOLE.log("[bold #a3b18a]Done\n#####################\n\n")
 